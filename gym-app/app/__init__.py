@@ -25,6 +25,85 @@ def create_app():
     app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
     app.config["PERMANENT_SESSION_LIFETIME"] = timedelta(hours=1)
 
+    # Reconocimiento facial: segundos antes de recargar el índice en memoria
+    # (recoge enrolamientos hechos por otros workers; 0 = nunca)
+    app.config["FACE_INDEX_MAX_AGE"] = int(getenv("FACE_INDEX_MAX_AGE", "300"))
+    # Backend de búsqueda: "exact" o "ivf" (nlist 0 = automático)
+    app.config["FACE_INDEX_BACKEND"] = getenv("FACE_INDEX_BACKEND", "exact")
+    app.config["FACE_INDEX_NLIST"] = int(getenv("FACE_INDEX_NLIST", "0"))
+    app.config["FACE_INDEX_NPROBE"] = int(getenv("FACE_INDEX_NPROBE", "0"))
+    app.config["FACE_INDEX_PATH"] = getenv("FACE_INDEX_PATH") or None
+    # Formato de las plantillas nuevas: "json" (legado), "float32" o "float16".
+    # Antes de usar un formato binario correr `flask face-templates-compact`.
+    app.config["FACE_EMBEDDING_STORAGE"] = getenv("FACE_EMBEDDING_STORAGE", "json")
+    # Cargar y precalentar el modelo al crear la app (ver /api/face/ready)
+    app.config["FACE_WARMUP"] = getenv("FACE_WARMUP", "0") == "1"
+    # Tuning del modelo (ver face_model.py)
+    app.config["FACE_DET_SIZE"] = getenv("FACE_DET_SIZE", "640")
+    app.config["FACE_MODULES"] = getenv("FACE_MODULES", "detection,recognition")
+    app.config["FACE_INTRA_OP_THREADS"] = int(getenv("FACE_INTRA_OP_THREADS", "0"))
+    app.config["FACE_INTER_OP_THREADS"] = int(getenv("FACE_INTER_OP_THREADS", "0"))
+    app.config["FACE_GRAPH_OPT_LEVEL"] = getenv("FACE_GRAPH_OPT_LEVEL", "all")
+    # Plantillas por cliente al enrolar varios frames: "mean" (promedio
+    # ponderado por calidad) o "topn" (las N de mejor calidad)
+    app.config["FACE_TEMPLATE_MODE"] = getenv("FACE_TEMPLATE_MODE", "mean")
+    app.config["FACE_TEMPLATES_PER_CLIENT"] = int(getenv("FACE_TEMPLATES_PER_CLIENT", "3"))
+    # Score mínimo para que /api/asistencias/face/checkin registre la entrada
+    # sin confirmación (vacío = cualquier coincidencia)
+    app.config["FACE_AUTO_CONFIRM_THRESHOLD"] = (
+        float(getenv("FACE_AUTO_CONFIRM_THRESHOLD")) if getenv("FACE_AUTO_CONFIRM_THRESHOLD") else None
+    )
+    # Hilos de inferencia compartidos por los streams de check-in continuo
+    app.config["FACE_STREAM_WORKERS"] = int(getenv("FACE_STREAM_WORKERS", "2"))
+    # Cache de resultados de identify para reintentos del mismo rostro
+    # (segundos de vida; 0 = desactivado)
+    app.config["FACE_CACHE_TTL"] = float(getenv("FACE_CACHE_TTL", "5"))
+    app.config["FACE_CACHE_BITS"] = int(getenv("FACE_CACHE_BITS", "6"))
+    app.config["FACE_CACHE_TABLES"] = int(getenv("FACE_CACHE_TABLES", "8"))
+    app.config["FACE_CACHE_MIN_SIMILARITY"] = float(getenv("FACE_CACHE_MIN_SIMILARITY", "0.9"))
+    # Procesos para /api/face/enroll/batch (0 = en el mismo worker)
+    app.config["FACE_BATCH_WORKERS"] = int(getenv("FACE_BATCH_WORKERS", "0"))
+    app.config["FACE_BATCH_MAX_IMAGES"] = int(getenv("FACE_BATCH_MAX_IMAGES", "200"))
+
+    # Segundos tras los que cada worker recarga el índice de nombres de /api/clientes/buscar
+    app.config["CLIENTE_SEARCH_MAX_AGE"] = int(getenv("CLIENTE_SEARCH_MAX_AGE", "60"))
+
+    # Exports en segundo plano (/api/exports)
+    app.config["EXPORT_DIR"] = getenv("EXPORT_DIR") or None
+    app.config["EXPORT_WORKERS"] = int(getenv("EXPORT_WORKERS", "2"))
+    # Segundos que se conservan los archivos generados (0 = sin límite)
+    app.config["EXPORT_MAX_AGE"] = int(getenv("EXPORT_MAX_AGE", str(7 * 24 * 3600)))
+
+    # Cache token -> cliente de /api/asistencias/qr (0 = desactivado) y
+    # segundos de vida de cada entrada
+    app.config["QR_CACHE_SIZE"] = int(getenv("QR_CACHE_SIZE", "5000"))
+    app.config["QR_CACHE_TTL"] = float(getenv("QR_CACHE_TTL", "600"))
+    app.config["QR_CACHE_CHECK_SECONDS"] = float(getenv("QR_CACHE_CHECK_SECONDS", "1"))
+
+    # Eventos máximos por lote en /api/asistencias/bulk
+    app.config["ASISTENCIAS_BULK_MAX"] = int(getenv("ASISTENCIAS_BULK_MAX", "1000"))
+
+    # Tokens QR firmados (ver qr_signed.py): claves separadas por comas, de
+    # la más antigua a la más nueva (vacío = SECRET_KEY), y segundos entre
+    # recargas del filtro de revocados
+    app.config["QR_SIGNED_TOKENS"] = getenv("QR_SIGNED_TOKENS", "0") == "1"
+    app.config["QR_SIGNING_KEYS"] = getenv("QR_SIGNING_KEYS") or None
+    app.config["QR_REVOCATION_MAX_AGE"] = int(getenv("QR_REVOCATION_MAX_AGE", "60"))
+
+    # Cache de /api/dashboard/* (segundos; 0 = desactivado). Backend
+    # "memory" (LRU por worker), "file" (compartido entre workers vía
+    # DASHBOARD_CACHE_DIR, idealmente en /dev/shm) o "none"
+    app.config["DASHBOARD_CACHE_TTL"] = float(getenv("DASHBOARD_CACHE_TTL", "30"))
+    app.config["DASHBOARD_CACHE_BACKEND"] = getenv("DASHBOARD_CACHE_BACKEND", "memory")
+    app.config["DASHBOARD_CACHE_SIZE"] = int(getenv("DASHBOARD_CACHE_SIZE", "256"))
+    app.config["DASHBOARD_CACHE_DIR"] = getenv("DASHBOARD_CACHE_DIR") or None
+
+    # Feed en vivo /api/live/stream: segundos entre lecturas de eventos de
+    # otros workers, eventos en memoria por worker y horas que se conservan
+    app.config["LIVE_POLL_SECONDS"] = float(getenv("LIVE_POLL_SECONDS", "1"))
+    app.config["LIVE_BUFFER"] = int(getenv("LIVE_BUFFER", "1000"))
+    app.config["LIVE_RETENTION_HOURS"] = int(getenv("LIVE_RETENTION_HOURS", "24"))
+
     # Cookies según entorno
     is_production = getenv("FLASK_ENV") == "production" or getenv("RENDER") == "true"
 
@@ -50,6 +129,18 @@ def create_app():
 
     db.init_app(app)
 
+    from .face_model import configure as configure_face_model
+    configure_face_model(app.config)
+
+    from .face_cache import configure as configure_face_cache
+    configure_face_cache(app.config)
+
+    from .dashboard_cache import configure as configure_dashboard_cache
+    configure_dashboard_cache(app.config)
+
+    from .qr_cache import configure as configure_qr_cache
+    configure_qr_cache(app.config)
+
     # CLI commands
     try:
         from .commands import register_commands
@@ -81,10 +172,35 @@ def create_app():
     from .routes_face import api_face
     app.register_blueprint(api_face)
 
+    from .routes_exports import api_exports
+    app.register_blueprint(api_exports)
+
+    from .routes_live import api_live
+    app.register_blueprint(api_live)
+
     with app.app_context():
         from . import models
         db.create_all()
 
+        # create_all no agrega columnas a tablas existentes
+        from .commands import pending_upgrades
+        pendientes = pending_upgrades(db.engine)
+        if pendientes:
+            print(
+                "[WARN] La BD necesita upgrade: corra `flask db-upgrade` "
+                f"(pendiente: {', '.join(pendientes)})"
+            )
+
+    # Precargar tokens QR al arrancar el worker (con la BD al día)
+    from .qr_cache import warm as warm_qr_cache
+    if not pendientes:
+        warm_qr_cache(app)
+
+    # Precalentar modelo facial e índice al arrancar el worker
+    if app.config["FACE_WARMUP"]:
+        from .face_model import start_warm_up
+        start_warm_up(app)
+
     # Helpers de protección
     def login_required(fn):
         from functools import wraps
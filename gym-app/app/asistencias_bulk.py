@@ -0,0 +1,288 @@
+# app/asistencias_bulk.py
+"""
+Ingesta por lotes de asistencias (/api/asistencias/bulk).
+
+Lo usa el kiosko de recepción para sincronizar los check-in que guardó
+mientras no había conexión con el backend, y sirve para reprocesar logs del
+torniquete. Cada evento trae token QR o cliente_id, la hora del cliente y
+una idempotency_key:
+
+  - una clave ya procesada devuelve el resultado original ("duplicado"),
+  - las entradas se deduplican contra el índice único de entrada diaria
+    ("ya_marcado" con la asistencia existente),
+  - todo el lote se inserta con un solo INSERT multi-fila
+    ON CONFLICT DO NOTHING RETURNING.
+
+Los clientes se resuelven en memoria (token firmado o cache QR) y los que
+faltan con un SELECT por lote; los rollups se actualizan con un upsert por
+clave distinta y los eventos en vivo (sólo los de hoy) con un INSERT.
+"""
+from collections import defaultdict, namedtuple
+from datetime import datetime, timedelta
+
+from sqlalchemy import insert, select, tuple_
+
+from . import db, live_events, qr_cache, qr_signed, rollups
+from .models import (
+    CHILE_TZ, ENTRADA_UNICA_WHERE, Asistencia, AsistenciaIngest, Cliente, ahora_chile, hoy_chile,
+    insertar_asistencia_sin_returning,
+)
+
+# Tolerancia para relojes de kiosko adelantados
+FUTURO_MAX = timedelta(minutes=5)
+
+
+class LoteDemasiadoGrande(ValueError):
+    """El lote supera ASISTENCIAS_BULK_MAX (la ruta responde 413)."""
+
+_Evento = namedtuple("_Evento", "i key token cliente_id fecha_hora tipo")
+_RETURNING = (Asistencia.asistencia_id, Asistencia.cliente_id, Asistencia.dia, Asistencia.fecha_hora, Asistencia.tipo)
+
+
+def _parse_fecha(value) -> datetime:
+    """
+    ISO 8601; con zona se convierte a hora local de Chile, sin zona se
+    asume local. Vacío = ahora.
+    """
+    if not value:
+        return ahora_chile()
+    fecha = datetime.fromisoformat(str(value).strip().replace("Z", "+00:00"))
+    if fecha.tzinfo is not None:
+        fecha = fecha.astimezone(CHILE_TZ).replace(tzinfo=None)
+    return fecha
+
+
+def _resultado(key, estado, asistencia_id=None, error=None, cliente_id=None):
+    out = {"idempotency_key": key, "estado": estado, "asistencia_id": asistencia_id}
+    if cliente_id is not None:
+        out["cliente_id"] = cliente_id
+    if error:
+        out["error"] = error
+    return out
+
+
+def _validar(i, ev, limite):
+    """
+    _Evento o (None, mensaje de error).
+    """
+    if not isinstance(ev, dict):
+        return None, "evento inválido"
+    key = str(ev.get("idempotency_key") or "").strip()
+    if not key or len(key) > 64:
+        return None, "idempotency_key es obligatoria (máx. 64 caracteres)"
+    tipo = ev.get("tipo") or "entrada"
+    if not isinstance(tipo, str) or tipo.strip() not in ("entrada", "salida"):
+        return None, "tipo debe ser entrada o salida"
+    tipo = tipo.strip()
+    try:
+        fecha_hora = _parse_fecha(ev.get("fecha_hora"))
+    except (TypeError, ValueError):
+        return None, "fecha_hora inválida (ISO 8601)"
+    if fecha_hora > limite:
+        return None, "fecha_hora en el futuro"
+    token = str(ev.get("token") or "").strip()
+    try:
+        cliente_id = int(ev["cliente_id"]) if ev.get("cliente_id") not in (None, "") else None
+    except (TypeError, ValueError):
+        return None, "cliente_id inválido"
+    if not token and cliente_id is None:
+        return None, "token o cliente_id es obligatorio"
+    return _Evento(i, key, token, cliente_id, fecha_hora, tipo), None
+
+
+def _resolver_clientes(eventos):
+    """
+    Devuelve ({i: cliente_id}, {cliente_id: cliente}, {i: error}).
+    """
+    ids, errores, por_token = {}, {}, {}
+
+    for ev in eventos:
+        if not ev.token:
+            ids[ev.i] = ev.cliente_id
+        elif qr_signed.is_signed(ev.token):
+            decoded = qr_signed.verificar(ev.token)
+            if decoded is None:
+                errores[ev.i] = "QR no válido"
+            elif qr_signed.revocado(*decoded):
+                errores[ev.i] = "QR revocado"
+            else:
+                ids[ev.i] = decoded[0]
+        else:
+            por_token.setdefault(ev.token, []).append(ev.i)
+
+    clientes = {}
+    for token, cliente in qr_cache.lookup_many(list(por_token)).items():
+        clientes[cliente.cliente_id] = cliente
+        for i in por_token.pop(token):
+            ids[i] = cliente.cliente_id
+    for indices in por_token.values():
+        for i in indices:
+            errores[i] = "QR no válido"
+
+    faltan = {cid for cid in ids.values() if cid not in clientes}
+    if faltan:
+        rows = db.session.execute(
+            select(*qr_cache.CLIENTE_COLUMNS)
+            .where(Cliente.cliente_id.in_(faltan))
+        ).all()
+        for row in rows:
+            clientes[row.cliente_id] = qr_cache.QrCliente(*row)
+    for i, cid in list(ids.items()):
+        if cid not in clientes:
+            errores[i] = "Cliente no encontrado"
+            del ids[i]
+
+    return ids, clientes, errores
+
+
+def _insert_rows(values):
+    dialect = db.session.get_bind().dialect.name
+    if dialect in ("postgresql", "sqlite"):
+        if dialect == "postgresql":
+            from sqlalchemy.dialects.postgresql import insert as dialect_insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert as dialect_insert
+
+        stmt = (
+            dialect_insert(Asistencia)
+            .values(values)
+            .on_conflict_do_nothing(index_elements=["cliente_id", "dia"], index_where=ENTRADA_UNICA_WHERE)
+            .returning(*_RETURNING)
+        )
+        return db.session.execute(stmt).all()
+
+    rows = [insertar_asistencia_sin_returning(v, _RETURNING) for v in values]
+    return [row for row in rows if row is not None]
+
+
+def _guardar_claves(rows):
+    if not rows:
+        return
+    dialect = db.session.get_bind().dialect.name
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    elif dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    else:
+        db.session.execute(insert(AsistenciaIngest), rows)
+        return
+    # Otro lote concurrente con la misma clave: se conserva el primero
+    db.session.execute(dialect_insert(AsistenciaIngest).values(rows).on_conflict_do_nothing())
+
+
+def ingest(eventos: list, max_eventos: int = 1000) -> list:
+    """
+    Procesa el lote y devuelve un resultado por evento, en el mismo orden.
+    No hace commit.
+    """
+    if len(eventos) > max_eventos:
+        raise LoteDemasiadoGrande(f"Máximo {max_eventos} eventos por lote")
+
+    resultados = [None] * len(eventos)
+    limite = ahora_chile() + FUTURO_MAX
+
+    validos = []
+    for i, ev in enumerate(eventos):
+        evento, error = _validar(i, ev, limite)
+        if evento is None:
+            key = ev.get("idempotency_key") if isinstance(ev, dict) else None
+            resultados[i] = _resultado(key, "error", error=error)
+        else:
+            validos.append(evento)
+
+    # Claves ya procesadas (en lotes anteriores o repetidas en este)
+    previas = {}
+    if validos:
+        previas = {
+            key: (asistencia_id, estado)
+            for key, asistencia_id, estado in db.session.execute(
+                select(AsistenciaIngest.idempotency_key, AsistenciaIngest.asistencia_id, AsistenciaIngest.estado)
+                .where(AsistenciaIngest.idempotency_key.in_({ev.key for ev in validos}))
+            ).all()
+        }
+    nuevos, vistos, repetidos = [], {}, []
+    for ev in validos:
+        if ev.key in previas:
+            asistencia_id, _ = previas[ev.key]
+            resultados[ev.i] = _resultado(ev.key, "duplicado", asistencia_id)
+        elif ev.key in vistos:
+            repetidos.append((ev, vistos[ev.key]))
+        else:
+            vistos[ev.key] = ev.i
+            nuevos.append(ev)
+
+    ids, clientes, errores = _resolver_clientes(nuevos)
+    for ev in nuevos:
+        if ev.i in errores:
+            resultados[ev.i] = _resultado(ev.key, "error", error=errores[ev.i])
+
+    # Una entrada por cliente y día: la más temprana del lote va al INSERT
+    primera = {}
+    a_insertar, misma_entrada = [], []
+    for ev in sorted((ev for ev in nuevos if ev.i in ids), key=lambda ev: ev.fecha_hora):
+        cid = ids[ev.i]
+        if ev.tipo == "entrada":
+            k = (cid, ev.fecha_hora.date())
+            if k in primera:
+                misma_entrada.append((ev, k))
+                continue
+            primera[k] = ev
+        a_insertar.append(ev)
+
+    insertadas = _insert_rows([
+        {"cliente_id": ids[ev.i], "fecha_hora": ev.fecha_hora, "dia": ev.fecha_hora.date(), "tipo": ev.tipo}
+        for ev in a_insertar
+    ]) if a_insertar else []
+
+    entradas, salidas = {}, defaultdict(list)
+    for row in insertadas:
+        if row.tipo == "entrada":
+            entradas[(row.cliente_id, row.dia)] = row.asistencia_id
+        else:
+            salidas[(row.cliente_id, row.fecha_hora)].append(row.asistencia_id)
+
+    # Entradas que chocaron con una ya registrada: se informa la existente
+    creadas = set(entradas)
+    choques = [k for k in primera if k not in entradas]
+    if choques:
+        for asistencia_id, cliente_id, dia in db.session.execute(
+            select(Asistencia.asistencia_id, Asistencia.cliente_id, Asistencia.dia).where(
+                Asistencia.tipo == "entrada", tuple_(Asistencia.cliente_id, Asistencia.dia).in_(choques),
+            )
+        ).all():
+            entradas[(cliente_id, dia)] = asistencia_id
+
+    claves = []
+    for ev in a_insertar:
+        cid = ids[ev.i]
+        if ev.tipo == "entrada":
+            k = (cid, ev.fecha_hora.date())
+            estado = "creada" if k in creadas else "ya_marcado"
+            asistencia_id = entradas.get(k)
+        else:
+            estado, asistencia_id = "creada", salidas[(cid, ev.fecha_hora)].pop(0)
+        resultados[ev.i] = _resultado(ev.key, estado, asistencia_id, cliente_id=cid)
+        claves.append({"idempotency_key": ev.key, "asistencia_id": asistencia_id, "estado": estado})
+
+    for ev, k in misma_entrada:
+        resultados[ev.i] = _resultado(ev.key, "ya_marcado", entradas.get(k), cliente_id=k[0])
+        claves.append({"idempotency_key": ev.key, "asistencia_id": entradas.get(k), "estado": "ya_marcado"})
+
+    # Misma clave repetida dentro del lote: el resultado de la primera
+    for ev, i in repetidos:
+        primero = resultados[i]
+        resultados[ev.i] = primero if primero["estado"] == "error" else {**primero, "estado": "duplicado"}
+
+    _guardar_claves(claves)
+
+    if insertadas:
+        rollups.registrar_asistencias((row.cliente_id, row.fecha_hora, row.tipo) for row in insertadas)
+        hoy = hoy_chile()
+        live_events.publicar_varios("asistencia", [
+            live_events.asistencia_payload(
+                row.asistencia_id, row.cliente_id, row.fecha_hora, row.tipo, clientes.get(row.cliente_id),
+            )
+            for row in insertadas if row.dia == hoy
+        ])
+
+    return resultados
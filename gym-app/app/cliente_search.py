@@ -0,0 +1,244 @@
+# app/cliente_search.py
+"""
+Búsqueda typeahead de clientes.
+
+- RUT: prefijo sobre clientes.rut_normalizado (dígitos + verificador), con
+  índice btree; en recepción se puede tipear con o sin puntos/guion.
+- Nombre/apellido: índice de trigramas en memoria (estilo pg_trgm: palabras
+  en minúscula, sin tildes y con relleno "  palabra "). Se puntúa por
+  trigramas compartidos, así "perez" encuentra "Pérez" y "gonzales"
+  encuentra "González".
+
+El índice se carga perezosamente por worker, se actualiza con las altas,
+ediciones hechas en el mismo worker y se recarga cada
+CLIENTE_SEARCH_MAX_AGE segundos para recoger las de otros workers.
+"""
+import threading
+import time
+from collections import defaultdict
+
+import numpy as np
+from flask import current_app
+from sqlalchemy import select
+
+from . import db
+from .models import Cliente, normalizar_rut, normalizar_texto
+
+# Fracción mínima de trigramas de la consulta que debe tener un nombre
+MIN_SIMILARITY = 0.5
+
+
+# Misma normalización que clientes.nombre_normalizado / apellido_normalizado
+fold = normalizar_texto
+
+
+def trigrams(text: str, prefix_last: bool = False) -> set:
+    """
+    Trigramas de cada palabra con relleno "  palabra ". Con prefix_last la
+    última palabra no lleva el espacio final: se está tipeando y puede ser
+    sólo el comienzo ("gonz" -> "gonzález").
+    """
+    words = ["".join(ch for ch in w if ch.isalnum()) for w in fold(text).split()]
+    words = [w for w in words if w]
+    out = set()
+    for i, word in enumerate(words):
+        tail = "" if prefix_last and i == len(words) - 1 else " "
+        padded = f"  {word}{tail}"
+        out.update(padded[j:j + 3] for j in range(len(padded) - 2))
+    return out
+
+
+def looks_like_rut(q: str) -> bool:
+    q = q.strip().upper()
+    return bool(q) and any(ch.isdigit() for ch in q) and all(ch.isdigit() or ch in ".-K " for ch in q)
+
+
+class NameIndex:
+    """
+    Listas de posiciones por trigrama; la búsqueda cuenta coincidencias con
+    np.bincount sobre las listas de los trigramas de la consulta.
+    """
+
+    def __init__(self):
+        self._grams = defaultdict(set)
+        self._arrays = {}
+        self._pos = {}
+        self._rows = []
+        self._sizes = np.zeros(0, dtype=np.int32)
+        self._lock = threading.RLock()
+        self.loaded_at = None
+
+    def __len__(self):
+        return len(self._pos)
+
+    def load(self, rows):
+        """
+        rows: iterable de (cliente_id, rut, nombre, apellido).
+        """
+        grams = defaultdict(set)
+        pos, data, sizes = {}, [], []
+        for cliente_id, rut, nombre, apellido in rows:
+            p = len(data)
+            pos[cliente_id] = p
+            data.append((cliente_id, rut, nombre, apellido))
+            tg = trigrams(f"{nombre} {apellido}")
+            sizes.append(len(tg))
+            for g in tg:
+                grams[g].add(p)
+
+        with self._lock:
+            self._grams, self._pos, self._rows = grams, pos, data
+            self._sizes = np.asarray(sizes, dtype=np.int32)
+            self._arrays = {}
+            self.loaded_at = time.monotonic()
+
+    def _drop(self, p):
+        _, _, nombre, apellido = self._rows[p]
+        for g in trigrams(f"{nombre} {apellido}"):
+            self._grams[g].discard(p)
+            self._arrays.pop(g, None)
+        self._rows[p] = None
+        self._sizes[p] = 0
+
+    def upsert(self, cliente_id, rut, nombre, apellido):
+        with self._lock:
+            if cliente_id in self._pos:
+                self._drop(self._pos[cliente_id])
+            p = len(self._rows)
+            self._pos[cliente_id] = p
+            self._rows.append((cliente_id, rut, nombre, apellido))
+            tg = trigrams(f"{nombre} {apellido}")
+            self._sizes = np.append(self._sizes, np.int32(len(tg)))
+            for g in tg:
+                self._grams[g].add(p)
+                self._arrays.pop(g, None)
+
+    def _postings(self, g):
+        arr = self._arrays.get(g)
+        if arr is None:
+            arr = np.fromiter(self._grams.get(g, ()), dtype=np.int32)
+            self._arrays[g] = arr
+        return arr
+
+    def search(self, q: str, limit: int = 10):
+        """
+        Devuelve [(cliente_id, rut, nombre, apellido, score)]. score es la
+        fracción de trigramas de la consulta presentes en el nombre; a igual
+        score gana el nombre más parecido en largo (similitud tipo pg_trgm).
+        """
+        query = trigrams(q, prefix_last=True)
+        if not query:
+            return []
+
+        with self._lock:
+            postings = [self._postings(g) for g in query if g in self._grams]
+            if not postings:
+                return []
+
+            counts = np.bincount(np.concatenate(postings), minlength=len(self._rows))
+            cand = np.nonzero(counts >= np.ceil(MIN_SIMILARITY * len(query)))[0]
+            if cand.size == 0:
+                return []
+
+            shared = counts[cand].astype(np.float32)
+            score = shared / len(query)
+            similarity = shared / (len(query) + self._sizes[cand] - shared)
+            order = np.lexsort((cand, -similarity, -score))[:limit]
+
+            return [
+                (*self._rows[cand[i]], round(float(score[i]), 3))
+                for i in order
+            ]
+
+
+_INDEX = None
+_INDEX_LOCK = threading.Lock()
+_RELOADING = False
+_PENDING = []
+
+
+def _rows_from_db():
+    return db.session.execute(
+        select(Cliente.cliente_id, Cliente.rut, Cliente.nombre, Cliente.apellido)
+    ).all()
+
+
+def _reload(app):
+    global _INDEX, _RELOADING
+    try:
+        with app.app_context():
+            index = NameIndex()
+            index.load(_rows_from_db())
+            db.session.remove()
+        with _INDEX_LOCK:
+            # Cambios commiteados mientras se leía la BD
+            for row in _PENDING:
+                index.upsert(*row)
+            _PENDING.clear()
+            _INDEX = index
+    except Exception as e:
+        print(f"[WARN] No se pudo recargar el índice de clientes: {e}")
+    finally:
+        _RELOADING = False
+
+
+def get_name_index() -> NameIndex:
+    """
+    La primera carga es síncrona; las recargas por antigüedad corren en un
+    hilo y mientras tanto se sigue respondiendo con el índice anterior.
+    """
+    global _INDEX, _RELOADING
+    max_age = current_app.config.get("CLIENTE_SEARCH_MAX_AGE", 0)
+    with _INDEX_LOCK:
+        if _INDEX is None:
+            _INDEX = NameIndex()
+            _INDEX.load(_rows_from_db())
+        elif max_age and not _RELOADING and time.monotonic() - _INDEX.loaded_at > max_age:
+            _RELOADING = True
+            app = current_app._get_current_object()
+            threading.Thread(target=_reload, args=(app,), name="cliente-search", daemon=True).start()
+        return _INDEX
+
+
+def cliente_changed(cliente):
+    """
+    Refleja un alta/edición ya commiteada (sin costo si el índice no se cargó).
+    """
+    row = (cliente.cliente_id, cliente.rut, cliente.nombre, cliente.apellido)
+    with _INDEX_LOCK:
+        if _RELOADING:
+            _PENDING.append(row)
+        if _INDEX is not None:
+            _INDEX.upsert(*row)
+
+
+def rut_prefix_filter(q: str):
+    """
+    Prefijo sobre rut_normalizado como rango, para usar el índice btree.
+    """
+    prefix = normalizar_rut(q)
+    upper = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+    return Cliente.rut_normalizado >= prefix, Cliente.rut_normalizado < upper
+
+
+def search_clientes(q: str, limit: int = 10):
+    q = (q or "").strip()
+    if not q:
+        return []
+
+    if looks_like_rut(q):
+        rows = db.session.execute(
+            select(Cliente.cliente_id, Cliente.rut, Cliente.nombre, Cliente.apellido)
+            .where(*rut_prefix_filter(q))
+            .order_by(Cliente.rut_normalizado.asc())
+            .limit(limit)
+        ).all()
+        return [
+            {"cliente_id": cid, "rut": rut, "nombre": nombre, "apellido": apellido, "score": 1.0}
+            for cid, rut, nombre, apellido in rows
+        ]
+
+    return [
+        {"cliente_id": cid, "rut": rut, "nombre": nombre, "apellido": apellido, "score": score}
+        for cid, rut, nombre, apellido, score in get_name_index().search(q, limit)
+    ]
@@ -1,12 +1,144 @@
 # app/commands.py
 from __future__ import annotations
 
+import os
 import secrets
 import click
 
 from .models import User, RoleEnum
 
 
+def _ensure_indexes(db, table, names=None):
+    """
+    CREATE INDEX IF NOT EXISTS para cada índice declarado en la tabla (o sólo
+    los de `names`). (La reflexión no ve los índices por expresión, como
+    lower(nombre), así que no sirve checkfirst.) Devuelve [(nombre, error o None)].
+    """
+    from sqlalchemy.schema import CreateIndex
+
+    results = []
+    for index in sorted(table.indexes, key=lambda ix: ix.name):
+        if names is not None and index.name not in names:
+            continue
+        try:
+            with db.engine.begin() as conn:
+                conn.execute(CreateIndex(index, if_not_exists=True))
+            results.append((index.name, None))
+        except Exception as e:
+            results.append((index.name, str(e).splitlines()[0]))
+    return results
+
+
+def hot_queries():
+    """Consultas calientes por fecha que deben resolverse con índice."""
+    from datetime import timedelta
+
+    from sqlalchemy import select
+
+    from .cliente_search import rut_prefix_filter
+    from .models import Asistencia, Cliente, ClienteMembresia, Pago, hoy_chile, rango_dias_chile
+
+    hoy = hoy_chile()
+    inicio, fin = rango_dias_chile(hoy)
+    inicio_mes, fin_mes = rango_dias_chile(hoy.replace(day=1), hoy)
+
+    return {
+        "asistencias_hoy": select(Asistencia.asistencia_id).where(
+            Asistencia.fecha_hora >= inicio, Asistencia.fecha_hora < fin,
+        ),
+        "entrada_cliente_hoy": select(Asistencia.asistencia_id).where(
+            Asistencia.cliente_id == 1,
+            Asistencia.tipo == "entrada",
+            Asistencia.fecha_hora >= inicio,
+            Asistencia.fecha_hora < fin,
+        ),
+        "asistencias_rango": select(Asistencia.asistencia_id).where(
+            Asistencia.fecha_hora >= inicio_mes, Asistencia.fecha_hora < fin_mes,
+        ),
+        "pagos_hoy": select(Pago.pago_id).where(
+            Pago.fecha_pago >= inicio, Pago.fecha_pago < fin,
+        ),
+        # Con `flask membresias-vencer` al día basta filtrar por estado
+        "membresia_activa_cliente": select(ClienteMembresia.cliente_membresia_id).where(
+            ClienteMembresia.cliente_id == 1,
+            ClienteMembresia.estado == "activa",
+        ),
+        "vencimientos_7d": select(ClienteMembresia.cliente_membresia_id).where(
+            ClienteMembresia.estado == "activa",
+            ClienteMembresia.fecha_fin >= hoy,
+            ClienteMembresia.fecha_fin <= hoy + timedelta(days=7),
+        ),
+        "membresias_a_vencer": select(ClienteMembresia.cliente_membresia_id).where(
+            ClienteMembresia.estado == "activa",
+            ClienteMembresia.fecha_fin < hoy,
+        ),
+        "clientes_rut_prefijo": select(Cliente.cliente_id).where(*rut_prefix_filter("12.345")),
+        "membresias_vigentes": select(Cliente.cliente_id).where(
+            Cliente.membresia_vigente.is_(True), Cliente.membresia_fecha_fin >= hoy,
+            Cliente.membresia_fecha_inicio <= hoy,
+        ),
+    }
+
+
+def explain_plans(conn) -> dict:
+    """
+    {nombre: plan} de hot_queries() en la BD de `conn` (EXPLAIN QUERY PLAN en
+    SQLite, EXPLAIN en Postgres).
+    """
+    from sqlalchemy import text
+
+    dialect = conn.dialect
+    if dialect.name == "postgresql":
+        # Con tablas chicas el planner prefiere seq scan aunque exista
+        # el índice; se desactiva para verificar que el índice aplica.
+        conn.execute(text("SET enable_seqscan = off"))
+        prefix = "EXPLAIN "
+    else:
+        prefix = "EXPLAIN QUERY PLAN "
+
+    plans = {}
+    for name, stmt in hot_queries().items():
+        sql = str(stmt.compile(dialect=dialect, compile_kwargs={"literal_binds": True}))
+        plans[name] = "\n".join(
+            " ".join(str(c) for c in row if isinstance(c, str))
+            for row in conn.execute(text(prefix + sql))
+        )
+    return plans
+
+
+def plan_uses_index(plan: str) -> bool:
+    return any(m in plan.upper() for m in ("USING INDEX", "USING COVERING INDEX", "INDEX SCAN", "INDEX ONLY SCAN"))
+
+
+# Columnas agregadas a tablas existentes: db.create_all() no las crea y las
+# consultas del modelo fallan hasta correr el comando. En orden de upgrade.
+UPGRADES = (
+    ("face_templates", "embedding_blob", "face-templates-compact"),
+    ("asistencias", "dia", "asistencias-dia"),
+    ("clientes", "rut_normalizado", "clientes-rut-normalizado"),
+    ("clientes", "apellido_normalizado", "clientes-nombre-normalizado"),
+    ("clientes", "membresia_fecha_inicio", "membresias-snapshot"),
+    ("rollup_asistencias_dia", "shard", "rollups-shard"),
+)
+
+
+def pending_upgrades(engine) -> list:
+    """
+    Comandos de upgrade pendientes en esta BD, en el orden en que hay que
+    correrlos.
+    """
+    from sqlalchemy import inspect
+
+    insp = inspect(engine)
+    pending = []
+    for table, column, command in UPGRADES:
+        if not insp.has_table(table):
+            continue
+        if column not in {c["name"] for c in insp.get_columns(table)} and command not in pending:
+            pending.append(command)
+    return pending
+
+
 def register_commands(app):
     @app.cli.command("create-admin")
     @click.option("--email", prompt=True, help="Email del usuario admin")
@@ -48,3 +180,513 @@ def register_commands(app):
                 raise click.ClickException("Debes indicar --password o usar --random.")
             if len(password) < 10:
                 raise
+
+    @app.cli.command("face-index-build")
+    @click.option("--backend", default=None, help="exact | ivf (por defecto FACE_INDEX_BACKEND)")
+    @click.option("--nlist", type=int, default=None, help="Clusters del IVF (0 = automático)")
+    @click.option("--nprobe", type=int, default=None, help="Clusters revisados por consulta")
+    @click.option("--output", default=None, help="Archivo .npz (por defecto FACE_INDEX_PATH)")
+    @click.option("--recall-sample", type=int, default=200, help="Probes para medir recall vs exacto")
+    def face_index_build(backend, nlist, nprobe, output, recall_sample):
+        """Construye el índice facial desde la BD y lo guarda en disco."""
+        import time
+
+        import numpy as np
+        from flask import current_app
+
+        from .face_index import build_index_from_db, recall_at_k
+
+        output = output or current_app.config.get("FACE_INDEX_PATH")
+        if not output:
+            raise click.ClickException("Indica --output o define FACE_INDEX_PATH.")
+
+        t0 = time.perf_counter()
+        index = build_index_from_db(backend=backend, nlist=nlist, nprobe=nprobe)
+        build_s = time.perf_counter() - t0
+        click.echo(f"[OK] Índice {index.backend}: {len(index)} plantillas en {build_s:.2f}s")
+
+        if index.backend != "exact" and len(index) and recall_sample > 0:
+            exact = build_index_from_db(backend="exact")
+            rng = np.random.default_rng(0)
+            matrix = exact._matrix
+            rows = rng.choice(len(exact), min(recall_sample, len(exact)), replace=False)
+            # Probes = plantillas con ruido, como una captura real del mismo rostro
+            probes = matrix[rows] + rng.normal(0, 0.02, (len(rows), matrix.shape[1])).astype(np.float32)
+
+            recall = recall_at_k(index, exact, probes)
+
+            t0 = time.perf_counter()
+            for probe in probes:
+                index.search(probe)
+            ms = (time.perf_counter() - t0) * 1000 / len(rows)
+            click.echo(
+                f"[OK] recall@1 vs exacto: {recall:.3f} ({len(rows)} probes, {ms:.2f} ms/probe, "
+                f"nprobe={index.effective_nprobe()})"
+            )
+
+        index.save(output)
+        click.echo(f"[OK] Guardado en {output}")
+
+    @app.cli.command("face-templates-compact")
+    @click.option("--dtype", type=click.Choice(["float32", "float16"]), default="float32")
+    @click.option("--batch-size", type=int, default=500)
+    @click.option("--keep-json", is_flag=True, help="No borra la columna JSON legada de cada fila")
+    def face_templates_compact(dtype, batch_size, keep_json):
+        """Migra face_templates.embedding (JSON) al formato binario compacto."""
+        import time
+
+        from sqlalchemy import bindparam, inspect, text
+
+        from . import db
+        from .face_storage import encode_embedding, reset_embedding_schema
+        from .models import FaceTemplate
+
+        table = FaceTemplate.__table__
+        columns = {c["name"]: c for c in inspect(db.engine).get_columns(table.name)}
+
+        if "embedding_blob" not in columns:
+            blob_type = db.LargeBinary().compile(dialect=db.engine.dialect)
+            with db.engine.begin() as conn:
+                conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN embedding_blob {blob_type}"))
+            click.echo("[OK] Columna embedding_blob creada")
+
+        if not keep_json and not columns["embedding"]["nullable"]:
+            if db.engine.dialect.name == "postgresql":
+                with db.engine.begin() as conn:
+                    conn.execute(text(f"ALTER TABLE {table.name} ALTER COLUMN embedding DROP NOT NULL"))
+                reset_embedding_schema()
+                click.echo("[OK] Columna embedding ahora admite NULL")
+            else:
+                # SQLite no permite cambiar NOT NULL sin recrear la tabla
+                click.echo("[WARN] embedding es NOT NULL en esta BD: se conserva el JSON (--keep-json)")
+                keep_json = True
+
+        stmt = (
+            table.update()
+            .where(table.c.face_template_id == bindparam("tid"))
+            .values(embedding_blob=bindparam("blob"))
+        )
+        if not keep_json:
+            stmt = stmt.values(embedding=None)
+
+        t0 = time.perf_counter()
+        migrated, json_bytes, blob_bytes, last_id = 0, 0, 0, 0
+
+        while True:
+            rows = (
+                db.session.query(FaceTemplate.face_template_id, FaceTemplate.embedding, FaceTemplate.model_version)
+                .filter(
+                    FaceTemplate.face_template_id > last_id,
+                    FaceTemplate.embedding_blob.is_(None),
+                    FaceTemplate.embedding.isnot(None),
+                )
+                .order_by(FaceTemplate.face_template_id.asc())
+                .limit(batch_size)
+                .all()
+            )
+            if not rows:
+                break
+
+            params = []
+            for tid, embedding, model_version in rows:
+                blob = encode_embedding(embedding, dtype=dtype, model_tag=model_version)
+                params.append({"tid": tid, "blob": blob})
+                json_bytes += len(str(embedding))
+                blob_bytes += len(blob)
+
+            db.session.execute(stmt, params)
+            db.session.commit()
+
+            migrated += len(rows)
+            last_id = rows[-1][0]
+            click.echo(f"  ... {migrated} plantillas")
+
+        elapsed = time.perf_counter() - t0
+        click.echo(f"[OK] {migrated} plantillas migradas a {dtype} en {elapsed:.2f}s")
+        if migrated:
+            click.echo(f"[OK] Tamaño aprox.: {json_bytes / 1024:.0f} KB JSON -> {blob_bytes / 1024:.0f} KB binario")
+
+    @app.cli.command("face-enroll-batch")
+    @click.argument("source", type=click.Path(exists=True))
+    @click.option("--workers", type=int, default=os.cpu_count() or 1, show_default=True,
+                  help="Procesos para extraer embeddings")
+    def face_enroll_batch(source, workers):
+        """Enrola rostros desde una carpeta o ZIP (<rut>.jpg o <rut>/<foto>.jpg)."""
+        from flask import current_app
+
+        from .face_batch import enroll_batch
+
+        resumen = enroll_batch(
+            source,
+            workers=workers,
+            storage=current_app.config.get("FACE_EMBEDDING_STORAGE", "json"),
+            mode=current_app.config.get("FACE_TEMPLATE_MODE", "mean"),
+            top_n=current_app.config.get("FACE_TEMPLATES_PER_CLIENT", 3),
+        )
+
+        for f in resumen["fallas"]:
+            click.echo(f"[FALLA] {f['archivo']} (rut {f['rut']}): {f['error']}")
+
+        click.echo(
+            f"[OK] {resumen['plantillas']} plantillas para {resumen['clientes']} clientes "
+            f"de {resumen['imagenes']} imágenes en {resumen['segundos']}s "
+            f"({resumen['imagenes_por_segundo']} img/s, {len(resumen['fallas'])} fallas)"
+        )
+
+    @app.cli.command("asistencias-dia")
+    def asistencias_dia():
+        """Agrega y rellena asistencias.dia y crea el índice único de entrada diaria."""
+        from sqlalchemy import cast, func, inspect, select, text
+
+        from . import db
+        from .models import Asistencia
+
+        table = Asistencia.__table__
+        columns = {c["name"] for c in inspect(db.engine).get_columns(table.name)}
+
+        if "dia" not in columns:
+            with db.engine.begin() as conn:
+                conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN dia DATE"))
+            click.echo("[OK] Columna dia creada")
+
+        if db.engine.dialect.name == "sqlite":
+            dia_expr = func.date(table.c.fecha_hora)
+        else:
+            dia_expr = cast(table.c.fecha_hora, db.Date)
+
+        with db.engine.begin() as conn:
+            filled = conn.execute(
+                table.update().where(table.c.dia.is_(None)).values(dia=dia_expr)
+            ).rowcount
+
+            # Entradas repetidas del mismo día (previas a la restricción):
+            # se conserva la primera y las demás quedan sin dia, fuera del
+            # índice único.
+            primeras = (
+                select(func.min(table.c.asistencia_id))
+                .where(table.c.tipo == "entrada")
+                .group_by(table.c.cliente_id, table.c.dia)
+            )
+            repetidas = conn.execute(
+                table.update()
+                .where(table.c.tipo == "entrada", table.c.asistencia_id.not_in(primeras))
+                .values(dia=None)
+            ).rowcount
+
+        click.echo(f"[OK] {filled} asistencias con dia ({repetidas} entradas repetidas quedan sin dia)")
+
+        for name, error in _ensure_indexes(db, table):
+            if error:
+                raise click.ClickException(f"No se pudo crear {name}: {error}")
+        click.echo("[OK] Índices de asistencias listos")
+
+    @app.cli.command("clientes-rut-normalizado")
+    @click.option("--batch-size", type=int, default=1000)
+    def clientes_rut_normalizado(batch_size):
+        """Agrega y rellena clientes.rut_normalizado para la búsqueda por RUT."""
+        from sqlalchemy import bindparam, inspect, text
+
+        from . import db
+        from .models import Cliente, normalizar_rut
+
+        table = Cliente.__table__
+        columns = {c["name"] for c in inspect(db.engine).get_columns(table.name)}
+
+        if "rut_normalizado" not in columns:
+            with db.engine.begin() as conn:
+                conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN rut_normalizado VARCHAR(12)"))
+            click.echo("[OK] Columna rut_normalizado creada")
+
+        stmt = (
+            table.update()
+            .where(table.c.cliente_id == bindparam("cid"))
+            .values(rut_normalizado=bindparam("norm"))
+        )
+
+        updated, last_id = 0, 0
+        while True:
+            rows = db.session.execute(
+                db.select(table.c.cliente_id, table.c.rut)
+                .where(table.c.cliente_id > last_id)
+                .order_by(table.c.cliente_id.asc())
+                .limit(batch_size)
+            ).all()
+            if not rows:
+                break
+            db.session.execute(stmt, [{"cid": cid, "norm": normalizar_rut(rut)} for cid, rut in rows])
+            db.session.commit()
+            updated += len(rows)
+            last_id = rows[-1][0]
+
+        # Sólo el índice propio: los de otras columnas nuevas los crea su comando
+        for name, error in _ensure_indexes(db, table, names={"ix_clientes_rut_normalizado"}):
+            if error:
+                raise click.ClickException(f"No se pudo crear {name}: {error}")
+        click.echo(f"[OK] {updated} clientes con rut_normalizado; índices listos")
+
+    @app.cli.command("clientes-nombre-normalizado")
+    @click.option("--batch-size", type=int, default=1000)
+    def clientes_nombre_normalizado(batch_size):
+        """Agrega y rellena clientes.nombre_normalizado / apellido_normalizado (búsqueda sin tildes)."""
+        from sqlalchemy import bindparam, inspect, text
+
+        from . import db
+        from .models import Cliente, normalizar_texto
+
+        table = Cliente.__table__
+        columns = {c["name"] for c in inspect(db.engine).get_columns(table.name)}
+
+        nuevas = [c for c in ("nombre_normalizado", "apellido_normalizado") if c not in columns]
+        for name in nuevas:
+            with db.engine.begin() as conn:
+                conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {name} VARCHAR(100)"))
+        if nuevas:
+            click.echo(f"[OK] Columnas creadas: {', '.join(nuevas)}")
+
+        stmt = (
+            table.update()
+            .where(table.c.cliente_id == bindparam("cid"))
+            .values(nombre_normalizado=bindparam("nom"), apellido_normalizado=bindparam("ape"))
+        )
+
+        updated, last_id = 0, 0
+        while True:
+            rows = db.session.execute(
+                db.select(table.c.cliente_id, table.c.nombre, table.c.apellido)
+                .where(table.c.cliente_id > last_id)
+                .order_by(table.c.cliente_id.asc())
+                .limit(batch_size)
+            ).all()
+            if not rows:
+                break
+            db.session.execute(stmt, [
+                {"cid": cid, "nom": normalizar_texto(nombre), "ape": normalizar_texto(apellido)}
+                for cid, nombre, apellido in rows
+            ])
+            db.session.commit()
+            updated += len(rows)
+            last_id = rows[-1][0]
+
+        names = {"ix_clientes_nombre_normalizado", "ix_clientes_apellido_normalizado"}
+        for name, error in _ensure_indexes(db, table, names=names):
+            if error:
+                raise click.ClickException(f"No se pudo crear {name}: {error}")
+        click.echo(f"[OK] {updated} clientes con nombre/apellido normalizado; índices listos")
+
+    @app.cli.command("db-indexes")
+    def db_indexes():
+        """Crea (IF NOT EXISTS) los índices declarados en los modelos."""
+        from . import db
+
+        insp = db.inspect(db.engine)
+        failed = 0
+        for table in db.metadata.sorted_tables:
+            if not insp.has_table(table.name):
+                continue
+            for name, error in _ensure_indexes(db, table):
+                if error:
+                    failed += 1
+                    click.echo(f"[WARN] {name}: {error}")
+                else:
+                    click.echo(f"[OK] {name}")
+
+        if failed:
+            click.echo("[WARN] Algunos índices requieren columnas nuevas: corra asistencias-dia / clientes-rut-normalizado / membresias-snapshot")
+
+    @app.cli.command("db-explain")
+    def db_explain():
+        """Muestra el plan de las consultas por fecha y falla si alguna no usa índice."""
+        from . import db
+
+        failures = []
+
+        with db.engine.connect() as conn:
+            plans = explain_plans(conn)
+
+        for name, plan in plans.items():
+            uses_index = plan_uses_index(plan)
+            click.echo(f"--- {name} [{'índice' if uses_index else 'SIN ÍNDICE'}]")
+            click.echo(plan)
+            if not uses_index:
+                failures.append(name)
+
+        if failures:
+            raise click.ClickException(f"Consultas sin índice: {', '.join(failures)}")
+        click.echo("[OK] Todas las consultas usan índice")
+
+    @app.cli.command("rollups-rebuild")
+    @click.option("--from", "desde", type=click.DateTime(formats=["%Y-%m-%d"]), default=None,
+                  help="Primer día (YYYY-MM-DD); por defecto todo el historial")
+    @click.option("--to", "hasta", type=click.DateTime(formats=["%Y-%m-%d"]), default=None,
+                  help="Último día (YYYY-MM-DD)")
+    def rollups_rebuild(desde, hasta):
+        """Recalcula los rollups de los dashboards desde asistencias y pagos."""
+        import time
+
+        from .rollups import rebuild
+
+        t0 = time.perf_counter()
+        counts = rebuild(desde.date() if desde else None, hasta.date() if hasta else None)
+        elapsed = time.perf_counter() - t0
+        click.echo(
+            f"[OK] Rollups recalculados en {elapsed:.2f}s: {counts['dias']} días, {counts['horas']} horas, "
+            f"{counts['cliente_mes']} cliente-mes, {counts['pagos_metodo_dia']} pagos por método"
+        )
+
+    @app.cli.command("rollups-shard")
+    def rollups_shard():
+        """Recrea los rollups por día y por hora con la columna shard y los recalcula."""
+        from sqlalchemy import inspect
+
+        from . import db
+        from .models import AsistenciaDia, AsistenciaHora
+        from .rollups import rebuild
+
+        # shard es parte de la PK: no se puede agregar con ALTER TABLE, pero
+        # los rollups se derivan de asistencias y se pueden recrear
+        tables = [AsistenciaDia.__table__, AsistenciaHora.__table__]
+        insp = inspect(db.engine)
+        for table in tables:
+            if insp.has_table(table.name) and "shard" not in {c["name"] for c in insp.get_columns(table.name)}:
+                table.drop(db.engine)
+                click.echo(f"[OK] {table.name} sin shard eliminada")
+        db.metadata.create_all(db.engine, tables=tables)
+
+        counts = rebuild()
+        click.echo(f"[OK] Rollups con shard: {counts['dias']} días, {counts['horas']} horas")
+
+    @app.cli.command("qr-tokens-firmar")
+    @click.option("--batch-size", type=int, default=500)
+    @click.option("--force", is_flag=True, help="Reemplaza (y revoca) también los tokens ya firmados")
+    def qr_tokens_firmar(batch_size, force):
+        """Reemplaza los tokens QR aleatorios por tokens firmados (hay que reimprimir los carnets)."""
+        from . import db
+        from .models import Cliente
+        from .qr_signed import is_signed, reemitir
+
+        updated, last_id = 0, 0
+        while True:
+            clientes = (
+                Cliente.query.filter(Cliente.cliente_id > last_id)
+                .order_by(Cliente.cliente_id.asc())
+                .limit(batch_size)
+                .all()
+            )
+            if not clientes:
+                break
+            for c in clientes:
+                if force or not is_signed(c.qr_token):
+                    # Un token firmado reemplazado queda revocado
+                    c.qr_token = reemitir(c.cliente_id, c.qr_token)
+                    updated += 1
+            db.session.commit()
+            last_id = clientes[-1].cliente_id
+
+        click.echo(f"[OK] {updated} clientes con QR firmado")
+
+    @app.cli.command("membresias-snapshot")
+    @click.option("--batch-size", type=int, default=500)
+    def membresias_snapshot(batch_size):
+        """Agrega y recalcula el snapshot de membresía actual en clientes."""
+        from sqlalchemy import inspect, text
+
+        from . import db
+        from .membresias import refrescar
+        from .models import Cliente, hoy_chile
+
+        table = Cliente.__table__
+        columns = {c["name"] for c in inspect(db.engine).get_columns(table.name)}
+
+        nuevas = [
+            c for c in ("membresia_actual_id", "membresia_id", "membresia_nombre",
+                        "membresia_fecha_inicio", "membresia_fecha_fin", "membresia_vigente")
+            if c not in columns
+        ]
+        for name in nuevas:
+            col_type = table.c[name].type.compile(dialect=db.engine.dialect)
+            with db.engine.begin() as conn:
+                conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {name} {col_type}"))
+        if nuevas:
+            click.echo(f"[OK] Columnas creadas: {', '.join(nuevas)}")
+
+        hoy = hoy_chile()
+        updated, last_id = 0, 0
+        while True:
+            ids = db.session.execute(
+                db.select(table.c.cliente_id)
+                .where(table.c.cliente_id > last_id)
+                .order_by(table.c.cliente_id.asc())
+                .limit(batch_size)
+            ).scalars().all()
+            if not ids:
+                break
+            updated += refrescar(ids, hoy)
+            db.session.commit()
+            last_id = ids[-1]
+
+        for name, error in _ensure_indexes(db, table, names={"ix_clientes_membresia_vigente_fin"}):
+            if error:
+                raise click.ClickException(f"No se pudo crear {name}: {error}")
+        click.echo(f"[OK] {updated} clientes con snapshot de membresía; índices listos")
+
+    @app.cli.command("membresias-vencer")
+    @click.option("--batch-size", type=int, default=1000)
+    def membresias_vencer(batch_size):
+        """Pasa a vencida las membresías con fecha_fin pasada (cron diario, después de medianoche)."""
+        from .membresias import vencer
+
+        def progreso(lote, filas, segundos):
+            click.echo(f"  ... lote {lote}: {filas} membresías en {segundos:.2f}s")
+
+        counts = vencer(batch_size=batch_size, on_batch=progreso)
+        click.echo(
+            f"[OK] {counts['membresias']} membresías vencidas en {counts['lotes']} lotes, "
+            f"{counts['clientes']} clientes sin membresía vigente ({counts['segundos']:.2f}s)"
+        )
+
+    @app.cli.command("db-upgrade")
+    @click.pass_context
+    def db_upgrade(ctx):
+        """Actualiza una BD existente: columnas nuevas, índices y rollups (idempotente)."""
+        from sqlalchemy import func, select
+
+        from flask import current_app
+
+        from . import db
+        from .face_storage import embedding_json_required
+        from .models import Asistencia, AsistenciaDia, Pago, PagoMetodoDia
+
+        commands = {
+            "face-templates-compact": lambda: ctx.invoke(face_templates_compact, keep_json=True),
+            "asistencias-dia": lambda: ctx.invoke(asistencias_dia),
+            "clientes-rut-normalizado": lambda: ctx.invoke(clientes_rut_normalizado),
+            "clientes-nombre-normalizado": lambda: ctx.invoke(clientes_nombre_normalizado),
+            "membresias-snapshot": lambda: ctx.invoke(membresias_snapshot),
+            "rollups-shard": lambda: ctx.invoke(rollups_shard),
+        }
+
+        pending = pending_upgrades(db.engine)
+        for command in pending:
+            click.echo(f"==> flask {command}")
+            commands[command]()
+        if not pending:
+            click.echo("[OK] Columnas al día")
+
+        storage = current_app.config.get("FACE_EMBEDDING_STORAGE", "json")
+        if storage != "json" and embedding_json_required():
+            click.echo(
+                f"[WARN] FACE_EMBEDDING_STORAGE={storage} pero face_templates.embedding es NOT NULL: "
+                "las plantillas nuevas guardarán también el JSON. En Postgres corra "
+                "`flask face-templates-compact` (sin --keep-json) para liberar la columna."
+            )
+
+        click.echo("==> flask db-indexes")
+        ctx.invoke(db_indexes)
+
+        # Rollups vacíos con historial: los dashboards mostrarían ceros
+        def count(model):
+            return db.session.execute(select(func.count()).select_from(model)).scalar()
+
+        if (count(AsistenciaDia) == 0 and count(Asistencia)) or (count(PagoMetodoDia) == 0 and count(Pago)):
+            click.echo("==> flask rollups-rebuild")
+            ctx.invoke(rollups_rebuild)
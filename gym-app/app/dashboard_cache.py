@@ -0,0 +1,287 @@
+# app/dashboard_cache.py
+"""
+Cache de respuestas de /api/dashboard/*.
+
+Cada pantalla de recepción y de administración consulta los dashboards cada
+pocos segundos; las respuestas se guardan por (endpoint, parámetros, fecha
+local) durante DASHBOARD_CACHE_TTL segundos y se invalidan en cuanto se
+commitea un cambio en asistencias, pagos, membresías de clientes o clientes
+(eventos after_flush / do_orm_execute + after_commit de la sesión).
+
+Backends (DASHBOARD_CACHE_BACKEND):
+  - "memory": LRU en el proceso. Cada worker tiene su copia y sólo ve sus
+    propias invalidaciones; los cambios hechos en otro worker se reflejan al
+    vencer el TTL.
+  - "file": un archivo por entrada en DASHBOARD_CACHE_DIR (idealmente en
+    /dev/shm). Los workers de gunicorn comparten aciertos e invalidaciones.
+  - "none": sin cache.
+
+La invalidación cambia una "generación"; la respuesta se guarda con la
+generación leída antes de calcularla, así un cálculo que se cruzó con un
+commit no queda cacheado como vigente.
+"""
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from functools import wraps
+
+from flask import current_app, request
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+_DIRTY = "dashboard_cache_dirty"
+
+
+class MemoryBackend:
+    def __init__(self, max_entries: int = 256):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def generation(self):
+        return self._generation
+
+    def get(self, key, generation):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expira, gen, body = entry
+            if expira <= now or gen != generation:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return body
+
+    def set(self, key, generation, body, ttl):
+        with self._lock:
+            if generation != self._generation:
+                return
+            self._entries[key] = (time.monotonic() + ttl, generation, body)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self):
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class FileBackend:
+    """
+    Entradas JSON en un directorio compartido. La generación vive en el
+    archivo "generation" (se reemplaza atómicamente al invalidar).
+    """
+
+    PURGE_EVERY = 100
+
+    def __init__(self, path: str):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+        self._gen_path = os.path.join(path, "generation")
+        self._writes = 0
+
+    def _entry_path(self, key):
+        return os.path.join(self.path, hashlib.sha1(key.encode("utf-8")).hexdigest() + ".json")
+
+    def _write(self, path, data: str):
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as fh:
+            fh.write(data)
+        os.replace(tmp, path)
+
+    def generation(self):
+        try:
+            with open(self._gen_path, encoding="utf-8") as fh:
+                return fh.read()
+        except OSError:
+            return ""
+
+    def get(self, key, generation):
+        try:
+            with open(self._entry_path(key), encoding="utf-8") as fh:
+                entry = json.load(fh)
+        except (OSError, ValueError):
+            return None
+        if entry.get("expira", 0) <= time.time() or entry.get("gen") != generation:
+            return None
+        return entry.get("body")
+
+    def set(self, key, generation, body, ttl):
+        if generation != self.generation():
+            return
+        self._write(self._entry_path(key), json.dumps({"expira": time.time() + ttl, "gen": generation, "body": body}))
+        self._writes += 1
+        if self._writes % self.PURGE_EVERY == 0:
+            self._purge()
+
+    def invalidate(self):
+        self._write(self._gen_path, uuid.uuid4().hex)
+
+    def _purge(self):
+        now = time.time()
+        for name in os.listdir(self.path):
+            if not name.endswith(".json"):
+                continue
+            full = os.path.join(self.path, name)
+            try:
+                with open(full, encoding="utf-8") as fh:
+                    expira = json.load(fh).get("expira", 0)
+                if expira <= now:
+                    os.remove(full)
+            except (OSError, ValueError):
+                pass
+
+    def __len__(self):
+        return sum(1 for name in os.listdir(self.path) if name.endswith(".json"))
+
+
+_BACKEND = None
+_TTL = 0.0
+_STATS = {"hits": 0, "misses": 0, "invalidaciones": 0}
+_STATS_LOCK = threading.Lock()
+_LISTENING = False
+
+
+def _count(name):
+    with _STATS_LOCK:
+        _STATS[name] += 1
+
+
+def configure(config):
+    """
+    Crea el backend del proceso desde app.config y registra los eventos de
+    invalidación (DASHBOARD_CACHE_TTL = 0 o backend "none" lo desactiva).
+    """
+    global _BACKEND, _TTL
+    _TTL = float(config.get("DASHBOARD_CACHE_TTL", 0) or 0)
+    backend = (config.get("DASHBOARD_CACHE_BACKEND") or "memory").lower()
+
+    if _TTL <= 0 or backend == "none":
+        _BACKEND = None
+    elif backend == "file":
+        path = config.get("DASHBOARD_CACHE_DIR") or os.path.join(tempfile.gettempdir(), "gym-dashboard-cache")
+        _BACKEND = FileBackend(path)
+    else:
+        _BACKEND = MemoryBackend(int(config.get("DASHBOARD_CACHE_SIZE", 256)))
+
+    _listen()
+
+
+def invalidate():
+    if _BACKEND is not None:
+        _BACKEND.invalidate()
+        _count("invalidaciones")
+
+
+def snapshot() -> dict:
+    if _BACKEND is None:
+        return {"enabled": False}
+    with _STATS_LOCK:
+        stats = dict(_STATS)
+    lookups = stats["hits"] + stats["misses"]
+    return {
+        "enabled": True,
+        "backend": type(_BACKEND).__name__,
+        **stats,
+        "entradas": len(_BACKEND),
+        "hit_rate": round(stats["hits"] / lookups, 4) if lookups else None,
+        "ttl": _TTL,
+    }
+
+
+def _cache_key():
+    from .models import hoy_chile
+
+    args = "&".join(f"{k}={v}" for k, v in sorted(request.args.items(multi=True)))
+    return f"{request.endpoint}|{args}|{hoy_chile().isoformat()}"
+
+
+def cached(fn):
+    """
+    Decorador para vistas de dashboard que devuelven JSON. Sólo se cachean
+    respuestas 200.
+    """
+
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        backend = _BACKEND
+        if backend is None:
+            return fn(*args, **kwargs)
+
+        key = _cache_key()
+        generation = backend.generation()
+        body = backend.get(key, generation)
+        if body is not None:
+            _count("hits")
+            resp = current_app.response_class(body, mimetype="application/json")
+            resp.headers["X-Cache"] = "HIT"
+            return resp
+
+        _count("misses")
+        resp = current_app.make_response(fn(*args, **kwargs))
+        if resp.status_code == 200 and resp.is_json:
+            backend.set(key, generation, resp.get_data(as_text=True), _TTL)
+        resp.headers["X-Cache"] = "MISS"
+        return resp
+
+    return wrapper
+
+
+# ---------- Invalidación por commit ----------
+
+def _watched_tables():
+    from .models import (
+        Asistencia, AsistenciaClienteMes, AsistenciaDia, AsistenciaHora, Cliente, ClienteMembresia,
+        Pago, PagoMetodoDia,
+    )
+
+    return {
+        m.__tablename__
+        for m in (
+            Asistencia, Pago, ClienteMembresia, Cliente,
+            AsistenciaDia, AsistenciaHora, AsistenciaClienteMes, PagoMetodoDia,
+        )
+    }
+
+
+def _listen():
+    global _LISTENING
+    if _LISTENING:
+        return
+    _LISTENING = True
+    watched = _watched_tables()
+
+    @event.listens_for(Session, "after_flush")
+    def _after_flush(session, flush_context):
+        for obj in (*session.new, *session.dirty, *session.deleted):
+            if getattr(obj, "__tablename__", None) in watched:
+                session.info[_DIRTY] = True
+                return
+
+    @event.listens_for(Session, "do_orm_execute")
+    def _do_orm_execute(state):
+        if state.is_insert or state.is_update or state.is_delete:
+            table = getattr(state.statement, "table", None)
+            if getattr(table, "name", None) in watched:
+                state.session.info[_DIRTY] = True
+
+    @event.listens_for(Session, "after_commit")
+    def _after_commit(session):
+        if session.info.pop(_DIRTY, False):
+            invalidate()
+
+    @event.listens_for(Session, "after_rollback")
+    def _after_rollback(session):
+        session.info.pop(_DIRTY, None)
@@ -0,0 +1,266 @@
+# app/export_jobs.py
+"""
+Exports en segundo plano.
+
+POST /api/exports encola la construcción del archivo en un pool de hilos y
+responde de inmediato; el archivo queda en EXPORT_DIR y se descarga por
+/api/exports/<job_id>/download.
+
+El job_id es un hash de (tipo, formato, desde, hasta, versión de datos), así
+que funciona como clave de cache: si el mismo rango no cambió (por ejemplo
+un mes cerrado), el archivo ya construido se entrega sin volver a
+consultarlo. Como el estado se guarda en disco (archivo + .json), cualquier
+worker que comparta EXPORT_DIR puede responder el estado y la descarga.
+
+Para agregar un reporte nuevo basta con register_kind().
+"""
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Callable
+
+from sqlalchemy import case, func, select
+
+from . import db
+from . import exports
+
+# Un job "en_proceso" más antiguo que esto se considera abandonado
+STALE_SECONDS = 15 * 60
+
+FORMATS = {
+    "xlsx": exports.XLSX_MIMETYPE,
+    "csv": "text/csv",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+
+@dataclass(frozen=True)
+class ExportKind:
+    # Filas formateadas para xlsx/csv
+    headers: list
+    rows: Callable
+    # SELECT tipado para parquet
+    stmt: Callable
+    # Versión de los datos del rango (cambia si se agregan, borran o
+    # editan filas; ver _version_asistencias)
+    version: Callable
+    title: str
+
+
+def _version_asistencias(f1, f2):
+    """
+    count y max(id) detectan filas nuevas; sum(id) un borrado compensado
+    por un insert, y las sumas de cliente_id y de salidas los UPDATE que
+    cambian de cliente o de tipo una asistencia ya exportada.
+    """
+    from .models import Asistencia, rango_dias_chile
+
+    inicio, fin = rango_dias_chile(f1, f2)
+    version = db.session.execute(
+        select(
+            func.count(Asistencia.asistencia_id),
+            func.max(Asistencia.asistencia_id),
+            func.sum(Asistencia.asistencia_id),
+            func.sum(Asistencia.cliente_id),
+            func.sum(case((Asistencia.tipo == "salida", 1), else_=0)),
+        )
+        .where(Asistencia.fecha_hora >= inicio, Asistencia.fecha_hora < fin)
+    ).one()
+    return "-".join(str(v or 0) for v in version)
+
+
+def _version_pagos(f1, f2):
+    from .models import Pago, rango_dias_chile
+
+    inicio, fin = rango_dias_chile(f1, f2)
+    version = db.session.execute(
+        select(
+            func.count(Pago.pago_id),
+            func.max(Pago.pago_id),
+            func.sum(Pago.pago_id),
+            func.sum(Pago.cliente_id),
+            func.sum(Pago.monto),
+        )
+        .where(Pago.fecha_pago >= inicio, Pago.fecha_pago < fin)
+    ).one()
+    return "-".join(str(v or 0) for v in version)
+
+
+KINDS = {
+    "asistencias": ExportKind(
+        headers=exports.ASISTENCIAS_HEADERS,
+        rows=exports.iter_asistencias,
+        stmt=exports.asistencias_stmt,
+        version=_version_asistencias,
+        title="Asistencias",
+    ),
+    "pagos": ExportKind(
+        headers=exports.PAGOS_HEADERS,
+        rows=exports.iter_pagos,
+        stmt=exports.pagos_stmt,
+        version=_version_pagos,
+        title="Pagos",
+    ),
+}
+
+
+def register_kind(name: str, kind: ExportKind):
+    KINDS[name] = kind
+
+
+# ---------- Estado en disco ----------
+
+_EXECUTOR = None
+_RUNNING = set()
+_LOCK = threading.Lock()
+
+
+def export_dir(config) -> str:
+    path = config.get("EXPORT_DIR") or os.path.join(tempfile.gettempdir(), "gym-exports")
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def _paths(base, job_id, fmt):
+    return os.path.join(base, f"{job_id}.{fmt}"), os.path.join(base, f"{job_id}.json")
+
+
+def _write_meta(path, meta):
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as fh:
+        json.dump(meta, fh)
+    os.replace(tmp, path)
+
+
+def _read_meta(base, job_id):
+    if not job_id.isalnum():
+        return None
+    try:
+        with open(os.path.join(base, f"{job_id}.json"), encoding="utf-8") as fh:
+            return json.load(fh)
+    except (OSError, ValueError):
+        return None
+
+
+def job_key(kind, fmt, f1, f2, version) -> str:
+    raw = f"{kind}|{fmt}|{f1.isoformat()}|{f2.isoformat()}|{version}"
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()[:24]
+
+
+def purge_old(base, max_age_seconds):
+    """
+    Borra artefactos y metadatos más antiguos que max_age_seconds.
+    """
+    if max_age_seconds <= 0:
+        return
+    limit = time.time() - max_age_seconds
+    for name in os.listdir(base):
+        full = os.path.join(base, name)
+        try:
+            if os.path.getmtime(full) < limit:
+                os.remove(full)
+        except OSError:
+            pass
+
+
+# ---------- Construcción ----------
+
+def _build(app, job_id, kind_name, fmt, f1, f2):
+    kind = KINDS[kind_name]
+    base = export_dir(app.config)
+    artifact, meta_path = _paths(base, job_id, fmt)
+    meta = _read_meta(base, job_id) or {}
+    t0 = time.perf_counter()
+
+    try:
+        with app.app_context():
+            tmp = f"{artifact}.tmp"
+            try:
+                with open(tmp, "wb") as fh:
+                    if fmt == "xlsx":
+                        exports.write_xlsx(kind.title, kind.headers, kind.rows(f1, f2), fh)
+                    elif fmt == "csv":
+                        for chunk in exports.iter_csv(kind.headers, kind.rows(f1, f2)):
+                            fh.write(chunk)
+                    else:
+                        exports.write_parquet(kind.stmt(f1, f2), fh)
+                os.replace(tmp, artifact)
+            finally:
+                db.session.remove()
+
+        meta.update({
+            "estado": "listo",
+            "bytes": os.path.getsize(artifact),
+            "segundos": round(time.perf_counter() - t0, 2),
+        })
+    except Exception as e:
+        meta.update({"estado": "error", "error": str(e)})
+    finally:
+        _write_meta(meta_path, meta)
+        with _LOCK:
+            _RUNNING.discard(job_id)
+
+
+def _executor(workers: int):
+    global _EXECUTOR
+    with _LOCK:
+        if _EXECUTOR is None:
+            _EXECUTOR = ThreadPoolExecutor(max_workers=max(workers, 1), thread_name_prefix="export")
+        return _EXECUTOR
+
+
+def enqueue(app, kind_name, fmt, f1, f2):
+    """
+    Devuelve (meta, en_cache). Si el artefacto para la versión actual de
+    los datos ya existe no se vuelve a construir.
+    """
+    kind = KINDS[kind_name]
+    base = export_dir(app.config)
+    purge_old(base, app.config.get("EXPORT_MAX_AGE", 0))
+
+    version = kind.version(f1, f2)
+    job_id = job_key(kind_name, fmt, f1, f2, version)
+
+    meta = _read_meta(base, job_id)
+    if meta and meta.get("estado") == "listo" and os.path.exists(_paths(base, job_id, fmt)[0]):
+        return meta, True
+
+    # Otro worker lo está construyendo (o se cayó hace más de STALE_SECONDS)
+    if meta and meta.get("estado") == "en_proceso" and time.time() - meta.get("creado", 0) < STALE_SECONDS:
+        return meta, False
+
+    nuevo = {
+        "job_id": job_id,
+        "kind": kind_name,
+        "format": fmt,
+        "from": f1.isoformat(),
+        "to": f2.isoformat(),
+        "version": version,
+        "filename": f"{kind_name}_{f1.strftime('%Y%m%d')}_{f2.strftime('%Y%m%d')}.{fmt}",
+        "estado": "en_proceso",
+        "creado": time.time(),
+    }
+
+    with _LOCK:
+        if job_id in _RUNNING:
+            # El meta se escribe antes de marcar el job como en curso, pero
+            # pudo expirar o leerse a medio reemplazar: nunca se devuelve None
+            return _read_meta(base, job_id) or nuevo, False
+        _write_meta(_paths(base, job_id, fmt)[1], nuevo)
+        _RUNNING.add(job_id)
+
+    _executor(app.config.get("EXPORT_WORKERS", 2)).submit(_build, app, job_id, kind_name, fmt, f1, f2)
+    return nuevo, False
+
+
+def get_job(config, job_id):
+    return _read_meta(export_dir(config), job_id)
+
+
+def artifact_path(config, meta):
+    return _paths(export_dir(config), meta["job_id"], meta["format"])[0]
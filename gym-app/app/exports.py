@@ -0,0 +1,259 @@
+# app/exports.py
+"""
+Exportación de asistencias y pagos por rango de fechas.
+
+Las filas se leen como tuplas de columnas (sin entidades ORM) con
+yield_per, que en Postgres usa un cursor del lado del servidor, y el Excel
+se escribe con openpyxl en modo write-only sobre un archivo temporal
+"spooled": en memoria hasta XLSX_SPOOL_BYTES y en disco después. Así un
+export anual no mantiene en RAM todos los objetos ni el workbook completo.
+
+CSV se genera por trozos a medida que salen filas del cursor (opcionalmente
+gzip) y Parquet, para análisis, por lotes de YIELD_PER filas con pyarrow
+(dependencia opcional).
+"""
+import csv
+import io
+import tempfile
+import zlib
+
+from openpyxl import Workbook
+from sqlalchemy import select
+
+from . import db
+from .models import Asistencia, Cliente, ClienteMembresia, Membresia, Pago, rango_dias_chile
+
+YIELD_PER = 1000
+XLSX_SPOOL_BYTES = 8 * 1024 * 1024
+XLSX_MIMETYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+CSV_CHUNK_ROWS = 500
+
+ASISTENCIAS_HEADERS = [
+    "Asistencia ID",
+    "Fecha",
+    "Hora",
+    "Cliente ID",
+    "Cliente",
+    "RUT",
+    "Tipo",
+]
+
+PAGOS_HEADERS = [
+    "Pago ID",
+    "Fecha pago",
+    "Cliente ID",
+    "Cliente",
+    "RUT",
+    "Membresía",
+    "Monto",
+    "Método de pago",
+]
+
+
+def _stream(stmt):
+    return db.session.execute(stmt.execution_options(yield_per=YIELD_PER))
+
+
+def asistencias_stmt(f1, f2):
+    """
+    SELECT de asistencias entre f1 y f2 (fechas locales, inclusive).
+    """
+    inicio, fin = rango_dias_chile(f1, f2)
+
+    return (
+        select(
+            Asistencia.asistencia_id,
+            Asistencia.fecha_hora,
+            Cliente.cliente_id,
+            Cliente.nombre,
+            Cliente.apellido,
+            Cliente.rut,
+            Asistencia.tipo,
+        )
+        .join(Cliente, Cliente.cliente_id == Asistencia.cliente_id)
+        .where(Asistencia.fecha_hora >= inicio, Asistencia.fecha_hora < fin)
+        .order_by(Asistencia.fecha_hora.desc())
+    )
+
+
+def iter_asistencias(f1, f2):
+    """
+    Filas de asistencias formateadas en el orden de ASISTENCIAS_HEADERS.
+    """
+    rows = _stream(asistencias_stmt(f1, f2))
+    for asistencia_id, fecha_hora, cliente_id, nombre, apellido, rut, tipo in rows:
+        yield [
+            asistencia_id,
+            fecha_hora.strftime("%Y-%m-%d") if fecha_hora else "",
+            fecha_hora.strftime("%H:%M") if fecha_hora else "",
+            cliente_id,
+            f"{nombre} {apellido}",
+            rut,
+            tipo or "entrada",
+        ]
+
+
+def pagos_stmt(f1, f2):
+    """
+    SELECT de pagos entre f1 y f2 (fechas locales, inclusive).
+    """
+    inicio, fin = rango_dias_chile(f1, f2)
+
+    return (
+        select(
+            Pago.pago_id,
+            Pago.fecha_pago,
+            Cliente.cliente_id,
+            Cliente.nombre,
+            Cliente.apellido,
+            Cliente.rut,
+            Membresia.nombre.label("membresia"),
+            Pago.monto,
+            Pago.metodo_pago,
+        )
+        .join(Cliente, Cliente.cliente_id == Pago.cliente_id)
+        .outerjoin(ClienteMembresia, ClienteMembresia.cliente_membresia_id == Pago.cliente_membresia_id)
+        .outerjoin(Membresia, Membresia.membresia_id == ClienteMembresia.membresia_id)
+        .where(Pago.fecha_pago >= inicio, Pago.fecha_pago < fin)
+        .order_by(Pago.fecha_pago.desc())
+    )
+
+
+def iter_pagos(f1, f2):
+    """
+    Filas de pagos formateadas en el orden de PAGOS_HEADERS.
+    """
+    rows = _stream(pagos_stmt(f1, f2))
+    for pago_id, fecha_pago, cliente_id, nombre, apellido, rut, plan, monto, metodo in rows:
+        yield [
+            pago_id,
+            fecha_pago.strftime("%Y-%m-%d %H:%M:%S") if fecha_pago else "",
+            cliente_id,
+            f"{nombre} {apellido}",
+            rut,
+            plan or "",
+            float(monto or 0),
+            metodo or "",
+        ]
+
+
+def write_xlsx(title, headers, rows, fileobj=None):
+    """
+    Escribe una hoja en modo write-only y devuelve el archivo posicionado
+    al inicio (por defecto un SpooledTemporaryFile).
+    """
+    if fileobj is None:
+        fileobj = tempfile.SpooledTemporaryFile(max_size=XLSX_SPOOL_BYTES)
+
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet(title)
+    ws.append(headers)
+    for row in rows:
+        ws.append(row)
+
+    wb.save(fileobj)
+    fileobj.seek(0)
+    return fileobj
+
+
+def asistencias_xlsx(f1, f2, fileobj=None):
+    return write_xlsx("Asistencias", ASISTENCIAS_HEADERS, iter_asistencias(f1, f2), fileobj)
+
+
+def pagos_xlsx(f1, f2, fileobj=None):
+    return write_xlsx("Pagos", PAGOS_HEADERS, iter_pagos(f1, f2), fileobj)
+
+
+# ---------- CSV ----------
+
+def iter_csv(headers, rows, chunk_rows: int = CSV_CHUNK_ROWS):
+    """
+    Genera el CSV en trozos de bytes (UTF-8 con BOM, para que Excel
+    respete los acentos) cada chunk_rows filas.
+    """
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerow(headers)
+    first = True
+    pending = 1
+
+    for row in rows:
+        writer.writerow(row)
+        pending += 1
+        if pending >= chunk_rows:
+            yield (("\ufeff" if first else "") + buf.getvalue()).encode("utf-8")
+            buf.seek(0)
+            buf.truncate()
+            first, pending = False, 0
+
+    yield (("\ufeff" if first else "") + buf.getvalue()).encode("utf-8")
+
+
+def gzip_chunks(chunks, level: int = 6):
+    """
+    Comprime un iterable de bytes como un único stream gzip.
+    """
+    comp = zlib.compressobj(level, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = comp.compress(chunk)
+        if data:
+            yield data
+    yield comp.flush()
+
+
+# ---------- Parquet (pyarrow opcional) ----------
+
+def parquet_available() -> bool:
+    try:
+        import pyarrow  # noqa: F401
+        import pyarrow.parquet  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def _arrow_schema(stmt):
+    import pyarrow as pa
+    from sqlalchemy import Date, DateTime, Integer, Numeric
+
+    fields = []
+    for col in stmt.selected_columns:
+        if isinstance(col.type, Integer):
+            typ = pa.int64()
+        elif isinstance(col.type, DateTime):
+            typ = pa.timestamp("us")
+        elif isinstance(col.type, Date):
+            typ = pa.date32()
+        elif isinstance(col.type, Numeric):
+            typ = pa.float64()
+        else:
+            typ = pa.string()
+        fields.append(pa.field(col.key, typ))
+    return pa.schema(fields)
+
+
+def write_parquet(stmt, fileobj=None):
+    """
+    Escribe el resultado de stmt como Parquet tipado (un row group por lote
+    de YIELD_PER filas) y devuelve el archivo posicionado al inicio.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    if fileobj is None:
+        fileobj = tempfile.SpooledTemporaryFile(max_size=XLSX_SPOOL_BYTES)
+
+    schema = _arrow_schema(stmt)
+    numeric = [f.name for f in schema if pa.types.is_floating(f.type)]
+
+    with pq.ParquetWriter(fileobj, schema, compression="snappy") as writer:
+        for batch in _stream(stmt).mappings().partitions(YIELD_PER):
+            if numeric:
+                batch = [
+                    {**row, **{k: float(row[k]) if row[k] is not None else None for k in numeric}}
+                    for row in batch
+                ]
+            writer.write_batch(pa.RecordBatch.from_pylist(batch, schema=schema))
+
+    fileobj.seek(0)
+    return fileobj
@@ -0,0 +1,219 @@
+# app/face_batch.py
+"""
+Enrolamiento facial masivo desde un ZIP o una carpeta de fotos.
+
+Formatos aceptados (el RUT puede venir con o sin puntos/guion):
+  - <rut>.jpg                 una foto por cliente
+  - <rut>/<cualquier>.jpg     varias fotos por cliente
+
+La decodificación + embedding corre en un pool de procesos (cada proceso
+carga su propio modelo) y todas las plantillas se insertan en un único
+INSERT masivo. Los procesos se crean con "spawn" (el worker web tiene hilos
+y ONNX Runtime ya iniciado, y un fork puede quedar bloqueado) y sólo hay
+unas pocas imágenes en vuelo por proceso, así el ZIP no se carga entero en
+memoria. Las fotos de un mismo cliente se combinan igual que en
+/api/face/enroll (ver face_utils.build_templates).
+"""
+import multiprocessing
+import os
+import time
+import zipfile
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from sqlalchemy import insert
+
+from . import db
+from .models import Cliente, FaceTemplate, normalizar_rut
+
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".bmp", ".webp"}
+# Imágenes en vuelo por proceso del pool
+IN_FLIGHT_PER_WORKER = 4
+
+
+def _rut_from_path(path: str) -> str:
+    parts = [p for p in path.replace("\\", "/").split("/") if p]
+    if len(parts) >= 2:
+        return parts[-2]
+    return os.path.splitext(parts[-1])[0]
+
+
+def _is_image(name: str) -> bool:
+    base = os.path.basename(name)
+    return not base.startswith(".") and os.path.splitext(base)[1].lower() in IMAGE_EXTENSIONS
+
+
+def iter_images(source):
+    """
+    Itera (rut, nombre_archivo, bytes) desde una ruta a carpeta/ZIP o un
+    archivo ZIP ya abierto (file-like).
+    """
+    if isinstance(source, str) and os.path.isdir(source):
+        for root, _, files in os.walk(source):
+            for name in sorted(files):
+                if not _is_image(name):
+                    continue
+                full = os.path.join(root, name)
+                rel = os.path.relpath(full, source)
+                with open(full, "rb") as fh:
+                    yield _rut_from_path(rel), rel, fh.read()
+        return
+
+    with zipfile.ZipFile(source) as zf:
+        for info in zf.infolist():
+            if info.is_dir() or not _is_image(info.filename):
+                continue
+            yield _rut_from_path(info.filename), info.filename, zf.read(info)
+
+
+def count_images(source) -> int:
+    """
+    Cantidad de imágenes del ZIP/carpeta sin leer su contenido.
+    """
+    if isinstance(source, str) and os.path.isdir(source):
+        return sum(1 for _, _, files in os.walk(source) for name in files if _is_image(name))
+
+    with zipfile.ZipFile(source) as zf:
+        return sum(1 for info in zf.infolist() if not info.is_dir() and _is_image(info.filename))
+
+
+# ---------- Worker (corre en procesos hijos) ----------
+
+def _init_worker(options):
+    from . import face_model
+    face_model._OPTIONS.update(options)
+    face_model.get_face_model()
+
+
+def _embed_image(job):
+    """
+    Devuelve (rut, nombre_archivo, embedding, calidad, error).
+    """
+    import cv2
+    from .face_model import get_face_model
+    from .face_utils import face_quality, largest_face
+
+    rut, name, raw = job
+    try:
+        img = cv2.imdecode(np.frombuffer(raw, np.uint8), cv2.IMREAD_COLOR)
+        if img is None:
+            return rut, name, None, None, "No se pudo leer la imagen"
+
+        faces = get_face_model().get(img)
+        if not faces:
+            return rut, name, None, None, "No se detectó ningún rostro"
+
+        face = largest_face(faces)
+        return rut, name, np.asarray(face.embedding, dtype=np.float32), face_quality(img, face), None
+    except Exception as e:
+        return rut, name, None, None, str(e)
+
+
+def extract_embeddings(jobs, workers: int = 0):
+    """
+    jobs: iterable de (rut, nombre_archivo, bytes).
+    workers <= 1 procesa en el proceso actual con el modelo compartido.
+    """
+    if workers <= 1:
+        for job in jobs:
+            yield _embed_image(job)
+        return
+
+    from .face_model import _OPTIONS
+
+    # pool.map consumiría todo `jobs` de inmediato: se mantiene una ventana
+    # acotada de futures y los resultados salen en orden.
+    window = workers * IN_FLIGHT_PER_WORKER
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_init_worker,
+        initargs=(dict(_OPTIONS),),
+    ) as pool:
+        pending = deque()
+        for job in jobs:
+            pending.append(pool.submit(_embed_image, job))
+            if len(pending) >= window:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+# ---------- Escritura en BD ----------
+
+def enroll_batch(source, workers: int = 0, storage: str = "json",
+                 mode: str = "mean", top_n: int = 3) -> dict:
+    """
+    Enrola todas las imágenes de `source` y devuelve un resumen con
+    throughput y fallas por imagen. Las plantillas activas previas de cada
+    cliente enrolado se desactivan.
+    """
+    from .face_index import reload_face_index
+    from .face_storage import template_columns
+    from .face_utils import build_templates
+
+    t0 = time.perf_counter()
+
+    clientes = {
+        normalizar_rut(rut): cliente_id
+        for cliente_id, rut in db.session.query(Cliente.cliente_id, Cliente.rut)
+    }
+
+    failures = []
+    samples = {}
+    total = 0
+
+    for rut, name, embedding, quality, error in extract_embeddings(iter_images(source), workers=workers):
+        total += 1
+        if error:
+            failures.append({"archivo": name, "rut": rut, "error": error})
+            continue
+
+        cliente_id = clientes.get(normalizar_rut(rut))
+        if cliente_id is None:
+            failures.append({"archivo": name, "rut": rut, "error": "Cliente no encontrado"})
+            continue
+
+        samples.setdefault(cliente_id, []).append((embedding, quality))
+
+    rows = []
+    for cliente_id, cliente_samples in samples.items():
+        for embedding, quality in build_templates(cliente_samples, mode=mode, top_n=top_n):
+            rows.append({
+                "cliente_id": cliente_id,
+                "model_name": "insightface",
+                "model_version": "buffalo_l",
+                "quality_score": round(quality * 100, 2),
+                "is_active": True,
+                **template_columns(embedding, storage=storage, model_tag="buffalo_l"),
+            })
+
+    embed_s = time.perf_counter() - t0
+    cliente_ids = sorted({r["cliente_id"] for r in rows})
+
+    if rows:
+        try:
+            (
+                FaceTemplate.query
+                .filter(FaceTemplate.cliente_id.in_(cliente_ids), FaceTemplate.is_active == True)
+                .update({"is_active": False}, synchronize_session=False)
+            )
+            db.session.execute(insert(FaceTemplate), rows)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+
+        reload_face_index()
+
+    elapsed = time.perf_counter() - t0
+    return {
+        "imagenes": total,
+        "plantillas": len(rows),
+        "clientes": len(cliente_ids),
+        "fallas": failures,
+        "segundos": round(elapsed, 2),
+        "segundos_embedding": round(embed_s, 2),
+        "imagenes_por_segundo": round(total / embed_s, 2) if embed_s > 0 else None,
+    }
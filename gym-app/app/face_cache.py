@@ -0,0 +1,166 @@
+# app/face_cache.py
+"""
+Cache de corta duración de resultados de /api/face/identify.
+
+En el torniquete la misma persona suele enviarse 3-5 veces en pocos
+segundos. El probe se ubica en buckets LSH (signo de proyecciones sobre
+hiperplanos aleatorios fijos) de varias tablas: con pocos bits por tabla dos
+capturas de la misma cara (coseno ~0.9) comparten bucket en al menos una
+tabla y se reutiliza el resultado anterior sin escanear el índice. Los
+candidatos se confirman con similitud coseno para no confundir a dos
+personas que compartan bucket.
+
+Probabilidad de hit con coseno s: 1 - (1 - (1 - acos(s)/pi)^bits)^tables;
+con 6 bits x 8 tablas es ~98% en s=0.9 (con 16 bits y una tabla era ~3%).
+
+Sólo se cachean resultados que superan el umbral de match. Las entradas
+expiran a los FACE_CACHE_TTL segundos y se invalidan cuando cambian las
+plantillas del cliente asociado o se recarga el índice.
+"""
+import itertools
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from .face_index import EMBEDDING_DIM, normalize_embedding
+
+
+class ProbeCache:
+    def __init__(self, ttl: float = 5.0, bits: int = 6, tables: int = 8, min_similarity: float = 0.9,
+                 max_entries: int = 1024, dim: int = EMBEDDING_DIM, seed: int = 0):
+        self.ttl = ttl
+        self.bits = bits
+        self.tables = tables
+        self.min_similarity = min_similarity
+        self.max_entries = max_entries
+        self._planes = np.random.default_rng(seed).standard_normal((tables * bits, dim)).astype(np.float32)
+        self._weights = (1 << np.arange(bits, dtype=np.int64))
+        # entry_id -> (expira, probe, cliente_id, score, keys); en orden de inserción
+        self._entries = OrderedDict()
+        # Una tabla por grupo de bits: key -> {entry_id}
+        self._buckets = [dict() for _ in range(tables)]
+        self._ids = itertools.count()
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "expirados": 0, "invalidados": 0}
+
+    def _keys(self, probe) -> tuple:
+        bits = (self._planes @ probe > 0).reshape(self.tables, self.bits)
+        return tuple(int(k) for k in bits @ self._weights)
+
+    def _drop(self, entry_id):
+        entry = self._entries.pop(entry_id)
+        for table, key in zip(self._buckets, entry[4]):
+            bucket = table.get(key)
+            if bucket is not None:
+                bucket.discard(entry_id)
+                if not bucket:
+                    del table[key]
+        return entry
+
+    def _purge_expired(self, now):
+        # TTL constante: las primeras en entrar son las primeras en expirar
+        while self._entries:
+            entry_id, entry = next(iter(self._entries.items()))
+            if entry[0] > now:
+                break
+            self._drop(entry_id)
+            self.stats["expirados"] += 1
+
+    def get(self, probe):
+        """
+        Devuelve (cliente_id, score) del resultado cacheado o None.
+        """
+        probe = normalize_embedding(probe)
+        keys = self._keys(probe)
+
+        with self._lock:
+            self._purge_expired(time.monotonic())
+
+            candidates = set()
+            for table, key in zip(self._buckets, keys):
+                candidates |= table.get(key, set())
+
+            best, best_sim = None, self.min_similarity
+            for entry_id in candidates:
+                _, cached_probe, cliente_id, score, _ = self._entries[entry_id]
+                sim = float(cached_probe @ probe)
+                if sim >= best_sim:
+                    best, best_sim = (cliente_id, score), sim
+
+            self.stats["hits" if best is not None else "misses"] += 1
+            return best
+
+    def put(self, probe, cliente_id: int, score: float):
+        probe = normalize_embedding(probe)
+        keys = self._keys(probe)
+        now = time.monotonic()
+
+        with self._lock:
+            self._purge_expired(now)
+            entry_id = next(self._ids)
+            self._entries[entry_id] = (now + self.ttl, probe, int(cliente_id), float(score), keys)
+            for table, key in zip(self._buckets, keys):
+                table.setdefault(key, set()).add(entry_id)
+            while len(self._entries) > self.max_entries:
+                self._drop(next(iter(self._entries)))
+
+    def invalidate_cliente(self, cliente_id: int):
+        with self._lock:
+            for entry_id in [i for i, e in self._entries.items() if e[2] == cliente_id]:
+                self._drop(entry_id)
+                self.stats["invalidados"] += 1
+
+    def clear(self):
+        with self._lock:
+            self.stats["invalidados"] += len(self._entries)
+            self._entries.clear()
+            for table in self._buckets:
+                table.clear()
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            lookups = self.stats["hits"] + self.stats["misses"]
+            return {
+                **self.stats,
+                "entradas": len(self._entries),
+                "hit_rate": round(self.stats["hits"] / lookups, 4) if lookups else None,
+                "ttl": self.ttl,
+            }
+
+
+_CACHE = None
+_CACHE_LOCK = threading.Lock()
+
+
+def configure(config):
+    """
+    Crea el cache del proceso desde app.config (FACE_CACHE_TTL = 0 lo desactiva).
+    """
+    global _CACHE
+    ttl = float(config.get("FACE_CACHE_TTL", 0) or 0)
+    with _CACHE_LOCK:
+        if ttl <= 0:
+            _CACHE = None
+            return
+        _CACHE = ProbeCache(
+            ttl=ttl,
+            bits=int(config.get("FACE_CACHE_BITS", 6)),
+            tables=int(config.get("FACE_CACHE_TABLES", 8)),
+            min_similarity=float(config.get("FACE_CACHE_MIN_SIMILARITY", 0.9)),
+        )
+
+
+def get_probe_cache():
+    return _CACHE
+
+
+def invalidate_cliente(cliente_id: int):
+    if _CACHE is not None:
+        _CACHE.invalidate_cliente(cliente_id)
+
+
+def clear():
+    if _CACHE is not None:
+        _CACHE.clear()
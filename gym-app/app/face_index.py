@@ -0,0 +1,590 @@
+# app/face_index.py
+"""
+Índice en memoria de embeddings faciales.
+
+Mantiene una matriz float32 ya normalizada (una fila por plantilla activa)
+junto a los arrays de cliente_id / face_template_id, de modo que
+/api/face/identify se resuelve con un único producto matriz-vector en vez de
+recorrer todas las plantillas de la base de datos en cada request.
+
+Backends (FACE_INDEX_BACKEND):
+  - "exact": escaneo completo de la matriz (por defecto).
+  - "ivf":   partición por clusters (k-means esférico en NumPy); sólo se
+             revisan FACE_INDEX_NPROBE clusters por consulta (0 = derivado
+             de nlist). Más nprobe = más recall y más latencia.
+
+Con FACE_INDEX_PATH el índice se guarda/lee de disco (`flask face-index-build`)
+para que los workers no tengan que reconstruirlo al arrancar.
+"""
+import os
+import threading
+import time
+
+import numpy as np
+from flask import current_app
+from sqlalchemy import func
+
+from . import db
+from .models import FaceTemplate
+from .face_storage import decode_embedding, template_vector
+
+EMBEDDING_DIM = 512
+
+# nprobe automático del IVF: fracción de las listas revisadas por consulta
+AUTO_NPROBE_FRACTION = 1 / 16
+AUTO_NPROBE_MIN = 8
+
+
+def normalize_embedding(embedding) -> np.ndarray:
+    vec = np.asarray(embedding, dtype=np.float32).reshape(-1)
+    norm = np.linalg.norm(vec)
+    if norm == 0:
+        return vec
+    return vec / norm
+
+
+class FaceIndex:
+    """
+    Búsqueda exacta por similitud coseno sobre una matriz pre-normalizada.
+
+    Las escrituras reemplazan los arrays completos bajo lock, por lo que una
+    búsqueda concurrente siempre ve una foto consistente del índice.
+    """
+
+    backend = "exact"
+
+    def __init__(self, dim: int = EMBEDDING_DIM):
+        self.dim = dim
+        self._lock = threading.RLock()
+        self._matrix = np.empty((0, dim), dtype=np.float32)
+        self._cliente_ids = np.empty(0, dtype=np.int64)
+        self._template_ids = np.empty(0, dtype=np.int64)
+        self.loaded_at = None
+
+    def __len__(self):
+        return int(self._cliente_ids.shape[0])
+
+    def _snapshot(self):
+        with self._lock:
+            return self._matrix, self._cliente_ids, self._template_ids
+
+    @property
+    def max_template_id(self) -> int:
+        return int(self._template_ids.max()) if len(self) else 0
+
+    def load(self, rows):
+        """
+        rows: iterable de (face_template_id, cliente_id, embedding).
+        """
+        template_ids, cliente_ids, vectors = [], [], []
+        for template_id, cliente_id, embedding in rows:
+            if embedding is None:
+                continue
+            template_ids.append(template_id)
+            cliente_ids.append(cliente_id)
+            vectors.append(normalize_embedding(embedding))
+
+        if vectors:
+            matrix = np.vstack(vectors).astype(np.float32, copy=False)
+        else:
+            matrix = np.empty((0, self.dim), dtype=np.float32)
+
+        self._set_arrays(
+            matrix,
+            np.asarray(cliente_ids, dtype=np.int64),
+            np.asarray(template_ids, dtype=np.int64),
+        )
+        self.loaded_at = time.monotonic()
+
+    def _set_arrays(self, matrix, cliente_ids, template_ids):
+        with self._lock:
+            self._matrix = matrix
+            self._cliente_ids = cliente_ids
+            self._template_ids = template_ids
+
+    def add(self, template_id: int, cliente_id: int, embedding):
+        self.add_many([(template_id, cliente_id, embedding)])
+
+    def add_many(self, rows):
+        """
+        rows: iterable de (face_template_id, cliente_id, embedding).
+        """
+        rows = _as_arrays(rows, self.dim)
+        if rows is None:
+            return
+        matrix, cliente_ids, template_ids = rows
+        with self._lock:
+            self._set_arrays(
+                np.vstack([self._matrix, matrix]),
+                np.concatenate([self._cliente_ids, cliente_ids]),
+                np.concatenate([self._template_ids, template_ids]),
+            )
+
+    def remove_cliente(self, cliente_id: int):
+        with self._lock:
+            keep = self._cliente_ids != cliente_id
+            if keep.all():
+                return
+            self._set_arrays(
+                self._matrix[keep],
+                self._cliente_ids[keep],
+                self._template_ids[keep],
+            )
+
+    def search(self, probe, k: int = 1):
+        """
+        Devuelve hasta k tuplas (cliente_id, score, face_template_id) ordenadas
+        por score descendente, con un solo resultado por cliente.
+        """
+        matrix, cliente_ids, template_ids = self._snapshot()
+        if matrix.shape[0] == 0:
+            return []
+        return _top_k(matrix @ normalize_embedding(probe), cliente_ids, template_ids, k)
+
+    # ---------- Persistencia ----------
+
+    def _state(self) -> dict:
+        return {
+            "matrix": self._matrix,
+            "cliente_ids": self._cliente_ids,
+            "template_ids": self._template_ids,
+        }
+
+    def _restore(self, state: dict):
+        self._set_arrays(
+            state["matrix"].astype(np.float32, copy=False),
+            state["cliente_ids"].astype(np.int64, copy=False),
+            state["template_ids"].astype(np.int64, copy=False),
+        )
+
+    def save(self, path: str):
+        with self._lock:
+            state = self._state()
+        tmp = f"{path}.tmp"
+        with open(tmp, "wb") as fh:
+            np.savez(fh, backend=np.asarray(self.backend), **state)
+        os.replace(tmp, path)
+
+
+def _as_arrays(rows, dim):
+    """
+    (matrix, cliente_ids, template_ids) de filas (template_id, cliente_id,
+    embedding), o None si no hay ninguna con embedding.
+    """
+    rows = [r for r in rows if r[2] is not None]
+    if not rows:
+        return None
+    return (
+        np.vstack([normalize_embedding(e) for _, _, e in rows]).astype(np.float32, copy=False).reshape(-1, dim),
+        np.asarray([c for _, c, _ in rows], dtype=np.int64),
+        np.asarray([t for t, _, _ in rows], dtype=np.int64),
+    )
+
+
+def _top_k(scores, cliente_ids, template_ids, k):
+    n = scores.shape[0]
+    if n == 0:
+        return []
+
+    if k == 1:
+        order = [int(np.argmax(scores))]
+    else:
+        # Un cliente puede tener varias plantillas: pedimos candidatos de
+        # sobra y luego deduplicamos por cliente.
+        kk = min(n, k * 4)
+        top = np.argpartition(-scores, kk - 1)[:kk]
+        order = top[np.argsort(-scores[top])]
+
+    out, seen = [], set()
+    for i in order:
+        cid = int(cliente_ids[i])
+        if cid in seen:
+            continue
+        seen.add(cid)
+        out.append((cid, float(scores[i]), int(template_ids[i])))
+        if len(out) >= k:
+            break
+    return out
+
+
+def _train_centroids(matrix, nlist: int, iters: int, seed: int) -> np.ndarray:
+    """
+    K-means esférico (producto punto sobre vectores unitarios).
+    Entrena sobre una muestra acotada para que el costo no crezca con n.
+    """
+    rng = np.random.default_rng(seed)
+    n = matrix.shape[0]
+    nlist = max(1, min(nlist, n))
+
+    sample = matrix
+    if n > nlist * 64:
+        sample = matrix[rng.choice(n, nlist * 64, replace=False)]
+
+    centroids = sample[rng.choice(sample.shape[0], nlist, replace=False)].copy()
+
+    for _ in range(iters):
+        assign = _nearest_centroid(sample, centroids)
+        order = np.argsort(assign, kind="stable")
+        counts = np.bincount(assign, minlength=nlist)
+        starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+
+        sums = np.zeros_like(centroids)
+        used = counts > 0
+        sums[used] = np.add.reduceat(sample[order], starts[used], axis=0)
+
+        norms = np.linalg.norm(sums, axis=1, keepdims=True)
+        # Un cluster vacío conserva su centroide anterior
+        centroids = np.where(norms > 0, sums / np.maximum(norms, 1e-12), centroids)
+
+    return centroids.astype(np.float32, copy=False)
+
+
+def _nearest_centroid(matrix, centroids, chunk: int = 8192) -> np.ndarray:
+    out = np.empty(matrix.shape[0], dtype=np.int64)
+    for start in range(0, matrix.shape[0], chunk):
+        block = matrix[start:start + chunk]
+        out[start:start + chunk] = np.argmax(block @ centroids.T, axis=1)
+    return out
+
+
+class IVFFaceIndex(FaceIndex):
+    """
+    Índice particionado (IVF): las filas se agrupan por centroide y se guardan
+    contiguas, así una consulta sólo multiplica contra los `nprobe` clusters
+    más cercanos al probe.
+
+    Los centroides se reentrenan sólo cuando el índice duplica su tamaño
+    respecto del último entrenamiento. El resto de altas y bajas asigna sólo
+    las filas nuevas a su centroide y las inserta/quita de su lista, sin
+    reasignar el índice completo.
+
+    Con nprobe = 0 se revisa una fracción fija de las listas
+    (AUTO_NPROBE_FRACTION, mínimo AUTO_NPROBE_MIN), así el recall no cae al
+    crecer nlist con el índice.
+    """
+
+    backend = "ivf"
+
+    def __init__(self, dim: int = EMBEDDING_DIM, nlist: int = 0, nprobe: int = 0,
+                 train_iters: int = 10, seed: int = 0):
+        super().__init__(dim)
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.train_iters = train_iters
+        self.seed = seed
+        self.trained_on = 0
+        self._centroids = None
+        self._offsets = np.zeros(1, dtype=np.int64)
+
+    def _target_nlist(self, n: int) -> int:
+        if self.nlist > 0:
+            return self.nlist
+        return max(1, int(4 * np.sqrt(n)))
+
+    def effective_nprobe(self, nlist: int = None) -> int:
+        nlist = nlist if nlist is not None else (self._centroids.shape[0] if self._centroids is not None else 1)
+        if self.nprobe > 0:
+            return max(1, min(self.nprobe, nlist))
+        return min(nlist, max(AUTO_NPROBE_MIN, int(np.ceil(nlist * AUTO_NPROBE_FRACTION))))
+
+    def _set_arrays(self, matrix, cliente_ids, template_ids):
+        with self._lock:
+            n = matrix.shape[0]
+            if n and (self._centroids is None or n > 2 * self.trained_on):
+                self._centroids = _train_centroids(
+                    matrix, self._target_nlist(n), self.train_iters, self.seed
+                )
+                self.trained_on = n
+
+            if self._centroids is None:
+                super()._set_arrays(matrix, cliente_ids, template_ids)
+                self._offsets = np.zeros(1, dtype=np.int64)
+                return
+
+            assign = _nearest_centroid(matrix, self._centroids)
+            order = np.argsort(assign, kind="stable")
+            counts = np.bincount(assign, minlength=self._centroids.shape[0])
+
+            super()._set_arrays(matrix[order], cliente_ids[order], template_ids[order])
+            self._offsets = np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+
+    def add_many(self, rows):
+        rows = _as_arrays(rows, self.dim)
+        if rows is None:
+            return
+        matrix, cliente_ids, template_ids = rows
+
+        with self._lock:
+            if self._centroids is None or len(self) + matrix.shape[0] > 2 * self.trained_on:
+                # Reentrenamiento: sólo cada vez que el índice duplica su tamaño
+                self._set_arrays(
+                    np.vstack([self._matrix, matrix]),
+                    np.concatenate([self._cliente_ids, cliente_ids]),
+                    np.concatenate([self._template_ids, template_ids]),
+                )
+                return
+
+            assign = _nearest_centroid(matrix, self._centroids)
+            order = np.argsort(assign, kind="stable")
+            assign = assign[order]
+
+            # Cada fila nueva va al final de su lista
+            pos = self._offsets[assign + 1]
+            counts = np.bincount(assign, minlength=self._centroids.shape[0])
+            FaceIndex._set_arrays(
+                self,
+                np.insert(self._matrix, pos, matrix[order], axis=0),
+                np.insert(self._cliente_ids, pos, cliente_ids[order]),
+                np.insert(self._template_ids, pos, template_ids[order]),
+            )
+            self._offsets = self._offsets + np.concatenate([[0], np.cumsum(counts)])
+
+    def remove_cliente(self, cliente_id: int):
+        with self._lock:
+            drop = self._cliente_ids == cliente_id
+            if not drop.any():
+                return
+            if self._centroids is None:
+                return super().remove_cliente(cliente_id)
+
+            # Lista de cada fila quitada según los offsets actuales
+            lists = np.searchsorted(self._offsets, np.flatnonzero(drop), side="right") - 1
+            counts = np.bincount(lists, minlength=self._centroids.shape[0])
+            keep = ~drop
+            FaceIndex._set_arrays(self, self._matrix[keep], self._cliente_ids[keep], self._template_ids[keep])
+            self._offsets = self._offsets - np.concatenate([[0], np.cumsum(counts)])
+
+    def search(self, probe, k: int = 1):
+        with self._lock:
+            matrix, cliente_ids, template_ids = self._matrix, self._cliente_ids, self._template_ids
+            centroids, offsets = self._centroids, self._offsets
+
+        if centroids is None or matrix.shape[0] == 0:
+            return []
+
+        probe = normalize_embedding(probe)
+        nprobe = self.effective_nprobe(centroids.shape[0])
+        lists = np.argpartition(-(centroids @ probe), nprobe - 1)[:nprobe]
+
+        ranges = [(offsets[c], offsets[c + 1]) for c in lists if offsets[c + 1] > offsets[c]]
+        if not ranges:
+            return []
+
+        scores = np.concatenate([matrix[a:b] @ probe for a, b in ranges])
+        idx = np.concatenate([np.arange(a, b) for a, b in ranges])
+        return _top_k(scores, cliente_ids[idx], template_ids[idx], k)
+
+    def _state(self) -> dict:
+        state = super()._state()
+        state.update({
+            "centroids": self._centroids if self._centroids is not None
+            else np.empty((0, self.dim), dtype=np.float32),
+            "offsets": self._offsets,
+            "nlist": np.asarray(self.nlist),
+            "trained_on": np.asarray(self.trained_on),
+        })
+        return state
+
+    def _restore(self, state: dict):
+        # Las filas ya vienen ordenadas por cluster: no se reentrena
+        centroids = state["centroids"].astype(np.float32, copy=False)
+        with self._lock:
+            FaceIndex._set_arrays(
+                self,
+                state["matrix"].astype(np.float32, copy=False),
+                state["cliente_ids"].astype(np.int64, copy=False),
+                state["template_ids"].astype(np.int64, copy=False),
+            )
+            self._centroids = centroids if centroids.shape[0] else None
+            self._offsets = state["offsets"].astype(np.int64, copy=False)
+            self.nlist = int(state["nlist"])
+            self.trained_on = int(state["trained_on"])
+
+
+INDEX_BACKENDS = {
+    FaceIndex.backend: FaceIndex,
+    IVFFaceIndex.backend: IVFFaceIndex,
+}
+
+
+def new_index(backend: str = "exact", nlist: int = 0, nprobe: int = 0) -> FaceIndex:
+    if backend not in INDEX_BACKENDS:
+        raise ValueError(f"Backend de índice facial desconocido: {backend}")
+    if backend == IVFFaceIndex.backend:
+        return IVFFaceIndex(nlist=nlist, nprobe=nprobe)
+    return FaceIndex()
+
+
+def load_index_file(path: str) -> FaceIndex:
+    with np.load(path, allow_pickle=False) as data:
+        state = {key: data[key] for key in data.files}
+
+    backend = str(state.pop("backend"))
+    if backend not in INDEX_BACKENDS:
+        raise ValueError(f"Backend de índice facial desconocido: {backend}")
+
+    index = INDEX_BACKENDS[backend](dim=state["matrix"].shape[1])
+    index._restore(state)
+    index.loaded_at = time.monotonic()
+    return index
+
+
+def recall_at_k(index: FaceIndex, reference: FaceIndex, probes, k: int = 1) -> float:
+    """
+    Fracción de probes cuyo mejor cliente según `reference` (búsqueda exacta)
+    aparece entre los k primeros de `index`.
+    """
+    hits, total = 0, 0
+    for probe in probes:
+        expected = reference.search(probe, k=1)
+        if not expected:
+            continue
+        total += 1
+        got = {cid for cid, _, _ in index.search(probe, k=k)}
+        if expected[0][0] in got:
+            hits += 1
+    return hits / total if total else 1.0
+
+
+_INDEX = None
+_INDEX_LOCK = threading.Lock()
+
+
+def _active_template_rows():
+    """
+    (face_template_id, cliente_id, vector) de las plantillas activas. Las
+    que tienen embedding_blob se leen sin la columna JSON (en SQLite
+    `face-templates-compact` la conserva); el JSON sólo se lee para las
+    que aún no se migraron.
+    """
+    activas = FaceTemplate.is_active == True
+
+    binarias = (
+        db.session.query(FaceTemplate.face_template_id, FaceTemplate.cliente_id, FaceTemplate.embedding_blob)
+        .filter(activas, FaceTemplate.embedding_blob.isnot(None))
+        .yield_per(1000)
+    )
+    for template_id, cliente_id, blob in binarias:
+        yield template_id, cliente_id, decode_embedding(blob)
+
+    legacy = (
+        db.session.query(FaceTemplate.face_template_id, FaceTemplate.cliente_id, FaceTemplate.embedding)
+        .filter(activas, FaceTemplate.embedding_blob.is_(None))
+        .yield_per(1000)
+    )
+    for template_id, cliente_id, embedding in legacy:
+        yield template_id, cliente_id, template_vector(None, embedding)
+
+
+def _is_stale(index) -> bool:
+    max_age = current_app.config.get("FACE_INDEX_MAX_AGE", 0)
+    if not max_age or index.loaded_at is None:
+        return False
+    return time.monotonic() - index.loaded_at > max_age
+
+
+def _db_signature():
+    count, max_id = (
+        db.session.query(
+            func.count(FaceTemplate.face_template_id),
+            func.max(FaceTemplate.face_template_id),
+        )
+        .filter(FaceTemplate.is_active == True)
+        .one()
+    )
+    return int(count or 0), int(max_id or 0)
+
+
+def build_index_from_db(backend: str = None, nlist: int = None, nprobe: int = None) -> FaceIndex:
+    cfg = current_app.config
+    index = new_index(
+        backend or cfg.get("FACE_INDEX_BACKEND", "exact"),
+        nlist=cfg.get("FACE_INDEX_NLIST", 0) if nlist is None else nlist,
+        nprobe=cfg.get("FACE_INDEX_NPROBE", 0) if nprobe is None else nprobe,
+    )
+    index.load(_active_template_rows())
+    return index
+
+
+def _open_index() -> FaceIndex:
+    """
+    Usa el índice persistido en FACE_INDEX_PATH si existe y corresponde al
+    backend configurado; si la BD cambió desde que se guardó, recarga las
+    filas (el IVF reutiliza sus centroides, que es lo caro de construir).
+    """
+    cfg = current_app.config
+    path = cfg.get("FACE_INDEX_PATH")
+    backend = cfg.get("FACE_INDEX_BACKEND", "exact")
+
+    index = None
+    if path and os.path.exists(path):
+        try:
+            index = load_index_file(path)
+        except Exception as e:
+            print(f"[WARN] No se pudo leer el índice facial {path}: {e}")
+
+    if index is None or index.backend != backend:
+        return build_index_from_db()
+
+    if isinstance(index, IVFFaceIndex):
+        index.nprobe = cfg.get("FACE_INDEX_NPROBE", index.nprobe)
+
+    if _db_signature() != (len(index), index.max_template_id):
+        index.load(_active_template_rows())
+    return index
+
+
+def get_face_index() -> FaceIndex:
+    """
+    Índice del proceso, cargado perezosamente (desde disco o face_templates).
+
+    Con FACE_INDEX_MAX_AGE > 0 se recarga periódicamente para recoger
+    enrolamientos hechos por otros workers.
+    """
+    global _INDEX
+    with _INDEX_LOCK:
+        if _INDEX is None:
+            _INDEX = _open_index()
+        elif _is_stale(_INDEX):
+            # Pudo cambiar la plantilla de un cliente en otro worker
+            from . import face_cache
+            face_cache.clear()
+            _INDEX.load(_active_template_rows())
+        return _INDEX
+
+
+def update_cliente_templates(cliente_id: int, templates):
+    """
+    Refleja en el índice un cambio de plantillas ya commiteado.
+    templates: iterable de (face_template_id, embedding) activos del cliente.
+
+    Si el índice aún no se cargó no hace nada: la primera carga leerá la BD.
+    """
+    from . import face_cache
+    face_cache.invalidate_cliente(cliente_id)
+
+    index = _INDEX
+    if index is None:
+        return
+    with index._lock:
+        index.remove_cliente(cliente_id)
+        index.add_many((template_id, cliente_id, embedding) for template_id, embedding in templates)
+
+
+def reload_face_index():
+    """
+    Recarga desde la BD un índice ya cargado (p.ej. tras un enrolamiento
+    masivo); si aún no se cargó no hace nada.
+    """
+    from . import face_cache
+    face_cache.clear()
+
+    with _INDEX_LOCK:
+        if _INDEX is not None:
+            _INDEX.load(_active_template_rows())
+
+
+def reset_face_index():
+    global _INDEX
+    with _INDEX_LOCK:
+        _INDEX = None
@@ -0,0 +1,177 @@
+# app/face_model.py
+"""
+Registro único del modelo InsightFace (buffalo_l) para todo el proceso.
+
+Todas las rutas faciales obtienen el modelo con get_face_model(); así un
+worker carga las sesiones ONNX una sola vez. warm_up() ejecuta una inferencia
+de prueba para que el primer check-in real no pague la inicialización.
+
+Opciones (ver configure()):
+  - FACE_DET_SIZE: resolución de detección, "640" o "320,256".
+  - FACE_MODULES: sub-modelos de buffalo_l a cargar. Por defecto sólo
+    detección + reconocimiento (se omiten landmarks 2d/3d y genderage,
+    que el check-in no usa).
+  - FACE_INTRA_OP_THREADS / FACE_INTER_OP_THREADS: hilos de ONNX Runtime
+    (0 = lo que decida ORT).
+  - FACE_GRAPH_OPT_LEVEL: disable | basic | extended | all.
+"""
+import threading
+
+import numpy as np
+
+MODEL_NAME = "buffalo_l"
+
+_MODEL = None
+_MODEL_LOCK = threading.Lock()
+_READY = False
+
+# Sub-modelos de buffalo_l por archivo, para no cargar los que no se usan
+BUFFALO_L_FILES = {
+    "det_10g.onnx": "detection",
+    "w600k_r50.onnx": "recognition",
+    "1k3d68.onnx": "landmark_3d_68",
+    "2d106det.onnx": "landmark_2d_106",
+    "genderage.onnx": "genderage",
+}
+
+_OPTIONS = {
+    "det_size": (640, 640),
+    "modules": ["detection", "recognition"],
+    "intra_op_threads": 0,
+    "inter_op_threads": 0,
+    "graph_opt_level": "all",
+}
+
+
+def parse_det_size(raw) -> tuple:
+    parts = [int(p) for p in str(raw).replace("x", ",").split(",") if p.strip()]
+    if len(parts) == 1:
+        return parts[0], parts[0]
+    return parts[0], parts[1]
+
+
+def configure(config):
+    """
+    Toma las opciones del modelo desde app.config. Debe llamarse antes de la
+    primera carga (create_app lo hace).
+    """
+    _OPTIONS.update({
+        "det_size": parse_det_size(config.get("FACE_DET_SIZE", "640")),
+        "modules": [m.strip() for m in config.get("FACE_MODULES", "detection,recognition").split(",") if m.strip()],
+        "intra_op_threads": int(config.get("FACE_INTRA_OP_THREADS", 0) or 0),
+        "inter_op_threads": int(config.get("FACE_INTER_OP_THREADS", 0) or 0),
+        "graph_opt_level": config.get("FACE_GRAPH_OPT_LEVEL", "all"),
+    })
+
+
+def _session_options():
+    import onnxruntime as ort
+
+    levels = {
+        "disable": ort.GraphOptimizationLevel.ORT_DISABLE_ALL,
+        "basic": ort.GraphOptimizationLevel.ORT_ENABLE_BASIC,
+        "extended": ort.GraphOptimizationLevel.ORT_ENABLE_EXTENDED,
+        "all": ort.GraphOptimizationLevel.ORT_ENABLE_ALL,
+    }
+
+    so = ort.SessionOptions()
+    so.graph_optimization_level = levels.get(_OPTIONS["graph_opt_level"], levels["all"])
+    if _OPTIONS["intra_op_threads"]:
+        so.intra_op_num_threads = _OPTIONS["intra_op_threads"]
+    if _OPTIONS["inter_op_threads"]:
+        so.inter_op_num_threads = _OPTIONS["inter_op_threads"]
+        so.execution_mode = ort.ExecutionMode.ORT_PARALLEL
+    return so
+
+
+def _load_model():
+    """
+    Equivalente a FaceAnalysis(name=MODEL_NAME, allowed_modules=...), pero
+    cada sesión ONNX se crea una sola vez y ya con el tuning configurado:
+    insightface.model_zoo.get_model() no reenvía SessionOptions, así que se
+    usa ModelRouter directamente. Los archivos de sub-modelos conocidos que
+    no están en FACE_MODULES ni se abren.
+    """
+    import glob
+    import os
+
+    import onnxruntime as ort
+    from insightface.app import FaceAnalysis
+    from insightface.model_zoo.model_zoo import ModelRouter
+    from insightface.utils import ensure_available
+
+    ort.set_default_logger_severity(3)
+    providers = ["CPUExecutionProvider"]
+    allowed = set(_OPTIONS["modules"] or ())
+    so = _session_options()
+
+    model = FaceAnalysis.__new__(FaceAnalysis)
+    model.models = {}
+    model.model_dir = ensure_available("models", MODEL_NAME, root="~/.insightface")
+
+    for onnx_file in sorted(glob.glob(os.path.join(model.model_dir, "*.onnx"))):
+        known = BUFFALO_L_FILES.get(os.path.basename(onnx_file))
+        if allowed and known is not None and known not in allowed:
+            continue
+        sub = ModelRouter(onnx_file).get_model(sess_options=so, providers=providers)
+        if sub is None or (allowed and sub.taskname not in allowed) or sub.taskname in model.models:
+            continue
+        model.models[sub.taskname] = sub
+
+    if "detection" not in model.models:
+        raise RuntimeError(f"{MODEL_NAME}: no se encontró el modelo de detección en {model.model_dir}")
+    model.det_model = model.models["detection"]
+    model.prepare(ctx_id=-1, det_size=_OPTIONS["det_size"])
+    return model
+
+
+def get_face_model():
+    global _MODEL, _READY
+    if _MODEL is None:
+        with _MODEL_LOCK:
+            if _MODEL is None:
+                _MODEL = _load_model()
+                # Con FACE_WARMUP=0 la primera carga perezosa también deja
+                # listo al worker
+                _READY = True
+    return _MODEL
+
+
+def warm_up():
+    """
+    Carga el modelo y corre una inferencia con imágenes en negro: detección
+    sobre un frame completo y reconocimiento sobre un recorte 112x112, que es
+    lo que el detector no llega a ejecutar si no encuentra rostros.
+    """
+    model = get_face_model()
+
+    w, h = _OPTIONS["det_size"]
+    model.get(np.zeros((h, w, 3), dtype=np.uint8))
+
+    rec = getattr(model, "models", {}).get("recognition")
+    if rec is not None:
+        rec.get_feat(np.zeros((112, 112, 3), dtype=np.uint8))
+
+
+def is_ready() -> bool:
+    return _READY
+
+
+def start_warm_up(app):
+    """
+    Precalienta modelo e índice facial en un hilo para no bloquear el arranque
+    del worker; /api/face/ready responde 503 hasta que el modelo cargue.
+    """
+    def run():
+        try:
+            warm_up()
+            with app.app_context():
+                from .face_index import get_face_index
+                get_face_index()
+            print("[OK] Modelo facial precalentado")
+        except Exception as e:
+            print(f"[WARN] No se pudo precalentar el modelo facial: {e}")
+
+    t = threading.Thread(target=run, name="face-warmup", daemon=True)
+    t.start()
+    return t
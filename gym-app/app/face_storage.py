@@ -0,0 +1,126 @@
+# app/face_storage.py
+"""
+Formato binario compacto para FaceTemplate.embedding_blob.
+
+Layout (little-endian):
+  - cabecera de 24 bytes: magic b"GFE", versión del formato, dtype,
+    1 byte de relleno, dimensión (uint16) y etiqueta del modelo (16 bytes,
+    ASCII con relleno de ceros, p.ej. "buffalo_l").
+  - dim valores float32 (4 bytes c/u) o float16 (2 bytes c/u).
+
+Un embedding de 512 floats pasa de ~10 KB de JSON a 2 KB (float32) o
+1 KB (float16), y se lee con np.frombuffer sin parsear texto ni copiar.
+"""
+import struct
+
+import numpy as np
+
+MAGIC = b"GFE"
+FORMAT_VERSION = 1
+
+_HEADER = struct.Struct("<3sBBxH16s")
+HEADER_SIZE = _HEADER.size
+
+_DTYPES = {
+    1: np.dtype("<f4"),
+    2: np.dtype("<f2"),
+}
+_DTYPE_CODES = {
+    "float32": 1,
+    "float16": 2,
+}
+
+STORAGE_MODES = ("json",) + tuple(_DTYPE_CODES)
+
+
+def encode_embedding(embedding, dtype: str = "float32", model_tag: str = "buffalo_l") -> bytes:
+    if dtype not in _DTYPE_CODES:
+        raise ValueError(f"dtype no soportado: {dtype}")
+
+    code = _DTYPE_CODES[dtype]
+    vec = np.asarray(embedding, dtype=_DTYPES[code]).reshape(-1)
+    tag = (model_tag or "").encode("ascii", "ignore")[:16]
+
+    header = _HEADER.pack(MAGIC, FORMAT_VERSION, code, vec.shape[0], tag)
+    return header + vec.tobytes()
+
+
+def read_header(blob) -> dict:
+    magic, version, code, dim, tag = _HEADER.unpack_from(blob, 0)
+    if magic != MAGIC:
+        raise ValueError("embedding_blob con cabecera inválida")
+    if version != FORMAT_VERSION or code not in _DTYPES:
+        raise ValueError(f"embedding_blob con formato no soportado (v{version}, dtype {code})")
+    return {
+        "version": version,
+        "dtype": _DTYPES[code],
+        "dim": dim,
+        "model_tag": tag.rstrip(b"\0").decode("ascii"),
+    }
+
+
+def decode_embedding(blob) -> np.ndarray:
+    """
+    Vista de sólo lectura sobre los bytes del blob (sin copia).
+    """
+    header = read_header(blob)
+    return np.frombuffer(blob, dtype=header["dtype"], count=header["dim"], offset=HEADER_SIZE)
+
+
+def template_vector(embedding_blob, embedding):
+    """
+    Embedding de una plantilla, prefiriendo el formato binario si existe.
+    """
+    if embedding_blob:
+        return decode_embedding(embedding_blob)
+    if embedding is None:
+        return None
+    return np.asarray(embedding, dtype=np.float32)
+
+
+# None = aún no se consultó el esquema (ver embedding_json_required)
+_JSON_REQUIRED = None
+
+
+def embedding_json_required() -> bool:
+    """
+    True si face_templates.embedding es NOT NULL en la BD (esquema antiguo;
+    en SQLite `face-templates-compact` no lo puede relajar). Se consulta
+    una vez por proceso.
+    """
+    global _JSON_REQUIRED
+    if _JSON_REQUIRED is None:
+        from sqlalchemy import inspect
+
+        from . import db
+        from .models import FaceTemplate
+
+        columns = {c["name"]: c for c in inspect(db.engine).get_columns(FaceTemplate.__tablename__)}
+        _JSON_REQUIRED = not columns["embedding"]["nullable"]
+    return _JSON_REQUIRED
+
+
+def reset_embedding_schema():
+    """Olvida el resultado de embedding_json_required (tras un ALTER TABLE)."""
+    global _JSON_REQUIRED
+    _JSON_REQUIRED = None
+
+
+def template_columns(embedding, storage: str = "json", model_tag: str = "buffalo_l", keep_json=None) -> dict:
+    """
+    Valores de embedding / embedding_blob para un FaceTemplate nuevo según el
+    modo FACE_EMBEDDING_STORAGE ("json", "float32" o "float16").
+
+    keep_json: guardar también el JSON en modo binario. None = sólo si el
+    esquema lo exige (embedding NOT NULL).
+    """
+    vector = np.asarray(embedding, dtype=np.float32)
+    if storage == "json":
+        return {"embedding": vector.tolist(), "embedding_blob": None}
+
+    if keep_json is None:
+        keep_json = embedding_json_required()
+    return {
+        "embedding": vector.tolist() if keep_json else None,
+        "embedding_blob": encode_embedding(vector, dtype=storage, model_tag=model_tag),
+    }
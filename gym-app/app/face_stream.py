@@ -0,0 +1,214 @@
+# app/face_stream.py
+"""
+Check-in facial continuo.
+
+El kiosko abre un stream, envía frames (uno por POST o en un único POST
+chunked) y escucha los eventos de coincidencia por SSE. Cada stream tiene un
+solo "slot" de frame pendiente: si llega un frame mientras la inferencia
+anterior sigue corriendo, reemplaza al pendiente y el intermedio se descarta,
+así la latencia queda acotada aunque la cámara siga enviando.
+
+La detección sólo corre si hay movimiento respecto del frame anterior o si
+en el último frame procesado había un rostro.
+
+El estado vive en memoria del worker: los requests de un mismo stream deben
+llegar al mismo worker (sticky sessions o un solo worker con hilos).
+"""
+import json
+import threading
+import time
+import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+# Diferencia media (niveles de gris, 0-255) entre frames reducidos a 64x48
+# a partir de la cual se considera que hubo movimiento.
+MOTION_THRESHOLD = 4.0
+# Segundos durante los que no se repite el evento de un mismo cliente
+REPEAT_SECONDS = 10.0
+# Segundos sin frames ni oyentes antes de cerrar un stream
+IDLE_SECONDS = 300.0
+
+_STREAMS = {}
+_STREAMS_LOCK = threading.Lock()
+_EXECUTOR = None
+
+
+def _executor(workers: int = 2):
+    global _EXECUTOR
+    with _STREAMS_LOCK:
+        if _EXECUTOR is None:
+            _EXECUTOR = ThreadPoolExecutor(max_workers=max(workers, 1), thread_name_prefix="face-stream")
+        return _EXECUTOR
+
+
+class FaceStream:
+    def __init__(self, checkin: bool = False, auto_confirm: float = None):
+        self.id = uuid.uuid4().hex
+        self.checkin = checkin
+        self.auto_confirm = auto_confirm
+        self.last_seen = time.monotonic()
+        self.closed = False
+        self.stats = {"recibidos": 0, "descartados": 0, "sin_movimiento": 0, "procesados": 0}
+
+        self._cond = threading.Condition()
+        self._pending = None
+        self._running = False
+        self._prev_small = None
+        self._face_present = False
+        self._last_match = {}
+        self._events = deque(maxlen=100)
+        self._seq = 0
+
+    # ---------- Entrada de frames ----------
+
+    def submit(self, raw: bytes, app, workers: int = 2):
+        """
+        Deja el frame en el slot pendiente; si no hay inferencia en curso,
+        agenda el procesamiento. Nunca bloquea al que envía.
+        """
+        with self._cond:
+            self.last_seen = time.monotonic()
+            self.stats["recibidos"] += 1
+            if self._pending is not None:
+                self.stats["descartados"] += 1
+            self._pending = raw
+            if self._running or self.closed:
+                return
+            self._running = True
+
+        _executor(workers).submit(self._drain, app)
+
+    def _drain(self, app):
+        with app.app_context():
+            while True:
+                with self._cond:
+                    raw, self._pending = self._pending, None
+                    if raw is None or self.closed:
+                        self._running = False
+                        return
+                try:
+                    self._process(raw)
+                except Exception as e:
+                    # Sin rollback la sesión de este hilo queda inválida y
+                    # todos los frames siguientes fallarían
+                    from . import db
+                    db.session.rollback()
+                    self.publish({"type": "error", "detail": str(e)})
+
+    def _has_motion(self, img) -> bool:
+        import cv2
+
+        gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+        small = cv2.resize(gray, (64, 48), interpolation=cv2.INTER_AREA).astype(np.int16)
+        prev, self._prev_small = self._prev_small, small
+        if prev is None:
+            return True
+        return float(np.abs(small - prev).mean()) >= MOTION_THRESHOLD
+
+    def _process(self, raw: bytes):
+        import cv2
+        from .routes_face import MSG_NO_FACE, _identify_image, _registrar_entrada_facial
+
+        img = cv2.imdecode(np.frombuffer(raw, np.uint8), cv2.IMREAD_COLOR)
+        if img is None:
+            return
+
+        if not self._has_motion(img) and not self._face_present:
+            self._count("sin_movimiento")
+            return
+
+        self._count("procesados")
+        result, cliente = _identify_image(img)
+        self._face_present = result.get("message") != MSG_NO_FACE
+
+        if cliente is None:
+            return
+
+        now = time.monotonic()
+        if now - self._last_match.get(cliente.cliente_id, -REPEAT_SECONDS) < REPEAT_SECONDS:
+            return
+        self._last_match[cliente.cliente_id] = now
+
+        event = {"type": "match", **result, "checked_in": False}
+        if self.checkin and (self.auto_confirm is None or result["score"] >= self.auto_confirm):
+            entrada, _ = _registrar_entrada_facial(cliente, result["score"])
+            event.update(entrada)
+            event["checked_in"] = entrada["ok"]
+
+        self.publish(event)
+
+    def _count(self, key: str):
+        with self._cond:
+            self.stats[key] += 1
+
+    def stats_snapshot(self) -> dict:
+        with self._cond:
+            return dict(self.stats)
+
+    # ---------- Eventos ----------
+
+    def publish(self, event: dict):
+        with self._cond:
+            self._seq += 1
+            self._events.append((self._seq, event))
+            self._cond.notify_all()
+
+    def events_since(self, last_id: int, timeout: float = 15.0):
+        with self._cond:
+            self.last_seen = time.monotonic()
+            self._cond.wait_for(lambda: self._seq > last_id or self.closed, timeout=timeout)
+            return [(seq, ev) for seq, ev in self._events if seq > last_id]
+
+    def close(self):
+        with self._cond:
+            self.closed = True
+            self._cond.notify_all()
+
+
+def sse_format(seq: int, event: dict) -> str:
+    return f"id: {seq}\nevent: {event.get('type', 'message')}\ndata: {json.dumps(event, default=str)}\n\n"
+
+
+_LAST_PURGE = 0.0
+
+
+def _purge_idle():
+    """
+    Cierra los streams inactivos; se llama (con _STREAMS_LOCK) al abrir un
+    stream y en cada frame, a lo más una vez por segundo.
+    """
+    global _LAST_PURGE
+    now = time.monotonic()
+    if now - _LAST_PURGE < 1.0:
+        return
+    _LAST_PURGE = now
+    for stream_id, stream in list(_STREAMS.items()):
+        if now - stream.last_seen > IDLE_SECONDS:
+            stream.close()
+            _STREAMS.pop(stream_id, None)
+
+
+def open_stream(checkin: bool = False, auto_confirm: float = None) -> FaceStream:
+    stream = FaceStream(checkin=checkin, auto_confirm=auto_confirm)
+    with _STREAMS_LOCK:
+        _purge_idle()
+        _STREAMS[stream.id] = stream
+    return stream
+
+
+def get_stream(stream_id: str):
+    with _STREAMS_LOCK:
+        _purge_idle()
+        return _STREAMS.get(stream_id)
+
+
+def close_stream(stream_id: str) -> bool:
+    with _STREAMS_LOCK:
+        stream = _STREAMS.pop(stream_id, None)
+    if stream is None:
+        return False
+    stream.close()
+    return True
@@ -2,15 +2,11 @@ import numpy as np
 from PIL import Image
 import io
 
-_model = None
+from .face_model import get_face_model
+
 
 def _get_model():
-    global _model
-    if _model is None:
-        from insightface.app import FaceAnalysis
-        _model = FaceAnalysis(name="buffalo_l", providers=["CPUExecutionProvider"])
-        _model.prepare(ctx_id=0, det_size=(640, 640))
-    return _model
+    return get_face_model()
 
 def embedding_from_image_bytes(image_bytes: bytes) -> np.ndarray:
     img = Image.open(io.BytesIO(image_bytes)).convert("RGB")
@@ -30,3 +26,73 @@ def embedding_from_image_bytes(image_bytes: bytes) -> np.ndarray:
 
 def cosine_distance(a: np.ndarray, b: np.ndarray) -> float:
     return float(1.0 - np.dot(a, b))  # ambos normalizados
+
+
+# ---------- Calidad y plantillas de enrolamiento ----------
+
+# Lado mínimo del rostro (px) a partir del cual no se penaliza el tamaño:
+# es la resolución de entrada del modelo de reconocimiento.
+QUALITY_MIN_FACE_PX = 112
+# Varianza del laplaciano desde la cual el recorte se considera nítido
+QUALITY_SHARP_LAPLACIAN = 150.0
+
+
+def face_area(face) -> float:
+    return float((face.bbox[2] - face.bbox[0]) * (face.bbox[3] - face.bbox[1]))
+
+
+def largest_face(faces):
+    return max(faces, key=face_area)
+
+
+def face_quality(img: np.ndarray, face) -> float:
+    """
+    Puntaje 0..1 = score de detección x factor de tamaño x factor de nitidez.
+    img es el frame BGR completo; se mide el desenfoque sólo sobre el rostro.
+    """
+    import cv2
+
+    h, w = img.shape[:2]
+    x1, y1, x2, y2 = [int(round(v)) for v in face.bbox[:4]]
+    x1, y1 = max(x1, 0), max(y1, 0)
+    x2, y2 = min(x2, w), min(y2, h)
+    if x2 <= x1 or y2 <= y1:
+        return 0.0
+
+    det_score = float(getattr(face, "det_score", 1.0) or 0.0)
+    size_factor = min(min(x2 - x1, y2 - y1) / QUALITY_MIN_FACE_PX, 1.0)
+
+    gray = cv2.cvtColor(img[y1:y2, x1:x2], cv2.COLOR_BGR2GRAY)
+    sharpness = float(cv2.Laplacian(gray, cv2.CV_64F).var())
+    blur_factor = min(sharpness / QUALITY_SHARP_LAPLACIAN, 1.0)
+
+    return max(0.0, min(det_score, 1.0)) * size_factor * blur_factor
+
+
+def build_templates(samples, mode: str = "mean", top_n: int = 3):
+    """
+    samples: lista de (embedding, quality) de varios frames del mismo cliente.
+
+    mode="mean": una sola plantilla = promedio de embeddings normalizados
+                 ponderado por calidad.
+    mode="topn": las top_n muestras de mayor calidad, cada una su plantilla.
+
+    Devuelve lista de (embedding normalizado float32, quality).
+    """
+    if not samples:
+        return []
+
+    vectors = np.vstack([
+        np.asarray(e, dtype=np.float32) / (np.linalg.norm(e) + 1e-12) for e, _ in samples
+    ])
+    qualities = np.asarray([float(q or 0.0) for _, q in samples], dtype=np.float32)
+
+    if mode == "topn":
+        order = np.argsort(-qualities)[:max(top_n, 1)]
+        return [(vectors[i], float(qualities[i])) for i in order]
+
+    weights = qualities if qualities.sum() > 0 else np.ones_like(qualities)
+    mean = (vectors * weights[:, np.newaxis]).sum(axis=0) / weights.sum()
+    mean = mean / (np.linalg.norm(mean) + 1e-12)
+    quality = float((qualities * weights).sum() / weights.sum())
+    return [(mean.astype(np.float32), quality)]
@@ -0,0 +1,317 @@
+# app/live_events.py
+"""
+Feed en vivo de recepción y dashboard (/api/live/stream, Server-Sent Events).
+
+Cada asistencia o pago nuevo se publica como una fila de eventos_live en la
+misma transacción que lo inserta, así un evento existe sólo si el cambio se
+commiteó y su evento_id sirve como Last-Event-ID para reanudar.
+
+Por worker hay un único hilo lector que trae los eventos nuevos
+(evento_id > último visto, por PK) y los deja en un buffer en memoria del
+que leen todas las conexiones SSE del worker. En Postgres dos
+transacciones pueden commitear fuera del orden de sus ids: los ids que
+faltan bajo el último visto quedan como huecos y se vuelven a consultar
+hasta que aparecen o pasan GAP_SECONDS (rollback). El id SSE de cada
+evento es la marca de agua: todo id <= marca ya se entregó o se dio por
+perdido, así reanudar con Last-Event-ID no salta eventos tardíos (puede
+repetir alguno; los ids de asistencia/pago permiten descartarlo). El hilo despierta apenas se
+commitea un evento en el mismo worker y, para los de otros workers, cada
+LIVE_POLL_SECONDS; sólo consulta si hay conexiones abiertas. Tras cada
+lote se envía un evento "resumen" (sin id) con los contadores del día.
+
+Tipos:
+  - asistencia: mismos campos que cada ítem de /api/asistencias/hoy
+  - pago:       mismos campos que cada ítem de /api/pagos/hoy
+  - resumen:    entradas_hoy / ingresos_hoy como en /api/dashboard/resumen
+  - reset:      el Last-Event-ID es demasiado antiguo; volver a pedir las listas
+
+Cada conexión ocupa un hilo del worker mientras está abierta (gunicorn con
+--threads o gevent).
+"""
+import json
+import threading
+import time
+from collections import deque
+from datetime import timedelta
+
+from sqlalchemy import delete, event, func, insert, select
+from sqlalchemy.orm import Session
+
+from . import db
+from .models import Cliente, EventoLive, ahora_chile, hoy_chile
+
+# Segundos entre purgas de eventos más antiguos que LIVE_RETENTION_HOURS
+PURGE_SECONDS = 600
+# Segundos que se espera un id faltante (transacción aún sin commit) antes
+# de darlo por perdido, y máximo de huecos seguidos
+GAP_SECONDS = 30
+MAX_GAPS = 1000
+
+_PENDING = "live_events_pending"
+
+
+# ---------- Publicación (dentro de la transacción del cambio) ----------
+
+def publicar(tipo: str, payload: dict):
+    """
+    Agrega el evento a la transacción en curso (sin commit).
+    """
+    db.session.execute(
+        insert(EventoLive).values(tipo=tipo, payload=json.dumps(payload, default=str), creado=ahora_chile())
+    )
+    db.session.info[_PENDING] = True
+
+
+def publicar_varios(tipo: str, payloads: list):
+    """
+    Varios eventos del mismo tipo en un solo INSERT (sin commit).
+    """
+    if not payloads:
+        return
+    creado = ahora_chile()
+    db.session.execute(insert(EventoLive), [
+        {"tipo": tipo, "payload": json.dumps(p, default=str), "creado": creado} for p in payloads
+    ])
+    db.session.info[_PENDING] = True
+
+
+def asistencia_payload(asistencia_id, cliente_id, fecha_hora, tipo, cliente) -> dict:
+    return {
+        "asistencia_id": asistencia_id,
+        "cliente_id": cliente_id,
+        "nombre": cliente.nombre if cliente else None,
+        "apellido": cliente.apellido if cliente else None,
+        "rut": cliente.rut if cliente else None,
+        "fecha_hora": fecha_hora.isoformat() if fecha_hora else None,
+        "tipo": tipo or "entrada",
+    }
+
+
+def publicar_asistencia(asistencia_id, cliente_id, fecha_hora, tipo, cliente=None):
+    """
+    cliente: cualquier objeto con nombre/apellido/rut; si no se pasa se
+    busca por id (normalmente ya está en la sesión).
+    """
+    cliente = cliente or db.session.get(Cliente, cliente_id)
+    publicar("asistencia", asistencia_payload(asistencia_id, cliente_id, fecha_hora, tipo, cliente))
+
+
+def publicar_pago(pago, cliente):
+    publicar("pago", {
+        "id": pago.pago_id,
+        "hora": pago.fecha_pago.strftime("%H:%M") if pago.fecha_pago else "",
+        "nombre": cliente.nombre,
+        "apellido": cliente.apellido,
+        "rut": cliente.rut,
+        "monto": float(pago.monto or 0),
+        "metodo_pago": pago.metodo_pago,
+    })
+
+
+# ---------- Lectura ----------
+
+def _rows_since(last_id: int, limit: int):
+    return db.session.execute(
+        select(EventoLive.evento_id, EventoLive.tipo, EventoLive.payload)
+        .where(EventoLive.evento_id > last_id)
+        .order_by(EventoLive.evento_id.asc())
+        .limit(limit)
+    ).all()
+
+
+def _rows_in(ids):
+    return db.session.execute(
+        select(EventoLive.evento_id, EventoLive.tipo, EventoLive.payload)
+        .where(EventoLive.evento_id.in_(ids))
+        .order_by(EventoLive.evento_id.asc())
+    ).all()
+
+
+def resumen_event() -> dict:
+    from .rollups import resumen_hoy
+
+    return {"type": "resumen", **resumen_hoy(hoy_chile())}
+
+
+def _decode(evento_id, tipo, payload):
+    return evento_id, {"type": tipo, **json.loads(payload)}
+
+
+def backlog(last_id: int, limit: int):
+    """
+    Eventos posteriores a last_id para una reconexión; None si hay más de
+    limit (el cliente debe recargar las listas).
+    """
+    rows = _rows_since(last_id, limit + 1)
+    if len(rows) > limit:
+        return None
+    return [_decode(*row) for row in rows]
+
+
+def last_event_id() -> int:
+    return db.session.execute(select(func.coalesce(func.max(EventoLive.evento_id), 0))).scalar()
+
+
+class LiveFeed:
+    def __init__(self, buffer_size: int = 1000, poll_seconds: float = 1.0, retention_hours: int = 24):
+        self.poll_seconds = poll_seconds
+        self.retention_hours = retention_hours
+        self.listeners = 0
+        self._cond = threading.Condition()
+        # (pos, evento, sse_id, evento_id): pos es local al worker y crece
+        # con cada entrada; los "resumen" no llevan sse_id ni evento_id
+        self._events = deque(maxlen=buffer_size)
+        self._pos = 0
+        # pos de la última entrada descartada del buffer
+        self._floor = 0
+        # Mayor evento_id visto y huecos bajo él {evento_id: monotonic}
+        self._seq = 0
+        self._gaps = {}
+        self._wake = threading.Event()
+        self._thread = None
+        self._last_purge = 0.0
+
+    def start(self, app):
+        with self._cond:
+            if self._thread is not None:
+                return
+            with app.app_context():
+                self._seq = last_event_id()
+                db.session.remove()
+            self._thread = threading.Thread(target=self._run, args=(app,), name="live-events", daemon=True)
+            self._thread.start()
+
+    def wake(self):
+        self._wake.set()
+
+    def _run(self, app):
+        while True:
+            self._wake.wait(self.poll_seconds)
+            self._wake.clear()
+            if not self.listeners:
+                continue
+            try:
+                with app.app_context():
+                    try:
+                        self._poll()
+                    finally:
+                        db.session.remove()
+            except Exception as e:
+                print(f"[WARN] live-events: {e}")
+                time.sleep(self.poll_seconds)
+
+    def _watermark(self) -> int:
+        return min(self._gaps) - 1 if self._gaps else self._seq
+
+    def _poll(self):
+        now = time.monotonic()
+        tardios = _rows_in(list(self._gaps)) if self._gaps else []
+        nuevos = _rows_since(self._seq, self._events.maxlen or 1000)
+
+        batch = []
+        with self._cond:
+            for row in tardios:
+                self._gaps.pop(row[0], None)
+                batch.append(row)
+            for row in nuevos:
+                evento_id = row[0]
+                for falta in range(max(self._seq + 1, evento_id - MAX_GAPS), evento_id):
+                    self._gaps[falta] = now
+                self._seq = evento_id
+                batch.append(row)
+            for falta, desde in list(self._gaps.items()):
+                if now - desde > GAP_SECONDS:
+                    del self._gaps[falta]
+
+        if batch:
+            resumen = resumen_event()
+            with self._cond:
+                # La marca de agua de cada evento: huecos que siguen abiertos
+                # después de entregarlo
+                pendientes = sorted(self._gaps)
+                for row in batch:
+                    evento_id, ev = _decode(*row)
+                    abiertos = [g for g in pendientes if g < evento_id]
+                    self._append(ev, abiertos[0] - 1 if abiertos else evento_id, evento_id)
+                self._append(resumen, None, None)
+                self._cond.notify_all()
+
+        if self.retention_hours and now - self._last_purge > PURGE_SECONDS:
+            self._last_purge = now
+            limite = ahora_chile() - timedelta(hours=self.retention_hours)
+            db.session.execute(delete(EventoLive).where(EventoLive.creado < limite))
+            db.session.commit()
+
+    def _append(self, event, sse_id, evento_id):
+        if len(self._events) == self._events.maxlen:
+            self._floor = self._events[0][0]
+        self._pos += 1
+        self._events.append((self._pos, event, sse_id, evento_id))
+
+    def pos(self) -> int:
+        with self._cond:
+            return self._pos
+
+    def watermark(self) -> int:
+        with self._cond:
+            return self._watermark()
+
+    def events_since(self, pos: int, timeout: float = 15.0):
+        """
+        Entradas del buffer posteriores a pos; None si alguna ya se
+        descartó (la conexión quedó atrás y debe recibir "reset").
+        """
+        with self._cond:
+            self._cond.wait_for(lambda: self._pos > pos, timeout=timeout)
+            if pos < self._floor:
+                return None
+            return [e for e in self._events if e[0] > pos]
+
+    def subscribe(self):
+        with self._cond:
+            self.listeners += 1
+        self.wake()
+
+    def unsubscribe(self):
+        with self._cond:
+            self.listeners -= 1
+
+
+_FEED = None
+_FEED_LOCK = threading.Lock()
+_LISTENING = False
+
+
+def get_feed(app) -> LiveFeed:
+    global _FEED
+    with _FEED_LOCK:
+        if _FEED is None:
+            _FEED = LiveFeed(
+                buffer_size=int(app.config.get("LIVE_BUFFER", 1000)),
+                poll_seconds=float(app.config.get("LIVE_POLL_SECONDS", 1.0)),
+                retention_hours=int(app.config.get("LIVE_RETENTION_HOURS", 24)),
+            )
+        _listen()
+    _FEED.start(app)
+    return _FEED
+
+
+def sse_format(seq, event: dict) -> str:
+    head = f"id: {seq}\n" if seq is not None else ""
+    return f"{head}event: {event.get('type', 'message')}\ndata: {json.dumps(event, default=str)}\n\n"
+
+
+def _listen():
+    global _LISTENING
+    if _LISTENING:
+        return
+    _LISTENING = True
+
+    @event.listens_for(Session, "after_commit")
+    def _after_commit(session):
+        if session.info.pop(_PENDING, False) and _FEED is not None:
+            _FEED.wake()
+
+    @event.listens_for(Session, "after_rollback")
+    def _after_rollback(session):
+        session.info.pop(_PENDING, None)
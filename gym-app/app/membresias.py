@@ -0,0 +1,146 @@
+# app/membresias.py
+"""
+Snapshot de la membresía actual en clientes.
+
+Para saber si un cliente puede entrar había que buscar en
+cliente_membresias por cliente/estado/fechas y luego leer el plan. Cliente
+guarda ahora la membresía vigente (o la última que tuvo) en
+membresia_actual_id / membresia_id / membresia_nombre /
+membresia_fecha_inicio / membresia_fecha_fin / membresia_vigente, así el
+check-in (QR, rostro, manual) y los dashboards lo resuelven con la fila del
+cliente.
+
+Lo mantienen:
+  - pagar_y_renovar, con Cliente.set_membresia_actual,
+  - actualizar_membresia, que propaga el nombre del plan,
+  - `flask membresias-vencer` (nocturno), que pasa a "vencida" las
+    cliente_membresias activas cuya fecha_fin ya pasó y apaga el flag de
+    esos snapshots,
+  - `flask membresias-snapshot`, que crea las columnas y recalcula todo.
+"""
+import time
+
+from sqlalchemy import select, update
+
+from . import db
+from .models import Cliente, ClienteMembresia, Membresia, hoy_chile
+
+
+def _actual(cms, hoy):
+    """
+    De las membresías de un cliente: la activa que cubre hoy con fecha_fin
+    más lejana; si no hay, la activa que empieza antes; si tampoco, la
+    última que tuvo.
+    """
+    activas = [cm for cm in cms if cm.estado == "activa" and cm.fecha_fin >= hoy]
+    en_curso = [cm for cm in activas if cm.fecha_inicio <= hoy]
+    if not en_curso and activas:
+        return min(activas, key=lambda cm: (cm.fecha_inicio, cm.cliente_membresia_id))
+    candidatas = en_curso or cms
+    if not candidatas:
+        return None
+    return max(candidatas, key=lambda cm: (cm.fecha_fin, cm.cliente_membresia_id))
+
+
+def refrescar(cliente_ids, hoy=None) -> int:
+    """
+    Recalcula el snapshot de los clientes dados (sin commit).
+    """
+    hoy = hoy or hoy_chile()
+    cliente_ids = list(cliente_ids)
+    if not cliente_ids:
+        return 0
+
+    por_cliente = {cid: [] for cid in cliente_ids}
+    planes = {}
+    for cm, m in db.session.execute(
+        select(ClienteMembresia, Membresia)
+        .outerjoin(Membresia, Membresia.membresia_id == ClienteMembresia.membresia_id)
+        .where(ClienteMembresia.cliente_id.in_(cliente_ids))
+    ).all():
+        por_cliente[cm.cliente_id].append(cm)
+        planes[cm.cliente_membresia_id] = m
+
+    clientes = db.session.execute(select(Cliente).where(Cliente.cliente_id.in_(cliente_ids))).scalars()
+    n = 0
+    for c in clientes:
+        cm = _actual(por_cliente[c.cliente_id], hoy)
+        c.set_membresia_actual(cm, planes.get(cm.cliente_membresia_id) if cm else None, hoy)
+        n += 1
+    return n
+
+
+def renombrar_plan(membresia_id: int, nombre: str):
+    """
+    Propaga el nuevo nombre del plan a los snapshots (sin commit).
+    """
+    db.session.execute(
+        update(Cliente).where(Cliente.membresia_id == membresia_id).values(membresia_nombre=nombre)
+    )
+
+
+def vencer_snapshots(hoy=None) -> int:
+    """
+    Apaga membresia_vigente donde fecha_fin ya pasó. Idempotente; devuelve
+    las filas cambiadas (sin commit).
+    """
+    hoy = hoy or hoy_chile()
+    result = db.session.execute(
+        update(Cliente)
+        .where(Cliente.membresia_vigente.is_(True), Cliente.membresia_fecha_fin < hoy)
+        .values(membresia_vigente=False)
+        .execution_options(synchronize_session=False)
+    )
+    return result.rowcount or 0
+
+
+def vencer(hoy=None, batch_size: int = 1000, on_batch=None) -> dict:
+    """
+    Pasa de "activa" a "vencida" las cliente_membresias con fecha_fin
+    anterior a hoy, en lotes de batch_size con commit por lote (un UPDATE
+    por lote), y luego apaga los snapshots vencidos. Idempotente: una
+    segunda pasada el mismo día no cambia nada.
+
+    on_batch(lote, filas, segundos) se llama después de cada lote.
+    Devuelve {"membresias", "lotes", "clientes", "segundos"}.
+    """
+    hoy = hoy or hoy_chile()
+    t0 = time.perf_counter()
+    pendientes = (ClienteMembresia.estado == "activa", ClienteMembresia.fecha_fin < hoy)
+
+    total, lotes, last_id = 0, 0, 0
+    while True:
+        t_lote = time.perf_counter()
+        ids = db.session.execute(
+            select(ClienteMembresia.cliente_membresia_id)
+            .where(*pendientes, ClienteMembresia.cliente_membresia_id > last_id)
+            .order_by(ClienteMembresia.cliente_membresia_id.asc())
+            .limit(batch_size)
+        ).scalars().all()
+        if not ids:
+            break
+
+        # Se repite el filtro: una renovación concurrente pudo cambiar la fila
+        result = db.session.execute(
+            update(ClienteMembresia)
+            .where(ClienteMembresia.cliente_membresia_id.in_(ids), *pendientes)
+            .values(estado="vencida")
+            .execution_options(synchronize_session=False)
+        )
+        db.session.commit()
+
+        lotes += 1
+        total += result.rowcount or 0
+        last_id = ids[-1]
+        if on_batch is not None:
+            on_batch(lotes, result.rowcount or 0, time.perf_counter() - t_lote)
+
+    clientes = vencer_snapshots(hoy)
+    db.session.commit()
+
+    return {
+        "membresias": total,
+        "lotes": lotes,
+        "clientes": clientes,
+        "segundos": time.perf_counter() - t0,
+    }
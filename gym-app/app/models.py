@@ -1,11 +1,12 @@
 from . import db
-from sqlalchemy.orm import relationship
-from sqlalchemy import CheckConstraint
+from sqlalchemy.orm import relationship, validates
+from sqlalchemy import CheckConstraint, func, select, text
 from sqlalchemy import Column, Integer, String, DateTime, Boolean, Numeric, ForeignKey
 from datetime import datetime, timezone, timedelta
 from passlib.hash import pbkdf2_sha256 as password_hasher
 from enum import Enum
 import secrets
+import unicodedata
 
 
 # ========= Zona horaria Chile con fallbacks =========
@@ -32,6 +33,39 @@ def ahora_chile():
     return datetime.now(CHILE_TZ).replace(tzinfo=None)
 
 
+def hoy_chile():
+    return datetime.now(CHILE_TZ).date()
+
+
+def rango_dias_chile(desde, hasta=None):
+    """
+    Rango semiabierto [desde 00:00, hasta + 1 día 00:00) en hora local de
+    Chile (las columnas DateTime se guardan en hora local sin zona).
+
+    Comparar la columna directamente contra estos límites, en vez de usar
+    func.date(columna), permite que la BD use los índices sobre la fecha.
+    """
+    hasta = hasta or desde
+    inicio = datetime.combine(desde, datetime.min.time())
+    fin = datetime.combine(hasta + timedelta(days=1), datetime.min.time())
+    return inicio, fin
+
+
+def normalizar_rut(rut) -> str:
+    """
+    '12.345.678-k' -> '12345678K' (sólo dígitos + dígito verificador).
+    """
+    return "".join(ch for ch in str(rut or "").upper() if ch.isdigit() or ch == "K")
+
+
+def normalizar_texto(text) -> str:
+    """
+    Minúsculas y sin tildes: 'Pérez Núñez' -> 'perez nunez'.
+    """
+    text = unicodedata.normalize("NFKD", str(text or "").lower())
+    return "".join(ch for ch in text if not unicodedata.combining(ch))
+
+
 def generate_qr_token():
     return secrets.token_urlsafe(16)
 
@@ -43,6 +77,21 @@ class Cliente(db.Model):
     nombre = db.Column(db.String(100), nullable=False)
     apellido = db.Column(db.String(100), nullable=False)
     rut = db.Column(db.String(12), unique=True, nullable=False)
+    # RUT sin puntos ni guion ('12345678K'), para búsqueda por prefijo
+    rut_normalizado = db.Column(
+        db.String(12),
+        index=True,
+        default=lambda ctx: normalizar_rut(ctx.get_current_parameters().get("rut")),
+    )
+    # nombre / apellido sin tildes y en minúscula, para /api/clientes?q=
+    nombre_normalizado = db.Column(
+        db.String(100),
+        default=lambda ctx: normalizar_texto(ctx.get_current_parameters().get("nombre")),
+    )
+    apellido_normalizado = db.Column(
+        db.String(100),
+        default=lambda ctx: normalizar_texto(ctx.get_current_parameters().get("apellido")),
+    )
     fecha_nacimiento = db.Column(db.Date)
     telefono = db.Column(db.String(20))
     email = db.Column(db.String(150), unique=True)
@@ -62,6 +111,16 @@ class Cliente(db.Model):
         default=generate_qr_token,
     )
 
+    # Membresía actual desnormalizada (ver app/membresias.py): la mantienen
+    # pagar_y_renovar y `flask membresias-vencer`. El check-in y los
+    # dashboards la leen sin recorrer cliente_membresias.
+    membresia_actual_id = db.Column(db.Integer)  # cliente_membresia_id
+    membresia_id = db.Column(db.Integer)
+    membresia_nombre = db.Column(db.String(100))
+    membresia_fecha_inicio = db.Column(db.Date)
+    membresia_fecha_fin = db.Column(db.Date)
+    membresia_vigente = db.Column(db.Boolean, default=False)
+
     membresias = relationship(
         "ClienteMembresia", back_populates="cliente", cascade="all, delete-orphan"
     )
@@ -72,10 +131,34 @@ class Cliente(db.Model):
         "Pago", back_populates="cliente", cascade="all, delete-orphan"
     )
 
+    @validates("rut")
+    def _sync_rut_normalizado(self, key, value):
+        self.rut_normalizado = normalizar_rut(value)
+        return value
+
+    @validates("nombre", "apellido")
+    def _sync_texto_normalizado(self, key, value):
+        setattr(self, f"{key}_normalizado", normalizar_texto(value))
+        return value
+
     def ensure_qr_token(self):
         if not self.qr_token:
             self.qr_token = generate_qr_token()
 
+    def set_membresia_actual(self, cm, membresia=None, hoy=None):
+        """
+        Copia al snapshot la ClienteMembresia dada (None = sin membresía).
+        """
+        hoy = hoy or hoy_chile()
+        self.membresia_actual_id = cm.cliente_membresia_id if cm else None
+        self.membresia_id = cm.membresia_id if cm else None
+        self.membresia_nombre = getattr(membresia, "nombre", None) if cm else None
+        self.membresia_fecha_inicio = cm.fecha_inicio if cm else None
+        self.membresia_fecha_fin = cm.fecha_fin if cm else None
+        # Una membresía que empieza más adelante queda con el flag puesto:
+        # membresia_snapshot la da por vigente desde fecha_inicio
+        self.membresia_vigente = bool(cm and cm.estado == "activa" and cm.fecha_fin >= hoy)
+
     def to_dict(self):
         return {
             "cliente_id": self.cliente_id,
@@ -90,9 +173,44 @@ class Cliente(db.Model):
             "estado_laboral": self.estado_laboral,
             "sexo": self.sexo,
             "qr_token": self.qr_token,
+            "membresia": membresia_snapshot(self),
         }
 
 
+# Listado paginado de /api/clientes: orden (nombre, apellido, cliente_id) y
+# búsqueda por prefijo sin distinguir mayúsculas.
+db.Index("ix_clientes_orden", Cliente.nombre, Cliente.apellido, Cliente.cliente_id)
+db.Index("ix_clientes_nombre_normalizado", Cliente.nombre_normalizado)
+db.Index("ix_clientes_apellido_normalizado", Cliente.apellido_normalizado)
+db.Index("ix_clientes_email_lower", func.lower(Cliente.email))
+# Conteo de membresías vigentes del dashboard
+db.Index("ix_clientes_membresia_vigente_fin", Cliente.membresia_vigente, Cliente.membresia_fecha_fin)
+
+
+def membresia_snapshot(cliente, hoy=None) -> dict:
+    """
+    Membresía actual de un Cliente (o QrCliente) sin consultar la BD. El
+    flag vigente se confirma contra las fechas: entre el vencimiento y la
+    siguiente pasada de `flask membresias-vencer` puede seguir en True, y
+    una membresía con fecha_inicio futura no vale hasta ese día.
+    """
+    hoy = hoy or hoy_chile()
+    fecha_inicio = cliente.membresia_fecha_inicio
+    fecha_fin = cliente.membresia_fecha_fin
+    return {
+        "vigente": (
+            bool(cliente.membresia_vigente)
+            and fecha_fin is not None and fecha_fin >= hoy
+            and (fecha_inicio is None or fecha_inicio <= hoy)
+        ),
+        "cliente_membresia_id": cliente.membresia_actual_id,
+        "membresia_id": cliente.membresia_id,
+        "nombre": cliente.membresia_nombre,
+        "fecha_inicio": fecha_inicio.isoformat() if fecha_inicio else None,
+        "fecha_fin": fecha_fin.isoformat() if fecha_fin else None,
+    }
+
+
 class Membresia(db.Model):
     __tablename__ = "membresias"
 
@@ -119,6 +237,12 @@ class ClienteMembresia(db.Model):
     fecha_fin = db.Column(db.Date, nullable=False)
     estado = db.Column(db.String(20), default="activa")
 
+    __table_args__ = (
+        db.Index("ix_cliente_membresias_cliente_estado_fin", "cliente_id", "estado", "fecha_fin"),
+        # Vencimientos del dashboard y `flask membresias-vencer`
+        db.Index("ix_cliente_membresias_estado_fin", "estado", "fecha_fin"),
+    )
+
     cliente = relationship("Cliente", back_populates="membresias")
     membresia = relationship("Membresia", back_populates="clientes")
     pagos = relationship("Pago", back_populates="cliente_membresia")
@@ -138,10 +262,26 @@ class Pago(db.Model):
     fecha_pago = db.Column(db.DateTime, default=ahora_chile)
     metodo_pago = db.Column(db.String(50))
 
+    __table_args__ = (
+        db.Index("ix_pagos_fecha_pago", "fecha_pago"),
+    )
+
     cliente = relationship("Cliente", back_populates="pagos")
     cliente_membresia = relationship("ClienteMembresia", back_populates="pagos")
 
 
+def _dia_asistencia(context):
+    fecha_hora = context.get_current_parameters().get("fecha_hora")
+    if fecha_hora is None:
+        return hoy_chile()
+    if fecha_hora.tzinfo is not None:
+        fecha_hora = fecha_hora.astimezone(CHILE_TZ)
+    return fecha_hora.date()
+
+
+ENTRADA_UNICA_WHERE = text("tipo = 'entrada'")
+
+
 class Asistencia(db.Model):
     __tablename__ = "asistencias"
 
@@ -150,15 +290,108 @@ class Asistencia(db.Model):
         db.Integer, db.ForeignKey("clientes.cliente_id", ondelete="CASCADE")
     )
     fecha_hora = db.Column(db.DateTime, default=ahora_chile)
+    # Día local (Chile) de fecha_hora; respalda el índice único de "una
+    # entrada por día" (ver registrar_entrada).
+    dia = db.Column(db.Date, default=_dia_asistencia)
     tipo = db.Column(db.String(10), nullable=False, default="entrada")
 
     __table_args__ = (
         CheckConstraint("tipo IN ('entrada','salida')", name="ck_asistencias_tipo"),
+        db.Index("ix_asistencias_fecha_hora", "fecha_hora"),
+        db.Index("ix_asistencias_cliente_tipo_fecha", "cliente_id", "tipo", "fecha_hora"),
+        db.Index(
+            "ux_asistencias_entrada_dia", "cliente_id", "dia",
+            unique=True,
+            sqlite_where=ENTRADA_UNICA_WHERE,
+            postgresql_where=ENTRADA_UNICA_WHERE,
+        ),
     )
 
     cliente = relationship("Cliente", back_populates="asistencias")
 
 
+def _entrada_registrada(row, cliente=None):
+    from . import live_events, rollups
+
+    rollups.registrar_asistencia(row.cliente_id, row.fecha_hora, "entrada")
+    live_events.publicar_asistencia(row.asistencia_id, row.cliente_id, row.fecha_hora, "entrada", cliente)
+
+
+def insertar_asistencia_sin_returning(values, cols):
+    """
+    INSERT de una asistencia para motores sin ON CONFLICT ... RETURNING
+    (MySQL): la fila (cols) se relee por su PK (DATETIME puede redondear
+    fecha_hora). Devuelve None si ya había entrada ese día (IntegrityError
+    contra ux_asistencias_entrada_dia); el savepoint deja la transacción
+    usable.
+    """
+    from sqlalchemy.exc import IntegrityError
+
+    try:
+        with db.session.begin_nested():
+            result = db.session.execute(Asistencia.__table__.insert().values(**values))
+    except IntegrityError:
+        return None
+
+    (asistencia_id,) = result.inserted_primary_key
+    return db.session.execute(select(*cols).where(Asistencia.asistencia_id == asistencia_id)).first()
+
+
+def registrar_entrada(cliente_id, fecha_hora=None, cliente=None):
+    """
+    Registra la 'entrada' del día del cliente en un solo INSERT ... ON
+    CONFLICT DO NOTHING RETURNING contra ux_asistencias_entrada_dia, sin
+    SELECT previo y sin carreras entre QR, rostro y recepción (en otros
+    motores, ver insertar_asistencia_sin_returning).
+
+    Devuelve (fila, creada): fila tiene asistencia_id, cliente_id,
+    fecha_hora y tipo; si ya había entrada hoy es la existente y creada es
+    False. Actualiza los rollups del dashboard y publica el evento en vivo
+    en la misma transacción (cliente, con nombre/apellido/rut, evita
+    buscarlo para el evento). No hace commit.
+    """
+    fecha_hora = fecha_hora or ahora_chile()
+    values = {
+        "cliente_id": cliente_id,
+        "fecha_hora": fecha_hora,
+        "dia": fecha_hora.date(),
+        "tipo": "entrada",
+    }
+    cols = (Asistencia.asistencia_id, Asistencia.cliente_id, Asistencia.fecha_hora, Asistencia.tipo)
+
+    dialect = db.session.get_bind().dialect.name
+    if dialect in ("postgresql", "sqlite"):
+        if dialect == "postgresql":
+            from sqlalchemy.dialects.postgresql import insert as dialect_insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert as dialect_insert
+
+        stmt = (
+            dialect_insert(Asistencia)
+            .values(**values)
+            .on_conflict_do_nothing(index_elements=["cliente_id", "dia"], index_where=ENTRADA_UNICA_WHERE)
+            .returning(*cols)
+        )
+        row = db.session.execute(stmt).first()
+        if row is not None:
+            _entrada_registrada(row, cliente)
+            return row, True
+    else:
+        row = insertar_asistencia_sin_returning(values, cols)
+        if row is not None:
+            _entrada_registrada(row, cliente)
+            return row, True
+
+    existente = db.session.execute(
+        select(*cols).where(
+            Asistencia.cliente_id == cliente_id,
+            Asistencia.tipo == "entrada",
+            Asistencia.dia == values["dia"],
+        )
+    ).first()
+    return existente, False
+
+
 class RoleEnum(str, Enum):
     admin = "admin"
     cashier = "cashier"
@@ -226,7 +459,132 @@ class FaceTemplate(db.Model):
 
     model_name = db.Column(db.String(50), nullable=False, default="insightface")
     model_version = db.Column(db.String(30), nullable=False, default="v1")
-    embedding = db.Column(db.JSON, nullable=False)
+    # Legado: lista JSON de floats. Las plantillas nuevas pueden guardarse en
+    # embedding_blob (ver face_storage.py) dejando esta columna en NULL.
+    embedding = db.Column(db.JSON)
+    embedding_blob = db.Column(db.LargeBinary)
     quality_score = db.Column(db.Numeric(5, 2))
     is_active = db.Column(db.Boolean, nullable=False, default=True)
-    created_at = db.Column(db.DateTime, default=ahora_chile)
\ No newline at end of file
+    created_at = db.Column(db.DateTime, default=ahora_chile)
+
+    def vector(self):
+        from .face_storage import template_vector
+        return template_vector(self.embedding_blob, self.embedding)
+
+
+# ========= Rollups para dashboards (ver rollups.py) =========
+
+# Los contadores por día y por hora se reparten en filas por shard
+# (cliente_id % rollups.SHARDS) para que los check-ins simultáneos no
+# esperen el lock de una misma fila; al leer se suman los shards.
+
+class AsistenciaDia(db.Model):
+    __tablename__ = "rollup_asistencias_dia"
+
+    dia = db.Column(db.Date, primary_key=True)
+    shard = db.Column(db.Integer, primary_key=True, default=0)
+    entradas = db.Column(db.Integer, nullable=False, default=0)
+    salidas = db.Column(db.Integer, nullable=False, default=0)
+
+
+class AsistenciaHora(db.Model):
+    __tablename__ = "rollup_asistencias_hora"
+
+    dia = db.Column(db.Date, primary_key=True)
+    hora = db.Column(db.Integer, primary_key=True)  # 0-23, hora local
+    shard = db.Column(db.Integer, primary_key=True, default=0)
+    entradas = db.Column(db.Integer, nullable=False, default=0)
+
+
+class AsistenciaClienteMes(db.Model):
+    __tablename__ = "rollup_asistencias_cliente_mes"
+
+    mes = db.Column(db.Date, primary_key=True)  # primer día del mes
+    cliente_id = db.Column(
+        db.Integer, db.ForeignKey("clientes.cliente_id", ondelete="CASCADE"), primary_key=True
+    )
+    entradas = db.Column(db.Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        db.Index("ix_rollup_cliente_mes_ranking", "mes", "entradas"),
+    )
+
+
+class PagoMetodoDia(db.Model):
+    __tablename__ = "rollup_pagos_metodo_dia"
+
+    dia = db.Column(db.Date, primary_key=True)
+    metodo_pago = db.Column(db.String(50), primary_key=True)
+    cantidad = db.Column(db.Integer, nullable=False, default=0)
+    total = db.Column(db.Numeric(12, 2), nullable=False, default=0)
+
+
+class EventoLive(db.Model):
+    """
+    Cambios publicados a /api/live/stream (ver app/live_events.py). El id
+    es el Last-Event-ID de SSE.
+    """
+    __tablename__ = "eventos_live"
+
+    evento_id = db.Column(db.Integer, primary_key=True)
+    tipo = db.Column(db.String(30), nullable=False)
+    payload = db.Column(db.Text, nullable=False)
+    creado = db.Column(db.DateTime, nullable=False, default=ahora_chile, index=True)
+
+
+class CacheGeneracion(db.Model):
+    """
+    Contadores compartidos entre workers para invalidar caches en memoria
+    (ver app/qr_cache.py): quien cambia los datos incrementa la generación
+    en su misma transacción y cada worker la relee cada pocos segundos.
+    """
+    __tablename__ = "cache_generaciones"
+
+    nombre = db.Column(db.String(30), primary_key=True)
+    generacion = db.Column(db.BigInteger, nullable=False, default=0)
+
+
+def incrementar_generacion(connection, nombre: str):
+    """
+    +1 a la generación `nombre` dentro de la transacción de `connection`.
+    """
+    table = CacheGeneracion.__table__
+    result = connection.execute(
+        table.update().where(table.c.nombre == nombre).values(generacion=table.c.generacion + 1)
+    )
+    if not result.rowcount:
+        connection.execute(table.insert().values(nombre=nombre, generacion=1))
+
+
+def leer_generacion(nombre: str) -> int:
+    return db.session.execute(
+        select(CacheGeneracion.generacion).where(CacheGeneracion.nombre == nombre)
+    ).scalar() or 0
+
+
+class QrRevocado(db.Model):
+    """
+    Tokens QR firmados revocados (ver app/qr_signed.py).
+    """
+    __tablename__ = "qr_revocados"
+
+    cliente_id = db.Column(
+        db.Integer, db.ForeignKey("clientes.cliente_id", ondelete="CASCADE"), primary_key=True
+    )
+    emitido = db.Column(db.BigInteger, primary_key=True)  # epoch de emisión del token
+    revocado_en = db.Column(db.DateTime, nullable=False, default=ahora_chile)
+
+
+class AsistenciaIngest(db.Model):
+    """
+    Claves de idempotencia de /api/asistencias/bulk: un reintento del mismo
+    evento devuelve el resultado original sin volver a insertarlo.
+    """
+    __tablename__ = "asistencias_ingest"
+
+    idempotency_key = db.Column(db.String(64), primary_key=True)
+    asistencia_id = db.Column(
+        db.Integer, db.ForeignKey("asistencias.asistencia_id", ondelete="CASCADE"), nullable=True
+    )
+    estado = db.Column(db.String(20), nullable=False)
+    creado = db.Column(db.DateTime, nullable=False, default=ahora_chile, index=True)
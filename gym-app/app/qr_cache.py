@@ -0,0 +1,268 @@
+# app/qr_cache.py
+"""
+Cache token QR -> cliente para /api/asistencias/qr.
+
+Al salir una clase pueden escanear decenas de personas en un minuto; con el
+token en memoria el check-in no consulta clientes y queda en el INSERT de la
+asistencia (más los rollups y el evento en vivo de la misma transacción).
+
+LRU acotado a QR_CACHE_SIZE tokens, precargado al arrancar el worker con
+los clientes más recientes y actualizado al crear/editar clientes en este
+worker. Para los cambios hechos en otros workers (token regenerado,
+cliente inactivo, renovación) cada transacción que modifica un cliente
+incrementa la generación compartida "qr" (tabla cache_generaciones); cada
+worker la relee a lo más cada QR_CACHE_CHECK_SECONDS y, si cambió, vacía
+su cache. Las entradas además vencen a los QR_CACHE_TTL segundos.
+"""
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+from sqlalchemy import event, inspect, select
+from sqlalchemy.orm import Session
+
+from . import db
+from .models import Cliente, incrementar_generacion, leer_generacion
+
+GENERACION = "qr"
+_BUMPED = "qr_cache_bumped"
+
+# Incluye el snapshot de membresía (ver app/membresias.py) para que el
+# check-in sepa si la membresía está vigente sin otra consulta.
+QrCliente = namedtuple(
+    "QrCliente",
+    "cliente_id nombre apellido rut estado "
+    "membresia_actual_id membresia_id membresia_nombre membresia_fecha_inicio membresia_fecha_fin "
+    "membresia_vigente",
+)
+
+CLIENTE_COLUMNS = (
+    Cliente.cliente_id, Cliente.nombre, Cliente.apellido, Cliente.rut, Cliente.estado,
+    Cliente.membresia_actual_id, Cliente.membresia_id, Cliente.membresia_nombre,
+    Cliente.membresia_fecha_inicio, Cliente.membresia_fecha_fin, Cliente.membresia_vigente,
+)
+_COLUMNS = (Cliente.qr_token, *CLIENTE_COLUMNS)
+
+
+class QrTokenCache:
+    def __init__(self, max_entries: int = 5000, ttl: float = 600.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._tokens = {}
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0}
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, token):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(token)
+            if entry is None or entry[0] <= now:
+                self.stats["misses"] += 1
+                return None
+            self._entries.move_to_end(token)
+            self.stats["hits"] += 1
+            return entry[1]
+
+    def put(self, token, cliente: QrCliente):
+        if not token:
+            return
+        with self._lock:
+            # Token regenerado: el anterior deja de ser válido
+            old = self._tokens.get(cliente.cliente_id)
+            if old is not None and old != token:
+                self._entries.pop(old, None)
+            self._tokens[cliente.cliente_id] = token
+            self._entries[token] = (time.monotonic() + self.ttl, cliente)
+            self._entries.move_to_end(token)
+            while len(self._entries) > self.max_entries:
+                evicted_token, (_, evicted) = self._entries.popitem(last=False)
+                if self._tokens.get(evicted.cliente_id) == evicted_token:
+                    del self._tokens[evicted.cliente_id]
+
+    def discard(self, token):
+        with self._lock:
+            entry = self._entries.pop(token, None)
+            if entry is not None:
+                self._tokens.pop(entry[1].cliente_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._tokens.clear()
+
+
+_CACHE = None
+_CHECK_SECONDS = 1.0
+_GEN_LOCK = threading.Lock()
+# Última generación vista y cuándo se leyó (monotonic)
+_generacion = None
+_leida = 0.0
+_LISTENING = False
+
+
+def configure(config):
+    """
+    Crea el cache del proceso desde app.config (QR_CACHE_SIZE = 0 lo desactiva).
+    """
+    global _CACHE, _CHECK_SECONDS, _generacion, _leida
+    size = int(config.get("QR_CACHE_SIZE", 0) or 0)
+    _CACHE = QrTokenCache(size, float(config.get("QR_CACHE_TTL", 600))) if size > 0 else None
+    _CHECK_SECONDS = float(config.get("QR_CACHE_CHECK_SECONDS", 1.0))
+    _generacion, _leida = None, 0.0
+    _listen()
+
+
+def _check_generation(force: bool = False):
+    """
+    Vacía el cache si otro worker (o este) cambió clientes desde la última
+    lectura de la generación compartida.
+    """
+    global _generacion, _leida
+    if _CACHE is None:
+        return
+    now = time.monotonic()
+    with _GEN_LOCK:
+        if not force and _generacion is not None and now - _leida < _CHECK_SECONDS:
+            return
+        _leida = now
+    actual = leer_generacion(GENERACION)
+    with _GEN_LOCK:
+        if actual != _generacion:
+            if _generacion is not None:
+                _CACHE.clear()
+            _generacion = actual
+
+
+def _load(rows):
+    for token, *cliente in rows:
+        _CACHE.put(token, QrCliente(*cliente))
+
+
+def warm(app):
+    """
+    Precarga los QR_CACHE_SIZE clientes más recientes en un hilo.
+    """
+    if _CACHE is None:
+        return None
+
+    def run():
+        try:
+            with app.app_context():
+                _check_generation(force=True)
+                _load(db.session.execute(
+                    select(*_COLUMNS).order_by(Cliente.cliente_id.desc()).limit(_CACHE.max_entries)
+                ).all())
+                db.session.remove()
+            print(f"[OK] Cache QR precargado ({len(_CACHE)} clientes)")
+        except Exception as e:
+            print(f"[WARN] No se pudo precargar el cache QR: {e}")
+
+    t = threading.Thread(target=run, name="qr-warmup", daemon=True)
+    t.start()
+    return t
+
+
+def lookup(token: str, cliente_id: int = None):
+    """
+    QrCliente del token o None si no existe. Con cliente_id (token firmado
+    ya verificado) un fallo de cache se busca por id y no por token.
+    """
+    if _CACHE is not None:
+        _check_generation()
+        hit = _CACHE.get(token)
+        if hit is not None:
+            return hit
+
+    where = Cliente.cliente_id == cliente_id if cliente_id is not None else Cliente.qr_token == token
+    row = db.session.execute(select(*_COLUMNS).where(where)).first()
+    if row is None:
+        return None
+    cliente = QrCliente(*row[1:])
+    if _CACHE is not None:
+        _CACHE.put(token, cliente)
+    return cliente
+
+
+def lookup_many(tokens) -> dict:
+    """
+    {token: QrCliente} de los tokens existentes; los que no están en cache
+    se buscan con un solo SELECT.
+    """
+    found, missing = {}, []
+    _check_generation()
+    for token in tokens:
+        hit = _CACHE.get(token) if _CACHE is not None else None
+        if hit is not None:
+            found[token] = hit
+        else:
+            missing.append(token)
+
+    if missing:
+        for token, *cliente in db.session.execute(select(*_COLUMNS).where(Cliente.qr_token.in_(missing))).all():
+            found[token] = QrCliente(*cliente)
+            if _CACHE is not None:
+                _CACHE.put(token, found[token])
+    return found
+
+
+def cliente_changed(cliente):
+    """
+    Refleja un alta/edición/renovación ya commiteada (incluye un token
+    regenerado por ensure_qr_token).
+    """
+    if _CACHE is not None:
+        _CACHE.put(cliente.qr_token, QrCliente(*(getattr(cliente, c.key) for c in CLIENTE_COLUMNS)))
+
+
+def discard(token: str):
+    if _CACHE is not None:
+        _CACHE.discard(token)
+
+
+# ---------- Invalidación entre workers ----------
+
+def _cliente_cambiado(obj) -> bool:
+    if not isinstance(obj, Cliente):
+        return False
+    state = inspect(obj)
+    return any(
+        state.attrs[key].history.has_changes()
+        for key in ("qr_token", *(c.key for c in CLIENTE_COLUMNS))
+    )
+
+
+def _bump(session):
+    if not session.info.get(_BUMPED):
+        session.info[_BUMPED] = True
+        incrementar_generacion(session.connection(), GENERACION)
+
+
+def _listen():
+    global _LISTENING
+    if _LISTENING:
+        return
+    _LISTENING = True
+
+    @event.listens_for(Session, "after_flush")
+    def _after_flush(session, flush_context):
+        if any(isinstance(o, Cliente) for o in session.deleted) or any(
+            _cliente_cambiado(o) for o in session.dirty
+        ):
+            _bump(session)
+
+    @event.listens_for(Session, "do_orm_execute")
+    def _do_orm_execute(state):
+        if (state.is_update or state.is_delete) and getattr(state.statement, "table", None) is Cliente.__table__:
+            _bump(state.session)
+
+    @event.listens_for(Session, "after_commit")
+    def _after_commit(session):
+        session.info.pop(_BUMPED, None)
+
+    @event.listens_for(Session, "after_rollback")
+    def _after_rollback(session):
+        session.info.pop(_BUMPED, None)
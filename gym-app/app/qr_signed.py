@@ -0,0 +1,171 @@
+# app/qr_signed.py
+"""
+Tokens QR firmados (opcional, QR_SIGNED_TOKENS=1).
+
+Formato: URLSafeSerializer de itsdangerous (HMAC-SHA1) sobre
+[cliente_id, epoch de emisión]. /api/asistencias/qr los verifica y decodifica
+sin consultar la BD, así un QR falsificado se rechaza antes de tocarla y un
+kiosko sin conexión puede guardar los escaneos y enviarlos después. Los
+tokens aleatorios de siempre (token_urlsafe, sin ".") siguen funcionando.
+
+Rotación de claves: QR_SIGNING_KEYS es una lista separada por comas de la
+más antigua a la más nueva; se firma con la última y se aceptan todas.
+Sin QR_SIGNING_KEYS se usa SECRET_KEY.
+
+Revocación: los tokens revocados (al regenerar el QR de un cliente) quedan
+en qr_revocados y en un filtro de Bloom en memoria. Si el filtro dice que un
+token no está revocado se acepta sin consultar qr_revocados; si "quizás" lo
+está, se confirma en la BD. Cada revocación incrementa la generación
+compartida "qr_revocados" (cache_generaciones); cada worker la relee a lo
+más cada QR_CACHE_CHECK_SECONDS (una lectura por PK) y recarga el filtro si
+cambió, así una revocación hecha en otro worker vale en ~1 s. Además el
+filtro se recarga cada QR_REVOCATION_MAX_AGE segundos.
+"""
+import hashlib
+import math
+import threading
+import time
+
+from flask import current_app
+from itsdangerous import BadSignature, URLSafeSerializer
+from sqlalchemy import insert, select
+
+from . import db
+from .models import QrRevocado, incrementar_generacion, leer_generacion
+
+SALT = "qr-token"
+GENERACION = "qr_revocados"
+# Tasa de falsos positivos objetivo del filtro de Bloom
+BLOOM_FP_RATE = 0.01
+BLOOM_MIN_ITEMS = 1024
+
+
+def signed_enabled(config=None) -> bool:
+    config = config if config is not None else current_app.config
+    return bool(config.get("QR_SIGNED_TOKENS"))
+
+
+def _serializer(config=None):
+    config = config if config is not None else current_app.config
+    keys = [k.strip() for k in (config.get("QR_SIGNING_KEYS") or "").split(",") if k.strip()]
+    return URLSafeSerializer(keys or [config["SECRET_KEY"]], salt=SALT)
+
+
+def is_signed(token: str) -> bool:
+    # token_urlsafe no usa "."; el serializer separa payload y firma con "."
+    return "." in (token or "")
+
+
+def emitir(cliente_id: int, emitido: int = None, config=None) -> str:
+    return _serializer(config).dumps([int(cliente_id), int(emitido or time.time())])
+
+
+def verificar(token: str, config=None):
+    """
+    (cliente_id, emitido) si la firma es válida con alguna de las claves,
+    None si no.
+    """
+    try:
+        cliente_id, emitido = _serializer(config).loads(token)
+        return int(cliente_id), int(emitido)
+    except (BadSignature, TypeError, ValueError):
+        return None
+
+
+# ---------- Revocación ----------
+
+class BloomFilter:
+    def __init__(self, capacity: int, fp_rate: float = BLOOM_FP_RATE):
+        capacity = max(capacity, 1)
+        self.bits = max(int(-capacity * math.log(fp_rate) / math.log(2) ** 2), 8)
+        self.hashes = max(int(round(self.bits / capacity * math.log(2))), 1)
+        self._array = bytearray((self.bits + 7) // 8)
+
+    def _positions(self, key: str):
+        digest = hashlib.blake2b(key.encode("utf-8"), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return [(h1 + i * h2) % self.bits for i in range(self.hashes)]
+
+    def add(self, key: str):
+        for p in self._positions(key):
+            self._array[p >> 3] |= 1 << (p & 7)
+
+    def __contains__(self, key: str) -> bool:
+        return all(self._array[p >> 3] & (1 << (p & 7)) for p in self._positions(key))
+
+
+def _key(cliente_id, emitido) -> str:
+    return f"{cliente_id}:{emitido}"
+
+
+_BLOOM = None
+_BLOOM_LOADED = 0.0
+# Generación con la que se cargó el filtro y cuándo se leyó por última vez
+_BLOOM_GENERACION = None
+_GENERACION_LEIDA = 0.0
+_BLOOM_LOCK = threading.Lock()
+
+
+def _load_bloom():
+    rows = db.session.execute(select(QrRevocado.cliente_id, QrRevocado.emitido)).all()
+    bloom = BloomFilter(max(len(rows) * 2, BLOOM_MIN_ITEMS))
+    for cliente_id, emitido in rows:
+        bloom.add(_key(cliente_id, emitido))
+    return bloom
+
+
+def get_bloom() -> BloomFilter:
+    global _BLOOM, _BLOOM_LOADED, _BLOOM_GENERACION, _GENERACION_LEIDA
+    max_age = current_app.config.get("QR_REVOCATION_MAX_AGE", 60)
+    check = current_app.config.get("QR_CACHE_CHECK_SECONDS", 1)
+    with _BLOOM_LOCK:
+        now = time.monotonic()
+        recargar = _BLOOM is None or (max_age and now - _BLOOM_LOADED > max_age)
+        generacion = _BLOOM_GENERACION
+        if recargar or now - _GENERACION_LEIDA >= check:
+            _GENERACION_LEIDA = now
+            generacion = leer_generacion(GENERACION)
+            recargar = recargar or generacion != _BLOOM_GENERACION
+        if recargar:
+            # La generación se lee antes que las filas: una revocación
+            # concurrente provoca otra recarga en la próxima lectura
+            _BLOOM = _load_bloom()
+            _BLOOM_LOADED = now
+            _BLOOM_GENERACION = generacion
+        return _BLOOM
+
+
+def revocado(cliente_id: int, emitido: int) -> bool:
+    if _key(cliente_id, emitido) not in get_bloom():
+        return False
+    return db.session.get(QrRevocado, (cliente_id, emitido)) is not None
+
+
+def revocar(token: str):
+    """
+    Revoca un token firmado (sin commit) y devuelve (cliente_id, emitido).
+    Los tokens aleatorios no se registran: dejan de valer al cambiar
+    Cliente.qr_token.
+    """
+    decoded = verificar(token) if is_signed(token) else None
+    if decoded is None:
+        return None
+    cliente_id, emitido = decoded
+    if db.session.get(QrRevocado, (cliente_id, emitido)) is None:
+        db.session.execute(insert(QrRevocado).values(cliente_id=cliente_id, emitido=emitido))
+        incrementar_generacion(db.session.connection(), GENERACION)
+    get_bloom().add(_key(cliente_id, emitido))
+    return decoded
+
+
+def reemitir(cliente_id: int, anterior: str) -> str:
+    """
+    Revoca el token anterior y emite uno nuevo con un epoch posterior (dos
+    regeneraciones en el mismo segundo no pueden repetir token).
+    """
+    decoded = revocar(anterior)
+    emitido = int(time.time())
+    if decoded is not None and decoded[0] == cliente_id:
+        emitido = max(emitido, decoded[1] + 1)
+    return emitir(cliente_id, emitido)
@@ -0,0 +1,267 @@
+# app/rollups.py
+"""
+Agregados precalculados para los dashboards.
+
+  - rollup_asistencias_dia:          entradas / salidas por día
+  - rollup_asistencias_hora:         entradas por (día, hora local)
+  - rollup_asistencias_cliente_mes:  entradas por (mes, cliente)
+  - rollup_pagos_metodo_dia:         cantidad / total por (día, método de pago)
+
+Se incrementan en la misma transacción que inserta la asistencia o el pago
+(registrar_entrada, marcar_asistencia, pagar_y_renovar) con un
+INSERT ... ON CONFLICT DO UPDATE, así los dashboards leen unas pocas filas
+sin importar cuánto historial haya. `flask rollups-rebuild` los recalcula
+desde las tablas base.
+
+Los rollups por día y por hora llevan además un shard (cliente_id % SHARDS):
+todos los check-ins del día tocarían la misma fila y el lock del UPDATE los
+serializaría hasta el commit de cada transacción. Repartidos en SHARDS filas,
+sólo esperan los que caen en el mismo shard; quien lee suma los shards.
+"""
+from collections import Counter
+from datetime import date, datetime
+
+from sqlalchemy import Integer, cast, delete, func, insert, select, update
+
+from . import db
+from .models import (
+    Asistencia, AsistenciaClienteMes, AsistenciaDia, AsistenciaHora, Pago, PagoMetodoDia,
+)
+
+
+# Filas por día (y por día-hora) en rollup_asistencias_dia/_hora. Se puede
+# cambiar sin migrar: los lectores suman por día y rollups-rebuild reparte.
+SHARDS = 16
+
+
+def shard_de(cliente_id) -> int:
+    return (cliente_id or 0) % SHARDS
+
+
+def _dialect():
+    return db.session.get_bind().dialect.name
+
+
+def _upsert_increment(model, keys: dict, increments: dict):
+    """
+    Suma `increments` a la fila de `model` con clave `keys` (creándola si
+    no existe).
+    """
+    dialect = _dialect()
+    if dialect in ("postgresql", "sqlite"):
+        if dialect == "postgresql":
+            from sqlalchemy.dialects.postgresql import insert as dialect_insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert as dialect_insert
+
+        stmt = dialect_insert(model).values(**keys, **increments)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=list(keys),
+            set_={k: getattr(model, k) + stmt.excluded[k] for k in increments},
+        )
+        db.session.execute(stmt)
+        return
+
+    where = [getattr(model, k) == v for k, v in keys.items()]
+    result = db.session.execute(
+        update(model).where(*where).values({k: getattr(model, k) + v for k, v in increments.items()})
+    )
+    if result.rowcount == 0:
+        db.session.execute(insert(model).values(**keys, **increments))
+
+
+def metodo_key(metodo_pago) -> str:
+    return (metodo_pago or "").strip()
+
+
+def registrar_asistencia(cliente_id, fecha_hora: datetime, tipo: str = "entrada"):
+    """
+    Incrementa los rollups por una asistencia recién insertada (sin commit).
+    fecha_hora en hora local de Chile.
+    """
+    dia = fecha_hora.date()
+    shard = shard_de(cliente_id)
+
+    if tipo != "entrada":
+        _upsert_increment(AsistenciaDia, {"dia": dia, "shard": shard}, {"entradas": 0, "salidas": 1})
+        return
+
+    _upsert_increment(AsistenciaDia, {"dia": dia, "shard": shard}, {"entradas": 1, "salidas": 0})
+    _upsert_increment(
+        AsistenciaHora, {"dia": dia, "hora": fecha_hora.hour, "shard": shard}, {"entradas": 1},
+    )
+    _upsert_increment(
+        AsistenciaClienteMes,
+        {"mes": dia.replace(day=1), "cliente_id": cliente_id},
+        {"entradas": 1},
+    )
+
+
+def registrar_asistencias(rows):
+    """
+    Versión por lote de registrar_asistencia: rows son (cliente_id,
+    fecha_hora, tipo) y se hace un upsert por clave distinta, no por fila.
+    """
+    dias, horas, meses = Counter(), Counter(), Counter()
+    for cliente_id, fecha_hora, tipo in rows:
+        dia = fecha_hora.date()
+        shard = shard_de(cliente_id)
+        if tipo != "entrada":
+            dias[(dia, shard, "salidas")] += 1
+            continue
+        dias[(dia, shard, "entradas")] += 1
+        horas[(dia, fecha_hora.hour, shard)] += 1
+        meses[(dia.replace(day=1), cliente_id)] += 1
+
+    for dia, shard in {(d, s) for d, s, _ in dias}:
+        _upsert_increment(
+            AsistenciaDia,
+            {"dia": dia, "shard": shard},
+            {"entradas": dias[(dia, shard, "entradas")], "salidas": dias[(dia, shard, "salidas")]},
+        )
+    for (dia, hora, shard), n in horas.items():
+        _upsert_increment(AsistenciaHora, {"dia": dia, "hora": hora, "shard": shard}, {"entradas": n})
+    for (mes, cliente_id), n in meses.items():
+        _upsert_increment(AsistenciaClienteMes, {"mes": mes, "cliente_id": cliente_id}, {"entradas": n})
+
+
+def registrar_pago(fecha_pago: datetime, metodo_pago, monto):
+    """
+    Incrementa el rollup de pagos por un pago recién insertado (sin commit).
+    """
+    _upsert_increment(
+        PagoMetodoDia,
+        {"dia": fecha_pago.date(), "metodo_pago": metodo_key(metodo_pago)},
+        {"cantidad": 1, "total": monto},
+    )
+
+
+def resumen_hoy(hoy: date) -> dict:
+    """
+    Contadores del día para el dashboard: entradas_hoy (todas las
+    asistencias) e ingresos_hoy.
+    """
+    entradas = db.session.execute(
+        select(func.coalesce(func.sum(AsistenciaDia.entradas + AsistenciaDia.salidas), 0))
+        .where(AsistenciaDia.dia == hoy)
+    ).scalar()
+    ingresos = db.session.execute(
+        select(func.coalesce(func.sum(PagoMetodoDia.total), 0)).where(PagoMetodoDia.dia == hoy)
+    ).scalar()
+    return {"entradas_hoy": int(entradas or 0), "ingresos_hoy": float(ingresos or 0)}
+
+
+# ---------- Reconstrucción ----------
+
+def _day_expr(col):
+    if _dialect() == "sqlite":
+        return func.date(col)
+    return cast(col, db.Date)
+
+
+def _hour_expr(col):
+    if _dialect() == "sqlite":
+        return cast(func.strftime("%H", col), Integer)
+    return cast(func.extract("hour", col), Integer)
+
+
+def _month_expr(col):
+    if _dialect() == "sqlite":
+        return func.date(col, "start of month")
+    return cast(func.date_trunc("month", col), db.Date)
+
+
+def _as_date(value):
+    if isinstance(value, date):
+        return value
+    return datetime.strptime(str(value)[:10], "%Y-%m-%d").date()
+
+
+def rebuild(desde: date = None, hasta: date = None) -> dict:
+    """
+    Recalcula los rollups (de todo el historial o de los meses completos
+    que cubren desde..hasta) con GROUP BY sobre las tablas base. Hace commit.
+    """
+    from datetime import timedelta
+
+    from .models import rango_dias_chile
+
+    # Meses completos, para que el rollup por cliente-mes quede entero
+    if desde:
+        desde = desde.replace(day=1)
+    if hasta:
+        hasta = (hasta.replace(day=28) + timedelta(days=4)).replace(day=1) - timedelta(days=1)
+    a_where, p_where = [], []
+    if desde or hasta:
+        inicio, fin = rango_dias_chile(desde or date(1900, 1, 1), hasta or date(9999, 12, 30))
+        a_where = [Asistencia.fecha_hora >= inicio, Asistencia.fecha_hora < fin]
+        p_where = [Pago.fecha_pago >= inicio, Pago.fecha_pago < fin]
+
+    def in_range(col):
+        conds = []
+        if desde:
+            conds.append(col >= desde)
+        if hasta:
+            conds.append(col <= hasta)
+        return conds
+
+    for model in (AsistenciaDia, AsistenciaHora, PagoMetodoDia):
+        db.session.execute(delete(model).where(*in_range(model.dia)))
+    db.session.execute(delete(AsistenciaClienteMes).where(*in_range(AsistenciaClienteMes.mes)))
+
+    fh = Asistencia.fecha_hora
+    es_entrada = func.sum(cast(Asistencia.tipo == "entrada", Integer))
+    es_salida = func.sum(cast(Asistencia.tipo != "entrada", Integer))
+
+    shard = func.coalesce(Asistencia.cliente_id, 0) % SHARDS
+
+    dias = db.session.execute(
+        select(_day_expr(fh), shard, es_entrada, es_salida)
+        .where(fh.isnot(None), *a_where)
+        .group_by(_day_expr(fh), shard)
+    ).all()
+
+    solo_entradas = [fh.isnot(None), Asistencia.tipo == "entrada", *a_where]
+
+    horas = db.session.execute(
+        select(_day_expr(fh), _hour_expr(fh), shard, func.count())
+        .where(*solo_entradas)
+        .group_by(_day_expr(fh), _hour_expr(fh), shard)
+    ).all()
+
+    meses = db.session.execute(
+        select(_month_expr(fh), Asistencia.cliente_id, func.count())
+        .where(*solo_entradas, Asistencia.cliente_id.isnot(None))
+        .group_by(_month_expr(fh), Asistencia.cliente_id)
+    ).all()
+
+    metodo = func.coalesce(func.trim(Pago.metodo_pago), "")
+    pagos = db.session.execute(
+        select(_day_expr(Pago.fecha_pago), metodo, func.count(), func.coalesce(func.sum(Pago.monto), 0))
+        .where(Pago.fecha_pago.isnot(None), *p_where)
+        .group_by(_day_expr(Pago.fecha_pago), metodo)
+    ).all()
+
+    for model, rows in (
+        (AsistenciaDia, [
+            {"dia": _as_date(d), "shard": int(sh), "entradas": int(e or 0), "salidas": int(sa or 0)}
+            for d, sh, e, sa in dias
+        ]),
+        (AsistenciaHora, [
+            {"dia": _as_date(d), "hora": int(h), "shard": int(sh), "entradas": n} for d, h, sh, n in horas
+        ]),
+        (AsistenciaClienteMes, [{"mes": _as_date(m), "cliente_id": c, "entradas": n} for m, c, n in meses]),
+        (PagoMetodoDia, [
+            {"dia": _as_date(d), "metodo_pago": mp, "cantidad": n, "total": t} for d, mp, n, t in pagos
+        ]),
+    ):
+        if rows:
+            db.session.execute(insert(model), rows)
+
+    db.session.commit()
+    return {
+        "dias": len({d for d, *_ in dias}),
+        "horas": len({(d, h) for d, h, *_ in horas}),
+        "cliente_mes": len(meses),
+        "pagos_metodo_dia": len(pagos),
+    }
@@ -1,8 +1,8 @@
 from sqlalchemy.exc import IntegrityError
-from flask import Blueprint, jsonify, request, send_file, session
+from flask import Blueprint, Response, current_app, jsonify, request, send_file, session, stream_with_context
 from datetime import date, datetime, timedelta, timezone
 from decimal import Decimal
-from sqlalchemy import func, cast, Date
+from sqlalchemy import and_, cast, func, or_, select, tuple_, Date
 from sqlalchemy.engine import Engine
 from zoneinfo import ZoneInfo
 from .decorators import login_required, roles_required
@@ -10,11 +10,24 @@ import pytz
 import io
 import qrcode
 import datetime as dt
+import base64
+import json
+
+from . import db, membresias, qr_cache, qr_signed
+from .cliente_search import cliente_changed, looks_like_rut, rut_prefix_filter, search_clientes
+from .exports import (
+    ASISTENCIAS_HEADERS, PAGOS_HEADERS, XLSX_MIMETYPE,
+    asistencias_stmt, asistencias_xlsx, gzip_chunks, iter_asistencias, iter_csv, iter_pagos,
+    pagos_stmt, pagos_xlsx, parquet_available, write_parquet,
+)
+from .live_events import publicar_asistencia
+from .rollups import registrar_asistencia as registrar_asistencia_rollup
+from .models import (
+    Cliente, Membresia, Pago, Asistencia, ClienteMembresia, CierreCaja,
+    ahora_chile, generate_qr_token, membresia_snapshot, normalizar_rut, normalizar_texto, rango_dias_chile,
+    registrar_entrada,
+)
 
-from . import db
-from .models import Cliente, Membresia, Pago, Asistencia, ClienteMembresia, CierreCaja
-
-from openpyxl import Workbook
 from reportlab.pdfgen import canvas
 from reportlab.lib.pagesizes import A4
 from reportlab.lib.units import mm
@@ -39,15 +52,170 @@ def _now_local():
 
 # -------------------- CLIENTES --------------------
 
+CLIENTES_PAGE_DEFAULT = 50
+CLIENTES_PAGE_MAX = 200
+
+# Campos de Cliente.to_dict() que se pueden pedir con ?fields= y las
+# columnas que necesita cada uno.
+CLIENTE_FIELDS = {
+    "cliente_id": ("cliente_id",),
+    "rut": ("rut",),
+    "nombre": ("nombre",),
+    "apellido": ("apellido",),
+    "telefono": ("telefono",),
+    "email": ("email",),
+    "direccion": ("direccion",),
+    "estado": ("estado",),
+    "activo": ("estado",),
+    "estado_laboral": ("estado_laboral",),
+    "sexo": ("sexo",),
+    "qr_token": ("qr_token",),
+    "membresia": (
+        "membresia_vigente",
+        "membresia_fecha_inicio",
+        "membresia_fecha_fin",
+        "membresia_actual_id",
+        "membresia_id",
+        "membresia_nombre",
+    ),
+}
+
+
+def _encode_cursor(values):
+    raw = json.dumps(values, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def _decode_cursor(cursor):
+    raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+    nombre, apellido, cliente_id = json.loads(raw)
+    return str(nombre), str(apellido), int(cliente_id)
+
+
+def _prefix_filter(expr, prefix):
+    """
+    expr empieza con prefix. El rango >= / < permite usar el índice sobre
+    expr; el LIKE descarta lo que el rango deja pasar.
+    """
+    escaped = prefix.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    upper = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+    return and_(expr >= prefix, expr < upper, expr.like(f"{escaped}%", escape="\\"))
+
+
+def _clientes_search_filter(q):
+    """
+    Un RUT (con o sin puntos/guion) se busca por prefijo de rut_normalizado;
+    si no, cada palabra (sin tildes, como en cliente_search) debe ser
+    prefijo del nombre o del apellido normalizados, o el texto completo
+    prefijo del email.
+    """
+    q = q.strip().lower()
+    if looks_like_rut(q):
+        return and_(*rut_prefix_filter(q))
+
+    words = [w for w in normalizar_texto(q).split() if w]
+    by_name = and_(*[
+        or_(_prefix_filter(Cliente.nombre_normalizado, w), _prefix_filter(Cliente.apellido_normalizado, w))
+        for w in words
+    ])
+    return or_(by_name, _prefix_filter(func.lower(Cliente.email), q))
+
+
 @bp.get("/clientes")
 @login_required
 def listar_clientes():
-    clientes = (
-        Cliente.query
-        .order_by(Cliente.nombre.asc(), Cliente.apellido.asc())
-        .all()
-    )
-    return jsonify([c.to_dict() for c in clientes])
+    """
+    Lista de clientes ordenada por nombre, apellido (lo mismo que
+    Cliente.to_dict() para cada uno). Con ?limit= o ?cursor= pagina por
+    cursor (keyset sobre nombre, apellido, cliente_id) y responde
+    {items, next_cursor, has_more}.
+
+    Query params:
+      - q: búsqueda por prefijo de RUT, nombre/apellido o email
+      - fields: campos separados por coma (por defecto todos)
+      - limit: filas por página (máx. CLIENTES_PAGE_MAX); activa la paginación
+      - cursor: next_cursor de la página anterior; activa la paginación
+    """
+    paginado = "limit" in request.args or "cursor" in request.args
+
+    limit = None
+    if paginado:
+        try:
+            limit = int(request.args.get("limit", CLIENTES_PAGE_DEFAULT))
+        except ValueError:
+            return jsonify({"error": "limit debe ser un número"}), 400
+        limit = max(1, min(limit, CLIENTES_PAGE_MAX))
+
+    fields = [f.strip() for f in (request.args.get("fields") or "").split(",") if f.strip()]
+    fields = fields or list(CLIENTE_FIELDS)
+    invalid = [f for f in fields if f not in CLIENTE_FIELDS]
+    if invalid:
+        return jsonify({"error": f"Campos no válidos: {', '.join(invalid)}"}), 400
+
+    # Las columnas del orden siempre se leen para armar el cursor
+    needed = ["nombre", "apellido", "cliente_id"]
+    for f in fields:
+        needed += [c for c in CLIENTE_FIELDS[f] if c not in needed]
+    columns = [getattr(Cliente, c) for c in needed]
+
+    stmt = select(*columns).order_by(Cliente.nombre.asc(), Cliente.apellido.asc(), Cliente.cliente_id.asc())
+
+    q = (request.args.get("q") or "").strip()
+    if q:
+        stmt = stmt.where(_clientes_search_filter(q))
+
+    cursor = (request.args.get("cursor") or "").strip()
+    if cursor:
+        try:
+            after = _decode_cursor(cursor)
+        except Exception:
+            return jsonify({"error": "cursor inválido"}), 400
+        stmt = stmt.where(tuple_(Cliente.nombre, Cliente.apellido, Cliente.cliente_id) > after)
+
+    if limit is not None:
+        stmt = stmt.limit(limit + 1)
+    rows = db.session.execute(stmt).all()
+    has_more = limit is not None and len(rows) > limit
+    rows = rows[:limit]
+
+    hoy = _today_local()
+    items = []
+    for row in rows:
+        item = {}
+        for f in fields:
+            if f == "activo":
+                item[f] = row.estado == "activo"
+            elif f == "membresia":
+                item[f] = membresia_snapshot(row, hoy)
+            else:
+                item[f] = getattr(row, f)
+        items.append(item)
+
+    if not paginado:
+        return jsonify(items)
+
+    next_cursor = None
+    if has_more and rows:
+        last = rows[-1]
+        next_cursor = _encode_cursor([last.nombre, last.apellido, last.cliente_id])
+
+    return jsonify({"items": items, "next_cursor": next_cursor, "has_more": has_more})
+
+
+@bp.get("/clientes/buscar")
+@login_required
+def buscar_clientes():
+    """
+    Typeahead: RUT parcial en cualquier formato o nombre/apellido parcial
+    (tolerante a tildes y errores de tipeo).
+    """
+    q = (request.args.get("q") or "").strip()
+    try:
+        limit = max(1, min(int(request.args.get("limit", 10)), 50))
+    except ValueError:
+        return jsonify({"error": "limit debe ser un número"}), 400
+
+    return jsonify({"items": search_clientes(q, limit)})
 
 
 @bp.post("/clientes")
@@ -67,7 +235,7 @@ def crear_cliente():
     if not rut or not nombre or not apellido:
         return jsonify({"error": "rut, nombre y apellido son obligatorios"}), 400
 
-    if Cliente.query.filter_by(rut=rut).first():
+    if Cliente.query.filter_by(rut_normalizado=normalizar_rut(rut)).first():
         return jsonify({"error": "Ya existe un cliente con ese RUT"}), 409
 
     if email and Cliente.query.filter_by(email=email).first():
@@ -90,7 +258,12 @@ def crear_cliente():
             c.ensure_qr_token()
 
         db.session.add(c)
+        if qr_signed.signed_enabled():
+            db.session.flush()
+            c.qr_token = qr_signed.emitir(c.cliente_id)
         db.session.commit()
+        cliente_changed(c)
+        qr_cache.cliente_changed(c)
 
         return jsonify({
             "cliente_id": c.cliente_id,
@@ -132,6 +305,32 @@ def obtener_cliente(cliente_id):
     return jsonify(c.to_dict())
 
 
+@bp.post("/clientes/<int:cliente_id>/qr/regenerar")
+@login_required
+def regenerar_qr_cliente(cliente_id):
+    """
+    Emite un QR nuevo (carnet perdido, etc.). Si el anterior era firmado
+    queda revocado; uno aleatorio deja de valer al reemplazarlo.
+    """
+    c = Cliente.query.get_or_404(cliente_id)
+    anterior = c.qr_token
+
+    try:
+        if qr_signed.signed_enabled():
+            c.qr_token = qr_signed.reemitir(c.cliente_id, anterior)
+        else:
+            qr_signed.revocar(anterior)
+            c.qr_token = generate_qr_token()
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"error": "Error al regenerar QR", "detail": str(e)}), 500
+
+    qr_cache.discard(anterior)
+    qr_cache.cliente_changed(c)
+    return jsonify({"cliente_id": c.cliente_id, "qr_token": c.qr_token})
+
+
 @bp.put("/clientes/<int:cliente_id>")
 @login_required
 def actualizar_cliente(cliente_id):
@@ -151,7 +350,9 @@ def actualizar_cliente(cliente_id):
     if not rut or not nombre or not apellido:
         return jsonify({"error": "rut, nombre y apellido son obligatorios"}), 400
 
-    otro_rut = Cliente.query.filter(Cliente.rut == rut, Cliente.cliente_id != cliente_id).first()
+    otro_rut = Cliente.query.filter(
+        Cliente.rut_normalizado == normalizar_rut(rut), Cliente.cliente_id != cliente_id
+    ).first()
     if otro_rut:
         return jsonify({"error": "Ya existe otro cliente con ese RUT"}), 409
 
@@ -172,6 +373,8 @@ def actualizar_cliente(cliente_id):
         c.estado = estado
 
         db.session.commit()
+        cliente_changed(c)
+        qr_cache.cliente_changed(c)
 
         return jsonify({
             "ok": True,
@@ -271,6 +474,7 @@ def actualizar_membresia(membresia_id):
     try:
         if "nombre" in payload:
             m.nombre = (payload.get("nombre") or "").strip()
+            membresias.renombrar_plan(m.membresia_id, m.nombre)
 
         if "precio" in payload and payload.get("precio") not in (None, ""):
             m.precio = payload.get("precio")
@@ -326,24 +530,18 @@ def eliminar_membresia(membresia_id):
 @bp.get("/clientes/<int:cliente_id>/membresia-activa")
 @login_required
 def obtener_membresia_activa(cliente_id):
+    # Vigencia desde el snapshot del cliente; el detalle (precio, duración)
+    # sólo se lee por PK cuando hay membresía vigente.
     hoy = _today_local()
+    cliente = db.session.get(Cliente, cliente_id)
+    if not cliente or not membresia_snapshot(cliente, hoy)["vigente"]:
+        return jsonify({"activa": False, "membresia": None})
 
-    cm = (
-        ClienteMembresia.query
-        .filter(
-            ClienteMembresia.cliente_id == cliente_id,
-            ClienteMembresia.estado == "activa",
-            ClienteMembresia.fecha_inicio <= hoy,
-            ClienteMembresia.fecha_fin >= hoy,
-        )
-        .order_by(ClienteMembresia.fecha_fin.desc())
-        .first()
-    )
-
-    if not cm:
+    cm = db.session.get(ClienteMembresia, cliente.membresia_actual_id)
+    if not cm or cm.estado != "activa" or not (cm.fecha_inicio <= hoy <= cm.fecha_fin):
         return jsonify({"activa": False, "membresia": None})
 
-    m = Membresia.query.get(cm.membresia_id)
+    m = db.session.get(Membresia, cm.membresia_id)
 
     return jsonify({
         "activa": True,
@@ -366,12 +564,12 @@ def obtener_membresia_activa(cliente_id):
 @bp.get("/asistencias/hoy")
 @login_required
 def listar_asistencias_hoy():
-    hoy = _today_local()
+    inicio, fin = rango_dias_chile(_today_local())
 
     rows = (
         db.session.query(Asistencia, Cliente)
         .join(Cliente, Cliente.cliente_id == Asistencia.cliente_id)
-        .filter(func.date(Asistencia.fecha_hora) == hoy)
+        .filter(Asistencia.fecha_hora >= inicio, Asistencia.fecha_hora < fin)
         .order_by(Asistencia.fecha_hora.desc())
         .all()
     )
@@ -406,43 +604,46 @@ def marcar_asistencia():
         return jsonify({"error": "Cliente no encontrado"}), 404
 
     try:
-        hoy = _today_local()
-
         if tipo == "entrada":
-            existente = (
-                Asistencia.query
-                .filter(
-                    Asistencia.cliente_id == cliente_id,
-                    Asistencia.tipo == "entrada",
-                    func.date(Asistencia.fecha_hora) == hoy,
-                )
-                .order_by(Asistencia.fecha_hora.asc())
-                .first()
-            )
-
-            if existente:
+            a, creada = registrar_entrada(cliente_id)
+            db.session.commit()
+
+            asistencia = {
+                "asistencia_id": a.asistencia_id,
+                "cliente_id": a.cliente_id,
+                "fecha_hora": a.fecha_hora.isoformat() if a.fecha_hora else None,
+                "tipo": a.tipo,
+            }
+
+            if not creada:
                 return jsonify({
                     "ok": False,
                     "already_marked": True,
                     "message": "El cliente ya registró entrada hoy",
-                    "hora": existente.fecha_hora.isoformat() if existente.fecha_hora else None,
-                    "asistencia": {
-                        "asistencia_id": existente.asistencia_id,
-                        "cliente_id": existente.cliente_id,
-                        "fecha_hora": existente.fecha_hora.isoformat() if existente.fecha_hora else None,
-                        "tipo": getattr(existente, "tipo", "entrada"),
-                    }
+                    "hora": asistencia["fecha_hora"],
+                    "asistencia": asistencia,
+                    "membresia": membresia_snapshot(cliente),
                 }), 200
 
+            return jsonify({
+                "ok": True,
+                "already_marked": False,
+                "asistencia": asistencia,
+                "membresia": membresia_snapshot(cliente),
+            }), 201
+
         a = Asistencia(
             cliente_id=cliente_id,
-            fecha_hora=_now_local(),
+            fecha_hora=ahora_chile(),
         )
 
         if hasattr(a, "tipo"):
             a.tipo = tipo
 
         db.session.add(a)
+        db.session.flush()
+        registrar_asistencia_rollup(cliente_id, a.fecha_hora, tipo)
+        publicar_asistencia(a.asistencia_id, cliente_id, a.fecha_hora, tipo)
         db.session.commit()
 
         return jsonify({
@@ -472,27 +673,31 @@ def marcar_asistencia_qr():
     if not token:
         return jsonify({"error": "token es obligatorio"}), 400
 
-    if not hasattr(Cliente, "qr_token"):
-        return jsonify({"error": "El modelo Cliente no tiene qr_token"}), 400
-
-    cliente = Cliente.query.filter_by(qr_token=token).first()
+    cliente_id = None
+    if qr_signed.is_signed(token):
+        # Firma y revocación se validan en memoria: un QR falsificado no llega a la BD
+        decoded = qr_signed.verificar(token)
+        if decoded is None:
+            return jsonify({"error": "QR no válido"}), 404
+        cliente_id, emitido = decoded
+        if qr_signed.revocado(cliente_id, emitido):
+            return jsonify({"error": "QR revocado"}), 403
+
+    # Token -> cliente desde el cache en memoria: el check-in no consulta clientes
+    cliente = qr_cache.lookup(token, cliente_id)
     if not cliente:
         return jsonify({"error": "QR no válido"}), 404
 
     try:
-        a = Asistencia(
-            cliente_id=cliente.cliente_id,
-            fecha_hora=_now_local(),
-        )
-
-        if hasattr(a, "tipo"):
-            a.tipo = "entrada"
-
-        db.session.add(a)
+        a, creada = registrar_entrada(cliente.cliente_id, cliente=cliente)
         db.session.commit()
 
-        return jsonify({
-            "ok": True,
+        hora = a.fecha_hora.isoformat() if a.fecha_hora else None
+        body = {
+            "ok": creada,
+            "already_marked": not creada,
+            "duplicado": not creada,
+            "hora": hora,
             "cliente": {
                 "cliente_id": cliente.cliente_id,
                 "nombre": cliente.nombre,
@@ -501,10 +706,23 @@ def marcar_asistencia_qr():
             },
             "asistencia": {
                 "asistencia_id": a.asistencia_id,
-                "fecha_hora": a.fecha_hora.isoformat() if a.fecha_hora else None,
-                "tipo": getattr(a, "tipo", "entrada"),
-            }
-        }), 201
+                "fecha_hora": hora,
+                "tipo": a.tipo,
+            },
+            "membresia": membresia_snapshot(cliente),
+        }
+
+        if not creada:
+            body["message"] = "El cliente ya registró entrada hoy"
+            return jsonify(body), 200
+
+        return jsonify(body), 201
+
+    except IntegrityError:
+        # Cliente borrado con el token aún en cache
+        db.session.rollback()
+        qr_cache.discard(token)
+        return jsonify({"error": "QR no válido"}), 404
 
     except Exception as e:
         db.session.rollback()
@@ -514,6 +732,41 @@ def marcar_asistencia_qr():
         }), 500
 
 
+@bp.post("/asistencias/bulk")
+@login_required
+def marcar_asistencias_bulk():
+    """
+    Lote de check-ins (kiosko sin conexión, logs del torniquete):
+    {"eventos": [{"idempotency_key", "token" | "cliente_id", "fecha_hora", "tipo"}]}.
+    Responde un resultado por evento en el mismo orden (ver asistencias_bulk.py).
+    """
+    from .asistencias_bulk import LoteDemasiadoGrande, ingest
+
+    payload = request.get_json(silent=True) or {}
+    eventos = payload.get("eventos")
+    if not isinstance(eventos, list) or not eventos:
+        return jsonify({"error": "eventos debe ser una lista no vacía"}), 400
+
+    try:
+        resultados = ingest(eventos, current_app.config.get("ASISTENCIAS_BULK_MAX", 1000))
+        db.session.commit()
+    except LoteDemasiadoGrande as e:
+        db.session.rollback()
+        return jsonify({"error": str(e)}), 413
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({
+            "error": "Error al registrar asistencias",
+            "detail": str(e)
+        }), 500
+
+    resumen = {}
+    for r in resultados:
+        resumen[r["estado"]] = resumen.get(r["estado"], 0) + 1
+
+    return jsonify({"resultados": resultados, "resumen": resumen})
+
+
 @bp.get("/asistencias/rango")
 @login_required
 def asistencias_rango():
@@ -529,12 +782,14 @@ def asistencias_rango():
     except ValueError:
         return jsonify({"error": "Formato de fecha inválido. Use YYYY-MM-DD"}), 400
 
+    inicio, fin = rango_dias_chile(f1, f2)
+
     rows = (
         db.session.query(Asistencia, Cliente)
         .join(Cliente, Cliente.cliente_id == Asistencia.cliente_id)
         .filter(
-            func.date(Asistencia.fecha_hora) >= f1,
-            func.date(Asistencia.fecha_hora) <= f2,
+            Asistencia.fecha_hora >= inicio,
+            Asistencia.fecha_hora < fin,
         )
         .order_by(Asistencia.fecha_hora.desc())
         .all()
@@ -554,63 +809,59 @@ def asistencias_rango():
 
     return jsonify(data)
 
-@bp.get("/asistencias/rango/excel")
-@login_required
-def exportar_asistencias_rango_excel():
+def _rango_asistencias_args():
+    """
+    Lee from/to (o desde/hasta) obligatorios. Devuelve (f1, f2, error).
+    """
     desde = (request.args.get("from") or request.args.get("desde") or "").strip()
     hasta = (request.args.get("to") or request.args.get("hasta") or "").strip()
 
     if not desde or not hasta:
-        return jsonify({"error": "Debe enviar from/to o desde/hasta en formato YYYY-MM-DD"}), 400
+        return None, None, (jsonify({"error": "Debe enviar from/to o desde/hasta en formato YYYY-MM-DD"}), 400)
 
     try:
         f1 = datetime.strptime(desde, "%Y-%m-%d").date()
         f2 = datetime.strptime(hasta, "%Y-%m-%d").date()
     except ValueError:
-        return jsonify({"error": "Formato de fecha inválido. Use YYYY-MM-DD"}), 400
+        return None, None, (jsonify({"error": "Formato de fecha inválido. Use YYYY-MM-DD"}), 400)
 
-    rows = (
-        db.session.query(Asistencia, Cliente)
-        .join(Cliente, Cliente.cliente_id == Asistencia.cliente_id)
-        .filter(
-            func.date(Asistencia.fecha_hora) >= f1,
-            func.date(Asistencia.fecha_hora) <= f2,
-        )
-        .order_by(Asistencia.fecha_hora.desc())
-        .all()
+    return f1, f2, None
+
+
+def _csv_response(nombre_archivo, headers, rows):
+    """
+    CSV generado a medida que salen filas del cursor; gzip si el cliente lo acepta.
+    """
+    chunks = iter_csv(headers, rows)
+    extra = {"Content-Disposition": f'attachment; filename="{nombre_archivo}"', "Vary": "Accept-Encoding"}
+
+    if "gzip" in (request.headers.get("Accept-Encoding") or "").lower():
+        chunks = gzip_chunks(chunks)
+        extra["Content-Encoding"] = "gzip"
+
+    return Response(stream_with_context(chunks), mimetype="text/csv", headers=extra)
+
+
+def _parquet_response(nombre_archivo, stmt):
+    if not parquet_available():
+        return jsonify({"error": "Export Parquet no disponible (instale pyarrow)"}), 501
+
+    return send_file(
+        write_parquet(stmt),
+        as_attachment=True,
+        download_name=nombre_archivo,
+        mimetype="application/vnd.apache.parquet",
     )
 
-    wb = Workbook()
-    ws = wb.active
-    ws.title = "Asistencias"
-
-    ws.append([
-        "Asistencia ID",
-        "Fecha",
-        "Hora",
-        "Cliente ID",
-        "Cliente",
-        "RUT",
-        "Tipo",
-    ])
 
-    for a, c in rows:
-        fecha_txt = a.fecha_hora.strftime("%Y-%m-%d") if a.fecha_hora else ""
-        hora_txt = a.fecha_hora.strftime("%H:%M") if a.fecha_hora else ""
-
-        ws.append([
-            a.asistencia_id,
-            fecha_txt,
-            hora_txt,
-            c.cliente_id,
-            f"{c.nombre} {c.apellido}",
-            c.rut,
-            getattr(a, "tipo", "entrada"),
-        ])
-
-    output = io.BytesIO()
-    wb.save(output)
-    output.seek(0)
+@bp.get("/asistencias/rango/excel")
+@login_required
+def exportar_asistencias_rango_excel():
+    f1, f2, error = _rango_asistencias_args()
+    if error:
+        return error
+
+    output = asistencias_xlsx(f1, f2)
 
     nombre_archivo = f"asistencias_{f1.strftime('%Y%m%d')}_{f2.strftime('%Y%m%d')}.xlsx"
 
@@ -618,8 +869,30 @@ def exportar_asistencias_rango_excel():
         output,
         as_attachment=True,
         download_name=nombre_archivo,
-        mimetype="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+        mimetype=XLSX_MIMETYPE,
     )
+
+
+@bp.get("/asistencias/rango/csv")
+@login_required
+def exportar_asistencias_rango_csv():
+    f1, f2, error = _rango_asistencias_args()
+    if error:
+        return error
+
+    nombre_archivo = f"asistencias_{f1.strftime('%Y%m%d')}_{f2.strftime('%Y%m%d')}.csv"
+    return _csv_response(nombre_archivo, ASISTENCIAS_HEADERS, iter_asistencias(f1, f2))
+
+
+@bp.get("/asistencias/rango/parquet")
+@login_required
+def exportar_asistencias_rango_parquet():
+    f1, f2, error = _rango_asistencias_args()
+    if error:
+        return error
+
+    nombre_archivo = f"asistencias_{f1.strftime('%Y%m%d')}_{f2.strftime('%Y%m%d')}.parquet"
+    return _parquet_response(nombre_archivo, asistencias_stmt(f1, f2))
 # DEBUG TEST
 
 # -------------------- PAGOS --------------------
@@ -627,7 +900,7 @@ def exportar_asistencias_rango_excel():
 @bp.get("/pagos/hoy")
 @login_required
 def listar_pagos_hoy():
-    hoy = _today_local()
+    inicio, fin = rango_dias_chile(_today_local())
 
     rows = (
         db.session.query(Pago, Cliente, ClienteMembresia, Membresia)
@@ -640,7 +913,7 @@ def listar_pagos_hoy():
             Membresia,
             Membresia.membresia_id == ClienteMembresia.membresia_id
         )
-        .filter(func.date(Pago.fecha_pago) == hoy)
+        .filter(Pago.fecha_pago >= inicio, Pago.fecha_pago < fin)
         .order_by(Pago.fecha_pago.desc())
         .all()
     )
@@ -685,9 +958,10 @@ def listar_pagos_hoy():
     })
 
 
-@bp.get("/pagos/export/excel")
-@login_required
-def exportar_pagos_excel():
+def _rango_pagos_args():
+    """
+    Lee from/to opcionales (por defecto los últimos 30 días). Devuelve (f1, f2, error).
+    """
     desde = (request.args.get("from") or "").strip()
     hasta = (request.args.get("to") or "").strip()
 
@@ -702,57 +976,19 @@ def exportar_pagos_excel():
         else:
             f2 = _today_local()
     except ValueError:
-        return jsonify({"error": "Formato de fecha inválido. Use YYYY-MM-DD"}), 400
+        return None, None, (jsonify({"error": "Formato de fecha inválido. Use YYYY-MM-DD"}), 400)
 
-    rows = (
-        db.session.query(Pago, Cliente, ClienteMembresia, Membresia)
-        .join(Cliente, Cliente.cliente_id == Pago.cliente_id)
-        .outerjoin(
-            ClienteMembresia,
-            ClienteMembresia.cliente_membresia_id == Pago.cliente_membresia_id
-        )
-        .outerjoin(
-            Membresia,
-            Membresia.membresia_id == ClienteMembresia.membresia_id
-        )
-        .filter(
-            func.date(Pago.fecha_pago) >= f1,
-            func.date(Pago.fecha_pago) <= f2,
-        )
-        .order_by(Pago.fecha_pago.desc())
-        .all()
-    )
+    return f1, f2, None
 
-    wb = Workbook()
-    ws = wb.active
-    ws.title = "Pagos"
-
-    ws.append([
-        "Pago ID",
-        "Fecha pago",
-        "Cliente ID",
-        "Cliente",
-        "RUT",
-        "Membresía",
-        "Monto",
-        "Método de pago",
-    ])
 
-    for p, c, cm, m in rows:
-        ws.append([
-            p.pago_id,
-            p.fecha_pago.strftime("%Y-%m-%d %H:%M:%S") if p.fecha_pago else "",
-            c.cliente_id,
-            f"{c.nombre} {c.apellido}",
-            c.rut,
-            m.nombre if m else "",
-            float(p.monto or 0),
-            p.metodo_pago or "",
-        ])
-
-    output = io.BytesIO()
-    wb.save(output)
-    output.seek(0)
+@bp.get("/pagos/export/excel")
+@login_required
+def exportar_pagos_excel():
+    f1, f2, error = _rango_pagos_args()
+    if error:
+        return error
+
+    output = pagos_xlsx(f1, f2)
 
     nombre_archivo = f"pagos_{f1.strftime('%Y%m%d')}_{f2.strftime('%Y%m%d')}.xlsx"
 
@@ -760,5 +996,27 @@ def exportar_pagos_excel():
         output,
         as_attachment=True,
         download_name=nombre_archivo,
-        mimetype="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-    )
\ No newline at end of file
+        mimetype=XLSX_MIMETYPE,
+    )
+
+
+@bp.get("/pagos/export/csv")
+@login_required
+def exportar_pagos_csv():
+    f1, f2, error = _rango_pagos_args()
+    if error:
+        return error
+
+    nombre_archivo = f"pagos_{f1.strftime('%Y%m%d')}_{f2.strftime('%Y%m%d')}.csv"
+    return _csv_response(nombre_archivo, PAGOS_HEADERS, iter_pagos(f1, f2))
+
+
+@bp.get("/pagos/export/parquet")
+@login_required
+def exportar_pagos_parquet():
+    f1, f2, error = _rango_pagos_args()
+    if error:
+        return error
+
+    nombre_archivo = f"pagos_{f1.strftime('%Y%m%d')}_{f2.strftime('%Y%m%d')}.parquet"
+    return _parquet_response(nombre_archivo, pagos_stmt(f1, f2))
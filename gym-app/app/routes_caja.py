@@ -1,21 +1,19 @@
 from flask import Blueprint, jsonify
-from datetime import date
-from sqlalchemy import func
 from app import db
 
 api_caja = Blueprint("api_caja", __name__)
 
 @api_caja.get("/api/caja/cierre-hoy")
 def cierre_hoy():
-    hoy = date.today()
-
     try:
-        from app.models import CierreCaja
+        from app.models import CierreCaja, hoy_chile
     except Exception:
         return jsonify({"cerrado": False})
 
+    hoy = hoy_chile()
+
     cierre = db.session.query(CierreCaja).filter(
-        func.date(CierreCaja.fecha) == hoy
+        CierreCaja.fecha == hoy
     ).first()
 
     if not cierre:
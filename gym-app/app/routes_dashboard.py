@@ -2,25 +2,31 @@ from flask import Blueprint, jsonify, request
 from datetime import date, timedelta, datetime
 from sqlalchemy import func, desc
 from app import db
+from app.dashboard_cache import cached, snapshot as cache_snapshot
+from app.decorators import login_required
 
 api_dashboard = Blueprint("api_dashboard", __name__)
 
 @api_dashboard.get("/api/dashboard/resumen")
+@cached
 def dashboard_resumen():
-    hoy = date.today()
-
     # Modelos reales según tu models.py
-    from app.models import Cliente, Asistencia, ClienteMembresia, Pago
+    from app.models import Cliente, ClienteMembresia, hoy_chile
+    from app.rollups import resumen_hoy
+
+    hoy = hoy_chile()
 
     clientes_activos = db.session.query(Cliente).count()
 
-    entradas_hoy = db.session.query(Asistencia).filter(
-        func.date(Asistencia.fecha_hora) == hoy
-    ).count()
+    # Rollups del día (ver app/rollups.py)
+    contadores = resumen_hoy(hoy)
 
-    ingresos_hoy = db.session.query(func.coalesce(func.sum(Pago.monto), 0)).filter(
-        func.date(Pago.fecha_pago) == hoy
-    ).scalar()
+    # Snapshot en clientes (ver app/membresias.py)
+    membresias_vigentes = db.session.query(Cliente).filter(
+        Cliente.membresia_vigente.is_(True),
+        Cliente.membresia_fecha_fin >= hoy,
+        Cliente.membresia_fecha_inicio <= hoy,
+    ).count()
 
     vencimientos_7d = db.session.query(ClienteMembresia).filter(
         ClienteMembresia.estado == "activa",
@@ -30,19 +36,31 @@ def dashboard_resumen():
 
     return jsonify({
         "clientes_activos": int(clientes_activos),
-        "entradas_hoy": int(entradas_hoy),
-        "ingresos_hoy": float(ingresos_hoy or 0),
+        "entradas_hoy": contadores["entradas_hoy"],
+        "ingresos_hoy": contadores["ingresos_hoy"],
         "vencimientos_7d": int(vencimientos_7d),
+        "membresias_vigentes": int(membresias_vigentes),
     })
 
 
+@api_dashboard.get("/api/dashboard/cache/stats")
+@login_required
+def dashboard_cache_stats():
+    """
+    Contadores del cache de dashboards (hits, misses, invalidaciones,
+    hit_rate) para ajustar DASHBOARD_CACHE_TTL.
+    """
+    return jsonify(cache_snapshot())
+
+
 @api_dashboard.get("/api/dashboard/vencimientos")
+@cached
 def dashboard_vencimientos():
     days = int(request.args.get("days", 7))
-    hoy = date.today()
-    limite = hoy + timedelta(days=days)
+    from app.models import ClienteMembresia, Cliente, Membresia, hoy_chile
 
-    from app.models import ClienteMembresia, Cliente, Membresia
+    hoy = hoy_chile()
+    limite = hoy + timedelta(days=days)
 
     rows = (
         db.session.query(ClienteMembresia, Cliente, Membresia)
@@ -83,108 +101,74 @@ def _add_months(d, months):
     m = (d.month - 1 + months) % 12 + 1
     return d.replace(year=y, month=m, day=1)
 
-def _db_is_sqlite():
-    try:
-        return db.engine.name == "sqlite"
-    except Exception:
-        return False
-
 
 @api_dashboard.get("/api/dashboard/asistencia/dias")
+@cached
 def dash_asistencia_dias():
     """
     Serie diaria del mes actual (para gráfico de tendencias).
     Retorna: [{fecha: 'YYYY-MM-DD', total: N}, ...]
     """
-    from app.models import Asistencia
+    from app.models import AsistenciaDia, hoy_chile
 
-    today = date.today()
+    today = hoy_chile()
     start = _month_start(today)
     end = _add_months(start, 1)  # primer día del próximo mes
 
-    # Solo 'entrada' (según tu UI)
-    if _db_is_sqlite():
-        day_expr = func.date(Asistencia.fecha_hora)
-    else:
-        day_expr = func.date_trunc("day", Asistencia.fecha_hora)
-
+    # Solo 'entrada' (según tu UI), desde el rollup diario (suma de shards)
+    total = func.sum(AsistenciaDia.entradas)
     rows = (
-        db.session.query(day_expr.label("dia"), func.count(Asistencia.asistencia_id).label("total"))
+        db.session.query(AsistenciaDia.dia, total)
         .filter(
-            Asistencia.tipo == "entrada",
-            Asistencia.fecha_hora >= start,
-            Asistencia.fecha_hora < end,
+            AsistenciaDia.dia >= start,
+            AsistenciaDia.dia < end,
         )
-        .group_by("dia")
-        .order_by("dia")
+        .group_by(AsistenciaDia.dia)
+        .having(total > 0)
+        .order_by(AsistenciaDia.dia)
         .all()
     )
 
-    out = []
-    for dia, total in rows:
-        # dia puede venir como string (sqlite) o datetime (postgres)
-        if isinstance(dia, str):
-            fecha = dia
-        else:
-            fecha = dia.date().isoformat() if hasattr(dia, "date") else str(dia)
-        out.append({"fecha": fecha, "total": int(total)})
-
-    return jsonify(out)
+    return jsonify([{"fecha": dia.isoformat(), "total": int(total)} for dia, total in rows])
 
 
 @api_dashboard.get("/api/dashboard/asistencia/horas")
+@cached
 def dash_asistencia_horas():
     """
     Ranking de horas del mes actual.
     Retorna: [{hora: 'HH:00', total: N}, ...] ordenado desc.
     """
-    from app.models import Asistencia
+    from app.models import AsistenciaHora, hoy_chile
 
-    today = date.today()
+    today = hoy_chile()
     start = _month_start(today)
     end = _add_months(start, 1)
 
-    if _db_is_sqlite():
-        # '15' etc.
-        hour_expr = func.strftime("%H", Asistencia.fecha_hora)
-    else:
-        hour_expr = func.extract("hour", Asistencia.fecha_hora)
-
     rows = (
-        db.session.query(hour_expr.label("h"), func.count(Asistencia.asistencia_id).label("total"))
+        db.session.query(AsistenciaHora.hora, func.sum(AsistenciaHora.entradas).label("total"))
         .filter(
-            Asistencia.tipo == "entrada",
-            Asistencia.fecha_hora >= start,
-            Asistencia.fecha_hora < end,
+            AsistenciaHora.dia >= start,
+            AsistenciaHora.dia < end,
         )
-        .group_by("h")
-        .order_by(desc("total"))
+        .group_by(AsistenciaHora.hora)
+        .order_by(desc("total"), AsistenciaHora.hora)
         .all()
     )
 
-    out = []
-    for h, total in rows:
-        # sqlite -> str; postgres -> Decimal/float/int
-        try:
-            hh = int(h)
-        except Exception:
-            hh = int(float(h))
-        out.append({"hora": f"{hh:02d}:00", "total": int(total)})
-
-    return jsonify(out)
+    return jsonify([{"hora": f"{int(h):02d}:00", "total": int(total)} for h, total in rows if total])
 
 
 @api_dashboard.get("/api/dashboard/asistencia/top-clientes")
+@cached
 def dash_asistencia_top_clientes():
     """
     Top clientes del mes actual por cantidad de 'entradas'.
     Retorna: [{cliente_id, nombre, apellido, rut, total}, ...]
     """
-    from app.models import Asistencia, Cliente
+    from app.models import AsistenciaClienteMes, Cliente, hoy_chile
 
-    today = date.today()
-    start = _month_start(today)
-    end = _add_months(start, 1)
+    start = _month_start(hoy_chile())
 
     rows = (
         db.session.query(
@@ -192,16 +176,11 @@ def dash_asistencia_top_clientes():
             Cliente.nombre.label("nombre"),
             Cliente.apellido.label("apellido"),
             Cliente.rut.label("rut"),
-            func.count(Asistencia.asistencia_id).label("total"),
+            AsistenciaClienteMes.entradas.label("total"),
         )
-        .join(Asistencia, Asistencia.cliente_id == Cliente.cliente_id)
-        .filter(
-            Asistencia.tipo == "entrada",
-            Asistencia.fecha_hora >= start,
-            Asistencia.fecha_hora < end,
-        )
-        .group_by(Cliente.cliente_id, Cliente.nombre, Cliente.apellido, Cliente.rut)
-        .order_by(desc("total"))
+        .join(Cliente, Cliente.cliente_id == AsistenciaClienteMes.cliente_id)
+        .filter(AsistenciaClienteMes.mes == start)
+        .order_by(AsistenciaClienteMes.entradas.desc(), Cliente.cliente_id)
         .limit(10)
         .all()
     )
@@ -216,4 +195,4 @@ def dash_asistencia_top_clientes():
             "total": int(r.total),
         })
 
-    return jsonify(out)
\ No newline at end of file
+    return jsonify(out)
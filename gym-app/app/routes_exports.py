@@ -0,0 +1,79 @@
+# app/routes_exports.py
+from datetime import datetime
+
+from flask import Blueprint, current_app, jsonify, request, send_file
+
+from .decorators import login_required
+from .export_jobs import FORMATS, KINDS, artifact_path, enqueue, get_job
+from .exports import parquet_available
+
+api_exports = Blueprint("api_exports", __name__)
+
+
+def _job_dict(meta):
+    job_id = meta["job_id"]
+    data = {k: v for k, v in meta.items() if k != "creado"}
+    data["status_url"] = f"/api/exports/{job_id}"
+    if meta.get("estado") == "listo":
+        data["download_url"] = f"/api/exports/{job_id}/download"
+    return data
+
+
+@api_exports.post("/api/exports")
+@login_required
+def crear_export():
+    payload = request.get_json(silent=True) or {}
+    kind = (payload.get("kind") or "").strip()
+    fmt = (payload.get("format") or "xlsx").strip().lower()
+    desde = (payload.get("from") or "").strip()
+    hasta = (payload.get("to") or "").strip()
+
+    if kind not in KINDS:
+        return jsonify({"error": f"kind debe ser uno de: {', '.join(sorted(KINDS))}"}), 400
+    if fmt not in FORMATS:
+        return jsonify({"error": f"format debe ser uno de: {', '.join(FORMATS)}"}), 400
+    if fmt == "parquet" and not parquet_available():
+        return jsonify({"error": "Export Parquet no disponible (instale pyarrow)"}), 501
+    if not desde or not hasta:
+        return jsonify({"error": "Debe enviar from y to en formato YYYY-MM-DD"}), 400
+
+    try:
+        f1 = datetime.strptime(desde, "%Y-%m-%d").date()
+        f2 = datetime.strptime(hasta, "%Y-%m-%d").date()
+    except ValueError:
+        return jsonify({"error": "Formato de fecha inválido. Use YYYY-MM-DD"}), 400
+
+    if f2 < f1:
+        return jsonify({"error": "to debe ser mayor o igual que from"}), 400
+
+    meta, en_cache = enqueue(current_app._get_current_object(), kind, fmt, f1, f2)
+    data = _job_dict(meta)
+    data["en_cache"] = en_cache
+
+    return jsonify(data), 200 if meta.get("estado") == "listo" else 202
+
+
+@api_exports.get("/api/exports/<job_id>")
+@login_required
+def estado_export(job_id):
+    meta = get_job(current_app.config, job_id)
+    if not meta:
+        return jsonify({"error": "Export no encontrado"}), 404
+    return jsonify(_job_dict(meta))
+
+
+@api_exports.get("/api/exports/<job_id>/download")
+@login_required
+def descargar_export(job_id):
+    meta = get_job(current_app.config, job_id)
+    if not meta:
+        return jsonify({"error": "Export no encontrado"}), 404
+    if meta.get("estado") != "listo":
+        return jsonify({"error": "El export aún no está listo", "estado": meta.get("estado")}), 409
+
+    return send_file(
+        artifact_path(current_app.config, meta),
+        as_attachment=True,
+        download_name=meta["filename"],
+        mimetype=FORMATS[meta["format"]],
+    )
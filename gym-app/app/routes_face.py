@@ -1,13 +1,19 @@
 # app/routes_face.py
-from flask import Blueprint, jsonify, request
+from flask import Blueprint, Response, current_app, jsonify, request
 from datetime import datetime
-from sqlalchemy import func
 from zoneinfo import ZoneInfo
 import numpy as np
+import struct
+import zipfile
 
 from . import db
-from .decorators import login_required
-from .models import Cliente, Asistencia, FaceTemplate
+from .decorators import login_required, roles_required
+from .models import Cliente, FaceTemplate, membresia_snapshot, registrar_entrada
+from .face_index import get_face_index, update_cliente_templates
+from .face_storage import template_columns
+from .face_model import get_face_model, is_ready
+from .face_cache import get_probe_cache
+from .face_utils import build_templates, face_quality, largest_face
 
 api_face = Blueprint("api_face", __name__)
 
@@ -19,38 +25,11 @@ def _now_local():
         return datetime.now()
 
 
-def _get_face_analyzer():
+def get_face_analyzer():
     """
-    Carga perezosa del modelo InsightFace.
+    Modelo InsightFace compartido del proceso (ver face_model.py).
     """
-    from insightface.app import FaceAnalysis
-
-    app = FaceAnalysis(name="buffalo_l")
-    app.prepare(ctx_id=-1, det_size=(640, 640))
-    return app
-
-
-_FACE_ANALYZER = None
-
-
-def get_face_analyzer():
-    global _FACE_ANALYZER
-    if _FACE_ANALYZER is None:
-        _FACE_ANALYZER = _get_face_analyzer()
-    return _FACE_ANALYZER
-
-
-def cosine_similarity(a, b):
-    a = np.asarray(a, dtype=np.float32)
-    b = np.asarray(b, dtype=np.float32)
-
-    na = np.linalg.norm(a)
-    nb = np.linalg.norm(b)
-
-    if na == 0 or nb == 0:
-        return 0.0
-
-    return float(np.dot(a, b) / (na * nb))
+    return get_face_model()
 
 
 def decode_image_from_request(file_storage):
@@ -62,17 +41,44 @@ def decode_image_from_request(file_storage):
     return img
 
 
+@api_face.get("/api/face/ready")
+def face_ready():
+    """
+    Readiness para el balanceador: 200 cuando el modelo ya está cargado en
+    este worker (por FACE_WARMUP o por el primer request), 503 mientras tanto.
+    """
+    ready = is_ready()
+    return jsonify({"ready": ready}), 200 if ready else 503
+
+
+@api_face.get("/api/face/cache/stats")
+@login_required
+def face_cache_stats():
+    """
+    Contadores del cache de probes de este worker (hits, misses, expirados,
+    invalidados, hit_rate) para ajustar FACE_CACHE_TTL.
+    """
+    cache = get_probe_cache()
+    if cache is None:
+        return jsonify({"enabled": False})
+    return jsonify({"enabled": True, **cache.snapshot()})
+
+
 @api_face.post("/api/face/enroll")
 @login_required
 def face_enroll():
     """
-    Recibe una imagen y guarda el embedding facial del cliente.
+    Recibe una o varias imágenes y guarda las plantillas faciales del cliente.
     Espera multipart/form-data con:
       - cliente_id
-      - image
+      - image (repetible: varios frames de la cámara)
+
+    Cada frame se puntúa por detección, tamaño y nitidez; según
+    FACE_TEMPLATE_MODE se guarda el promedio ponderado ("mean") o las
+    FACE_TEMPLATES_PER_CLIENT mejores muestras ("topn").
     """
     cliente_id = request.form.get("cliente_id")
-    image = request.files.get("image")
+    images = request.files.getlist("image") + request.files.getlist("images")
 
     if not cliente_id:
         return jsonify({"error": "cliente_id es obligatorio"}), 400
@@ -81,41 +87,65 @@ def face_enroll():
     if not cliente:
         return jsonify({"error": "Cliente no encontrado"}), 404
 
-    if not image:
+    if not images:
         return jsonify({"error": "No se recibió imagen"}), 400
 
     try:
         analyzer = get_face_analyzer()
-        img = decode_image_from_request(image)
 
-        if img is None:
-            return jsonify({"error": "No se pudo leer la imagen"}), 400
-
-        faces = analyzer.get(img)
-
-        if not faces:
-            return jsonify({"error": "No se detectó ningún rostro"}), 400
-
-        face = max(faces, key=lambda f: (f.bbox[2] - f.bbox[0]) * (f.bbox[3] - f.bbox[1]))
-        embedding = face.embedding.tolist()
+        samples = []
+        descartadas = 0
+        for image in images:
+            img = decode_image_from_request(image)
+            if img is None:
+                descartadas += 1
+                continue
+
+            faces = analyzer.get(img)
+            if not faces:
+                descartadas += 1
+                continue
+
+            face = largest_face(faces)
+            samples.append((face.embedding, face_quality(img, face)))
+
+        if not samples:
+            if len(images) == 1:
+                return jsonify({"error": "No se detectó ningún rostro"}), 400
+            return jsonify({"error": "No se detectó rostro en ninguna imagen"}), 400
+
+        templates = build_templates(
+            samples,
+            mode=current_app.config.get("FACE_TEMPLATE_MODE", "mean"),
+            top_n=current_app.config.get("FACE_TEMPLATES_PER_CLIENT", 3),
+        )
 
         # Desactivar plantillas anteriores
         FaceTemplate.query.filter_by(cliente_id=cliente.cliente_id, is_active=True).update(
             {"is_active": False}
         )
 
-        tpl = FaceTemplate(
-            cliente_id=cliente.cliente_id,
-            model_name="insightface",
-            model_version="buffalo_l",
-            embedding=embedding,
-            quality_score=None,
-            is_active=True,
-        )
+        storage = current_app.config.get("FACE_EMBEDDING_STORAGE", "json")
+        tpls = []
+        for embedding, quality in templates:
+            tpl = FaceTemplate(
+                cliente_id=cliente.cliente_id,
+                model_name="insightface",
+                model_version="buffalo_l",
+                quality_score=round(quality * 100, 2),
+                is_active=True,
+                **template_columns(embedding, storage=storage, model_tag="buffalo_l"),
+            )
+            db.session.add(tpl)
+            tpls.append((tpl, embedding))
 
-        db.session.add(tpl)
         db.session.commit()
 
+        update_cliente_templates(
+            cliente.cliente_id,
+            [(tpl.face_template_id, embedding) for tpl, embedding in tpls],
+        )
+
         return jsonify({
             "ok": True,
             "cliente": {
@@ -124,7 +154,11 @@ def face_enroll():
                 "apellido": cliente.apellido,
                 "rut": cliente.rut,
             },
-            "face_template_id": tpl.face_template_id
+            "face_template_id": tpls[0][0].face_template_id,
+            "face_template_ids": [tpl.face_template_id for tpl, _ in tpls],
+            "quality_score": float(tpls[0][0].quality_score),
+            "frames_usados": len(samples),
+            "frames_descartados": descartadas,
         }), 201
 
     except Exception as e:
@@ -135,6 +169,159 @@ def face_enroll():
         }), 500
 
 
+@api_face.post("/api/face/enroll/batch")
+@login_required
+@roles_required("admin")
+def face_enroll_batch():
+    """
+    Enrolamiento masivo. Espera multipart/form-data con:
+      - archive: ZIP con <rut>.jpg o <rut>/<foto>.jpg
+
+    Corre dentro del request: se acepta hasta FACE_BATCH_MAX_IMAGES
+    imágenes para no pasar el timeout del worker. Lotes mayores van por
+    `flask face-enroll-batch`.
+    """
+    from .face_batch import count_images, enroll_batch
+
+    archive = request.files.get("archive")
+    if not archive:
+        return jsonify({"error": "No se recibió archivo ZIP"}), 400
+
+    try:
+        max_images = current_app.config.get("FACE_BATCH_MAX_IMAGES", 200)
+        n_images = count_images(archive.stream)
+        archive.stream.seek(0)
+        if max_images and n_images > max_images:
+            return jsonify({
+                "error": f"Máximo {max_images} imágenes por lote; use `flask face-enroll-batch` para lotes mayores",
+                "imagenes": n_images,
+            }), 413
+
+        resumen = enroll_batch(
+            archive.stream,
+            workers=current_app.config.get("FACE_BATCH_WORKERS", 0),
+            storage=current_app.config.get("FACE_EMBEDDING_STORAGE", "json"),
+            mode=current_app.config.get("FACE_TEMPLATE_MODE", "mean"),
+            top_n=current_app.config.get("FACE_TEMPLATES_PER_CLIENT", 3),
+        )
+        return jsonify({"ok": True, **resumen}), 201
+
+    except zipfile.BadZipFile:
+        return jsonify({"error": "El archivo no es un ZIP válido"}), 400
+
+    except Exception as e:
+        return jsonify({
+            "error": "Error en enrolamiento masivo",
+            "detail": str(e)
+        }), 500
+
+
+# Umbral inicial razonable para InsightFace
+MATCH_THRESHOLD = 0.45
+
+MSG_NO_FACE = "No se detectó rostro"
+
+
+def _cliente_dict(cliente):
+    return {
+        "cliente_id": cliente.cliente_id,
+        "nombre": cliente.nombre,
+        "apellido": cliente.apellido,
+        "rut": cliente.rut,
+    }
+
+
+def _identify_image(img):
+    """
+    Busca el rostro más grande de img en el índice facial.
+    Devuelve (payload de /api/face/identify, Cliente | None).
+    """
+    faces = get_face_analyzer().get(img)
+    if not faces:
+        return {
+            "match": False,
+            "cliente": None,
+            "score": 0.0,
+            "message": MSG_NO_FACE
+        }, None
+
+    face = largest_face(faces)
+    probe_embedding = face.embedding
+
+    index = get_face_index()
+
+    if not len(index):
+        return {
+            "match": False,
+            "cliente": None,
+            "score": 0.0,
+            "message": "No hay rostros enrolados"
+        }, None
+
+    best_score = -1.0
+    best_cliente_id = None
+
+    cache = get_probe_cache()
+    cached = cache.get(probe_embedding) if cache is not None else None
+
+    if cached is not None:
+        best_cliente_id, best_score = cached
+    else:
+        matches = index.search(probe_embedding, k=1)
+        if matches:
+            best_cliente_id, best_score, _ = matches[0]
+            # Un "no match" no se cachea: el reintento debe volver a buscar
+            if cache is not None and best_score >= MATCH_THRESHOLD:
+                cache.put(probe_embedding, best_cliente_id, best_score)
+
+    best_cliente = None
+    if best_cliente_id is not None and best_score >= MATCH_THRESHOLD:
+        best_cliente = Cliente.query.get(best_cliente_id)
+
+    if best_cliente is None:
+        return {
+            "match": False,
+            "cliente": None,
+            "score": round(float(best_score), 4) if best_score >= 0 else 0.0
+        }, None
+
+    return {
+        "match": True,
+        "cliente": _cliente_dict(best_cliente),
+        "score": round(float(best_score), 4)
+    }, best_cliente
+
+
+def _registrar_entrada_facial(cliente, score):
+    """
+    Registra la 'entrada' del día sin duplicarla y hace commit.
+    Devuelve (payload de /api/asistencias/face/confirm, status HTTP).
+    """
+    asistencia, creada = registrar_entrada(cliente.cliente_id)
+    db.session.commit()
+
+    hora = asistencia.fecha_hora.isoformat() if asistencia.fecha_hora else None
+    payload = {
+        "ok": creada,
+        "already_marked": not creada,
+        "hora": hora,
+        "score": score,
+        "cliente": _cliente_dict(cliente),
+        "asistencia": {
+            "asistencia_id": asistencia.asistencia_id,
+            "tipo": asistencia.tipo,
+            "fecha_hora": hora,
+        },
+        "membresia": membresia_snapshot(cliente),
+    }
+
+    if not creada:
+        payload["message"] = "El cliente ya registró entrada hoy"
+        return payload, 200
+
+    return payload, 201
+
+
 @api_face.post("/api/face/identify")
 @login_required
 def face_identify():
@@ -152,68 +339,13 @@ def face_identify():
         return jsonify({"error": "No se recibió imagen"}), 400
 
     try:
-        analyzer = get_face_analyzer()
         img = decode_image_from_request(image)
 
         if img is None:
             return jsonify({"error": "No se pudo leer la imagen"}), 400
 
-        faces = analyzer.get(img)
-        if not faces:
-            return jsonify({
-                "match": False,
-                "cliente": None,
-                "score": 0.0,
-                "message": "No se detectó rostro"
-            }), 200
-
-        face = max(faces, key=lambda f: (f.bbox[2] - f.bbox[0]) * (f.bbox[3] - f.bbox[1]))
-        probe_embedding = face.embedding
-
-        templates = (
-            db.session.query(FaceTemplate, Cliente)
-            .join(Cliente, Cliente.cliente_id == FaceTemplate.cliente_id)
-            .filter(FaceTemplate.is_active == True)
-            .all()
-        )
-
-        if not templates:
-            return jsonify({
-                "match": False,
-                "cliente": None,
-                "score": 0.0,
-                "message": "No hay rostros enrolados"
-            }), 200
-
-        best_score = -1.0
-        best_cliente = None
-
-        for tpl, cliente in templates:
-            score = cosine_similarity(probe_embedding, tpl.embedding)
-            if score > best_score:
-                best_score = score
-                best_cliente = cliente
-
-        # Umbral inicial razonable para InsightFace
-        threshold = 0.45
-
-        if best_cliente is None or best_score < threshold:
-            return jsonify({
-                "match": False,
-                "cliente": None,
-                "score": round(float(best_score), 4) if best_score >= 0 else 0.0
-            }), 200
-
-        return jsonify({
-            "match": True,
-            "cliente": {
-                "cliente_id": best_cliente.cliente_id,
-                "nombre": best_cliente.nombre,
-                "apellido": best_cliente.apellido,
-                "rut": best_cliente.rut,
-            },
-            "score": round(float(best_score), 4)
-        }), 200
+        result, _ = _identify_image(img)
+        return jsonify(result), 200
 
     except Exception as e:
         return jsonify({
@@ -241,69 +373,214 @@ def face_confirm():
         return jsonify({"error": "Cliente no encontrado"}), 404
 
     try:
-        hoy = _now_local().date()
-
-        existente = (
-            Asistencia.query
-            .filter(
-                Asistencia.cliente_id == cliente.cliente_id,
-                Asistencia.tipo == "entrada",
-                func.date(Asistencia.fecha_hora) == hoy,
-            )
-            .order_by(Asistencia.fecha_hora.asc())
-            .first()
-        )
+        result, status = _registrar_entrada_facial(cliente, score)
+        return jsonify(result), status
 
-        if existente:
-            return jsonify({
-                "ok": False,
-                "already_marked": True,
-                "message": "El cliente ya registró entrada hoy",
-                "hora": existente.fecha_hora.isoformat() if existente.fecha_hora else None,
-                "score": score,
-                "cliente": {
-                    "cliente_id": cliente.cliente_id,
-                    "nombre": cliente.nombre,
-                    "apellido": cliente.apellido,
-                    "rut": cliente.rut,
-                },
-                "asistencia": {
-                    "asistencia_id": existente.asistencia_id,
-                    "tipo": existente.tipo,
-                    "fecha_hora": existente.fecha_hora.isoformat() if existente.fecha_hora else None,
-                }
-            }), 200
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({
+            "error": "Error confirmando asistencia facial",
+            "detail": str(e)
+        }), 500
 
-        asistencia = Asistencia(
-            cliente_id=cliente.cliente_id,
-            fecha_hora=_now_local(),
-            tipo="entrada",
-        )
 
-        db.session.add(asistencia)
-        db.session.commit()
+@api_face.post("/api/asistencias/face/checkin")
+@login_required
+def face_checkin():
+    """
+    Identify + confirm en un solo request (una transacción).
+    Espera multipart/form-data con:
+      - image
+      - auto_confirm (opcional): score mínimo para registrar la entrada sin
+        confirmación; por defecto FACE_AUTO_CONFIRM_THRESHOLD. Sin umbral,
+        toda coincidencia registra la entrada.
 
-        return jsonify({
-            "ok": True,
-            "already_marked": False,
-            "hora": asistencia.fecha_hora.isoformat() if asistencia.fecha_hora else None,
-            "score": score,
-            "cliente": {
-                "cliente_id": cliente.cliente_id,
-                "nombre": cliente.nombre,
-                "apellido": cliente.apellido,
-                "rut": cliente.rut,
-            },
-            "asistencia": {
-                "asistencia_id": asistencia.asistencia_id,
-                "tipo": asistencia.tipo,
-                "fecha_hora": asistencia.fecha_hora.isoformat() if asistencia.fecha_hora else None,
-            }
-        }), 201
+    La respuesta combina los campos de /api/face/identify y, si se registró
+    (o ya estaba registrada) la entrada, los de /api/asistencias/face/confirm.
+    "checked_in" indica si se insertó una asistencia nueva.
+    """
+    image = request.files.get("image")
+    if not image:
+        return jsonify({"error": "No se recibió imagen"}), 400
+
+    auto_confirm = request.form.get("auto_confirm")
+    if auto_confirm in (None, ""):
+        auto_confirm = current_app.config.get("FACE_AUTO_CONFIRM_THRESHOLD")
+    try:
+        auto_confirm = float(auto_confirm) if auto_confirm is not None else None
+    except (TypeError, ValueError):
+        return jsonify({"error": "auto_confirm inválido"}), 400
+
+    try:
+        img = decode_image_from_request(image)
+
+        if img is None:
+            return jsonify({"error": "No se pudo leer la imagen"}), 400
+
+        result, cliente = _identify_image(img)
+
+        if cliente is None:
+            return jsonify({**result, "checked_in": False}), 200
+
+        if auto_confirm is not None and result["score"] < auto_confirm:
+            return jsonify({
+                **result,
+                "checked_in": False,
+                "requires_confirmation": True,
+            }), 200
+
+        entrada, status = _registrar_entrada_facial(cliente, result["score"])
+        return jsonify({**result, **entrada, "checked_in": entrada["ok"]}), status
 
     except Exception as e:
         db.session.rollback()
         return jsonify({
-            "error": "Error confirmando asistencia facial",
+            "error": "Error en check-in facial",
             "detail": str(e)
-        }), 500
\ No newline at end of file
+        }), 500
+
+
+# -------------------- CHECK-IN CONTINUO --------------------
+
+def _parse_threshold(raw):
+    if raw in (None, ""):
+        return None
+    return float(raw)
+
+
+@api_face.post("/api/face/stream")
+@login_required
+def face_stream_open():
+    """
+    Abre un stream de check-in continuo.
+    JSON opcional: {"checkin": true, "auto_confirm": 0.6}
+      - checkin: registrar la entrada al reconocer (si no, sólo eventos match)
+      - auto_confirm: como en /api/asistencias/face/checkin; por defecto
+        FACE_AUTO_CONFIRM_THRESHOLD
+    """
+    from .face_stream import open_stream
+
+    payload = request.get_json(silent=True) or {}
+    try:
+        auto_confirm = _parse_threshold(payload.get("auto_confirm"))
+    except (TypeError, ValueError):
+        return jsonify({"error": "auto_confirm inválido"}), 400
+    if auto_confirm is None:
+        auto_confirm = current_app.config.get("FACE_AUTO_CONFIRM_THRESHOLD")
+
+    stream = open_stream(checkin=bool(payload.get("checkin")), auto_confirm=auto_confirm)
+    return jsonify({
+        "stream_id": stream.id,
+        "frame_url": f"/api/face/stream/{stream.id}/frame",
+        "feed_url": f"/api/face/stream/{stream.id}/feed",
+        "events_url": f"/api/face/stream/{stream.id}/events",
+    }), 201
+
+
+@api_face.post("/api/face/stream/<stream_id>/frame")
+@login_required
+def face_stream_frame(stream_id):
+    """
+    Un frame JPEG, como multipart (image) o como cuerpo crudo.
+    Responde de inmediato (202); el resultado llega por /events.
+    """
+    from .face_stream import get_stream
+
+    stream = get_stream(stream_id)
+    if stream is None:
+        return jsonify({"error": "Stream no encontrado"}), 404
+
+    image = request.files.get("image")
+    raw = image.read() if image else request.get_data()
+    if not raw:
+        return jsonify({"error": "No se recibió imagen"}), 400
+
+    stream.submit(raw, current_app._get_current_object(), workers=current_app.config.get("FACE_STREAM_WORKERS", 2))
+    return jsonify({"accepted": True, **stream.stats_snapshot()}), 202
+
+
+def _read_exact(fh, n):
+    buf = b""
+    while len(buf) < n:
+        chunk = fh.read(n - len(buf))
+        if not chunk:
+            return None
+        buf += chunk
+    return buf
+
+
+@api_face.post("/api/face/stream/<stream_id>/feed")
+@login_required
+def face_stream_feed(stream_id):
+    """
+    POST de larga duración (Transfer-Encoding: chunked) para kioskos nativos:
+    el cuerpo es una secuencia de frames, cada uno precedido por su largo en
+    4 bytes big-endian. Termina cuando el cliente cierra el cuerpo.
+    """
+    from .face_stream import get_stream
+
+    stream = get_stream(stream_id)
+    if stream is None:
+        return jsonify({"error": "Stream no encontrado"}), 404
+
+    app = current_app._get_current_object()
+    workers = current_app.config.get("FACE_STREAM_WORKERS", 2)
+    body = request.stream
+
+    while not stream.closed:
+        header = _read_exact(body, 4)
+        if header is None:
+            break
+        (size,) = struct.unpack(">I", header)
+        raw = _read_exact(body, size)
+        if raw is None:
+            break
+        stream.submit(raw, app, workers=workers)
+
+    return jsonify({"ok": True, **stream.stats_snapshot()}), 200
+
+
+@api_face.get("/api/face/stream/<stream_id>/events")
+@login_required
+def face_stream_events(stream_id):
+    """
+    Server-Sent Events con las coincidencias del stream. Soporta reconexión
+    con Last-Event-ID (se conservan los últimos 100 eventos).
+    """
+    from .face_stream import get_stream, sse_format
+
+    stream = get_stream(stream_id)
+    if stream is None:
+        return jsonify({"error": "Stream no encontrado"}), 404
+
+    try:
+        last_id = int(request.headers.get("Last-Event-ID") or request.args.get("last_event_id") or 0)
+    except ValueError:
+        last_id = 0
+
+    def generate(last_id):
+        yield "retry: 2000\n\n"
+        while not stream.closed:
+            events = stream.events_since(last_id)
+            if not events:
+                yield ": ping\n\n"
+                continue
+            for seq, event in events:
+                last_id = seq
+                yield sse_format(seq, event)
+
+    return Response(
+        generate(last_id),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@api_face.delete("/api/face/stream/<stream_id>")
+@login_required
+def face_stream_close(stream_id):
+    from .face_stream import close_stream
+
+    if not close_stream(stream_id):
+        return jsonify({"error": "Stream no encontrado"}), 404
+    return jsonify({"ok": True})
@@ -0,0 +1,75 @@
+from flask import Blueprint, Response, current_app, request
+
+from .decorators import login_required
+from .live_events import backlog, get_feed, resumen_event, sse_format
+
+api_live = Blueprint("api_live", __name__)
+
+
+@api_live.get("/api/live/stream")
+@login_required
+def live_stream():
+    """
+    Server-Sent Events con las asistencias y pagos nuevos y los contadores
+    del día (ver app/live_events.py). Soporta reconexión con Last-Event-ID;
+    ?tipos=asistencia,pago,resumen filtra los tipos enviados.
+    """
+    app = current_app._get_current_object()
+    feed = get_feed(app)
+
+    tipos = {t.strip() for t in (request.args.get("tipos") or "").split(",") if t.strip()}
+
+    try:
+        last_id = int(request.headers.get("Last-Event-ID") or request.args.get("last_event_id") or 0)
+    except ValueError:
+        last_id = 0
+
+    # Todo lo que toca la BD se lee antes de empezar a transmitir. La
+    # posición en el buffer se toma antes del backlog para no perder nada
+    # entre ambos; lo repetido se descarta por evento_id.
+    pos = feed.pos()
+    if last_id:
+        pendientes = backlog(last_id, int(app.config.get("LIVE_BUFFER", 1000)))
+    else:
+        pendientes = []
+    watermark = feed.watermark()
+    resumen = resumen_event()
+
+    def generate(pos):
+        feed.subscribe()
+        enviados = set()
+        try:
+            yield "retry: 2000\n\n"
+            if pendientes is None:
+                pos = feed.pos()
+                yield sse_format(feed.watermark(), {"type": "reset"})
+            else:
+                for evento_id, event in pendientes:
+                    enviados.add(evento_id)
+                    if not tipos or event["type"] in tipos:
+                        yield sse_format(min(evento_id, watermark), event)
+            if not tipos or "resumen" in tipos:
+                yield sse_format(None, resumen)
+
+            while True:
+                events = feed.events_since(pos)
+                if events is None:
+                    pos = feed.pos()
+                    yield sse_format(feed.watermark(), {"type": "reset"})
+                    continue
+                if not events:
+                    yield ": ping\n\n"
+                    continue
+                for pos, event, sse_id, evento_id in events:
+                    if evento_id in enviados:
+                        continue
+                    if not tipos or event["type"] in tipos:
+                        yield sse_format(sse_id, event)
+        finally:
+            feed.unsubscribe()
+
+    return Response(
+        generate(pos),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -1,6 +1,5 @@
 from flask import Blueprint, jsonify, request
-from datetime import date, datetime, timedelta
-from sqlalchemy import func
+from datetime import timedelta
 
 from app import db
 from app.decorators import login_required
@@ -11,14 +10,14 @@ api_pagos = Blueprint("api_pagos", __name__)
 @api_pagos.get("/api/pagos/hoy")
 @login_required
 def pagos_hoy():
-    hoy = date.today()
+    from app.models import Pago, Cliente, hoy_chile, rango_dias_chile
 
-    from app.models import Pago, Cliente
+    inicio, fin = rango_dias_chile(hoy_chile())
 
     pagos = (
         db.session.query(Pago, Cliente)
         .join(Cliente, Cliente.cliente_id == Pago.cliente_id)
-        .filter(func.date(Pago.fecha_pago) == hoy)
+        .filter(Pago.fecha_pago >= inicio, Pago.fecha_pago < fin)
         .order_by(Pago.fecha_pago.desc())
         .all()
     )
@@ -59,7 +58,10 @@ def pagos_hoy():
 @api_pagos.post("/api/pagos/renovar")
 @login_required
 def pagar_y_renovar():
-    from app.models import Pago, Cliente, Membresia, ClienteMembresia
+    from app.models import Pago, Cliente, Membresia, ClienteMembresia, ahora_chile, hoy_chile
+    from app import qr_cache
+    from app.live_events import publicar_pago
+    from app.rollups import registrar_pago
 
     payload = request.get_json(silent=True) or {}
 
@@ -94,7 +96,7 @@ def pagar_y_renovar():
         return jsonify({"error": "monto inválido"}), 400
 
     try:
-        hoy = date.today()
+        hoy = hoy_chile()
 
         # Desactivar membresías activas previas del cliente
         activas = (
@@ -125,12 +127,17 @@ def pagar_y_renovar():
             cliente_id=cliente_id,
             monto=monto_val,
             metodo_pago=metodo_pago,
-            fecha_pago=datetime.now(),
+            fecha_pago=ahora_chile(),
         )
 
         db.session.add(nueva_cm)
         db.session.add(pago)
+        db.session.flush()
+        cliente.set_membresia_actual(nueva_cm, membresia, hoy)
+        registrar_pago(pago.fecha_pago, metodo_pago, monto_val)
+        publicar_pago(pago, cliente)
         db.session.commit()
+        qr_cache.cliente_changed(cliente)
 
         return jsonify({
             "ok": True,
@@ -0,0 +1,120 @@
+"""
+Benchmark de memoria de los exports Excel de asistencias y pagos.
+
+Uso (desde gym-app/):
+    python bench_export.py --rows 200000
+    DATABASE_URL=postgresql://... python bench_export.py --use-env-db
+
+Crea clientes, asistencias y pagos sintéticos en una BD SQLite temporal
+(o usa los datos de DATABASE_URL con --use-env-db) y compara el pico de memoria
+(tracemalloc) y el tiempo del export en memoria anterior (ORM + Workbook +
+BytesIO) contra el export streaming de app/exports.py.
+"""
+import argparse
+import io
+import os
+import random
+import tempfile
+import time
+import tracemalloc
+from datetime import date, datetime, timedelta
+
+
+def _seed(db, n_rows, n_clientes=2000):
+    from sqlalchemy import insert
+
+    from app.models import Asistencia, Cliente, Pago
+
+    db.session.execute(insert(Cliente), [
+        {"cliente_id": i, "nombre": f"Nombre{i}", "apellido": f"Apellido{i}", "rut": f"{i:08d}-K"}
+        for i in range(1, n_clientes + 1)
+    ])
+
+    start = datetime(date.today().year, 1, 1, 6, 0)
+    rnd = random.Random(0)
+    for table, key in ((Asistencia, "fecha_hora"), (Pago, "fecha_pago")):
+        batch = []
+        for i in range(n_rows):
+            row = {"cliente_id": rnd.randint(1, n_clientes), key: start + timedelta(minutes=i * 2)}
+            if table is Asistencia:
+                row["tipo"] = "salida"
+            else:
+                row.update({"monto": 25000, "metodo_pago": "efectivo"})
+            batch.append(row)
+            if len(batch) == 10000:
+                db.session.execute(insert(table), batch)
+                batch = []
+        if batch:
+            db.session.execute(insert(table), batch)
+    db.session.commit()
+
+
+def _legacy_asistencias(db, f1, f2):
+    from openpyxl import Workbook
+
+    from app.models import Asistencia, Cliente, rango_dias_chile
+
+    inicio, fin = rango_dias_chile(f1, f2)
+    rows = (
+        db.session.query(Asistencia, Cliente)
+        .join(Cliente, Cliente.cliente_id == Asistencia.cliente_id)
+        .filter(Asistencia.fecha_hora >= inicio, Asistencia.fecha_hora < fin)
+        .order_by(Asistencia.fecha_hora.desc())
+        .all()
+    )
+    wb = Workbook()
+    ws = wb.active
+    for a, c in rows:
+        ws.append([a.asistencia_id, a.fecha_hora.strftime("%Y-%m-%d"), a.fecha_hora.strftime("%H:%M"),
+                   c.cliente_id, f"{c.nombre} {c.apellido}", c.rut, a.tipo])
+    out = io.BytesIO()
+    wb.save(out)
+    return out
+
+
+def _measure(label, fn):
+    from app import db
+
+    db.session.expunge_all()
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    out = fn()
+    elapsed = time.perf_counter() - t0
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    size = out.seek(0, os.SEEK_END)
+    out.close()
+    db.session.expunge_all()
+    print(f"{label:28} pico {peak / 1024 / 1024:8.1f} MB   {elapsed:6.2f} s   archivo {size / 1024 / 1024:6.1f} MB")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=100000, help="Filas de asistencias y de pagos")
+    parser.add_argument("--use-env-db", action="store_true", help="Usar DATABASE_URL en vez de SQLite temporal")
+    args = parser.parse_args()
+
+    if not args.use_env_db:
+        tmpdir = tempfile.mkdtemp()
+        os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tmpdir, 'bench.db')}"
+    os.environ.setdefault("FACE_WARMUP", "0")
+
+    from app import create_app, db
+    from app.exports import asistencias_xlsx, pagos_xlsx
+
+    app = create_app()
+    with app.app_context():
+        if not args.use_env_db:
+            t0 = time.perf_counter()
+            _seed(db, args.rows)
+            print(f"Datos sintéticos: {args.rows} asistencias + {args.rows} pagos ({time.perf_counter() - t0:.1f} s)\n")
+
+        f1, f2 = date(date.today().year, 1, 1), date(date.today().year, 12, 31)
+
+        _measure("asistencias (en memoria)", lambda: _legacy_asistencias(db, f1, f2))
+        _measure("asistencias (streaming)", lambda: asistencias_xlsx(f1, f2))
+        _measure("pagos (streaming)", lambda: pagos_xlsx(f1, f2))
+
+
+if __name__ == "__main__":
+    main()
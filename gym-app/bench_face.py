@@ -0,0 +1,96 @@
+"""
+Benchmark de las etapas de /api/face/identify y /api/face/enroll.
+
+Uso (desde gym-app/):
+    python bench_face.py --image foto.jpg --runs 30
+    FACE_DET_SIZE=320 FACE_INTRA_OP_THREADS=2 python bench_face.py --image foto.jpg
+
+Reporta ms promedio / p50 / p95 por etapa con la configuración actual del
+.env, para comparar antes y después de cambiar el tuning del modelo.
+"""
+import argparse
+import time
+
+import numpy as np
+
+from app import create_app
+
+
+def _stats(samples):
+    arr = np.asarray(samples) * 1000
+    return f"{arr.mean():8.2f} {np.percentile(arr, 50):8.2f} {np.percentile(arr, 95):8.2f}"
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--image", required=True, help="JPEG/PNG con un rostro")
+    parser.add_argument("--runs", type=int, default=20)
+    args = parser.parse_args()
+
+    import cv2
+    from insightface.app.common import Face
+
+    app = create_app()
+
+    with app.app_context():
+        from app.face_index import get_face_index
+        from app.face_model import _OPTIONS, get_face_model, warm_up
+        from app.face_storage import template_columns
+
+        raw = open(args.image, "rb").read()
+
+        t0 = time.perf_counter()
+        warm_up()
+        print(f"Carga + warm-up del modelo: {(time.perf_counter() - t0) * 1000:.0f} ms")
+        print(f"Opciones: {_OPTIONS}")
+
+        model = get_face_model()
+        det = model.det_model
+        rec = model.models["recognition"]
+        index = get_face_index()
+        storage = app.config.get("FACE_EMBEDDING_STORAGE", "json")
+
+        stages = {k: [] for k in ("decode", "detect", "embed", "search", "serialize", "total")}
+
+        for _ in range(args.runs):
+            t_start = time.perf_counter()
+
+            t = time.perf_counter()
+            img = cv2.imdecode(np.frombuffer(raw, np.uint8), cv2.IMREAD_COLOR)
+            stages["decode"].append(time.perf_counter() - t)
+
+            t = time.perf_counter()
+            bboxes, kpss = det.detect(img, max_num=0, metric="default")
+            stages["detect"].append(time.perf_counter() - t)
+            if bboxes.shape[0] == 0:
+                raise SystemExit("No se detectó rostro en la imagen de prueba")
+
+            i = int(np.argmax((bboxes[:, 2] - bboxes[:, 0]) * (bboxes[:, 3] - bboxes[:, 1])))
+            face = Face(bbox=bboxes[i, 0:4], kps=kpss[i] if kpss is not None else None, det_score=bboxes[i, 4])
+
+            t = time.perf_counter()
+            rec.get(img, face)
+            stages["embed"].append(time.perf_counter() - t)
+
+            # identify
+            t = time.perf_counter()
+            index.search(face.embedding, k=1)
+            stages["search"].append(time.perf_counter() - t)
+
+            # enroll
+            t = time.perf_counter()
+            template_columns(face.embedding, storage=storage)
+            stages["serialize"].append(time.perf_counter() - t)
+
+            stages["total"].append(time.perf_counter() - t_start)
+
+        print(f"\n{args.runs} corridas, índice con {len(index)} plantillas ({index.backend})")
+        print(f"{'etapa':12} {'prom':>8} {'p50':>8} {'p95':>8}   (ms)")
+        for name, samples in stages.items():
+            print(f"{name:12} {_stats(samples)}")
+        print("\nidentify = decode + detect + embed + search")
+        print("enroll   = decode + detect + embed + serialize (+ escritura en BD)")
+
+
+if __name__ == "__main__":
+    main()
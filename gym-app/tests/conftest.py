@@ -0,0 +1,17 @@
+import pytest
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    monkeypatch.setenv("DATABASE_URL", f"sqlite:///{tmp_path / 'test.db'}")
+    monkeypatch.setenv("FACE_WARMUP", "0")
+    monkeypatch.setenv("EXPORT_DIR", str(tmp_path / "exports"))
+
+    from app import create_app, db
+
+    app = create_app()
+    app.config["TESTING"] = True
+    yield app
+    with app.app_context():
+        db.session.remove()
+        db.engine.dispose()
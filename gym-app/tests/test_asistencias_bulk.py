@@ -0,0 +1,148 @@
+import pytest
+from sqlalchemy import event
+
+from app import db
+from app.models import Asistencia, Cliente
+
+
+def _client(app):
+    client = app.test_client()
+    with client.session_transaction() as s:
+        s["user_id"] = 1
+        s["user_role"] = "admin"
+    return client
+
+
+@pytest.fixture
+def cliente_id(app):
+    with app.app_context():
+        c = Cliente(nombre="Ana", apellido="Soto", rut="12.345.678-5")
+        db.session.add(c)
+        db.session.commit()
+        return c.cliente_id
+
+
+def _bulk(app, eventos):
+    return _client(app).post("/api/asistencias/bulk", json={"eventos": eventos})
+
+
+def test_tipo_no_string_es_error_del_evento_y_no_del_lote(app, cliente_id):
+    resp = _bulk(app, [
+        {"idempotency_key": "malo", "cliente_id": cliente_id, "tipo": 5},
+        {"idempotency_key": "bueno", "cliente_id": cliente_id},
+    ])
+    assert resp.status_code == 200
+    malo, bueno = resp.get_json()["resultados"]
+    assert malo["estado"] == "error" and "tipo" in malo["error"]
+    assert bueno["estado"] == "creada"
+
+
+def test_solo_el_limite_de_tamano_responde_413(app, cliente_id):
+    app.config["ASISTENCIAS_BULK_MAX"] = 2
+    eventos = [{"idempotency_key": f"k{i}", "cliente_id": cliente_id} for i in range(3)]
+    resp = _bulk(app, eventos)
+    assert resp.status_code == 413
+    assert "Máximo 2" in resp.get_json()["error"]
+
+
+def test_misma_clave_en_otro_lote_es_duplicado(app, cliente_id):
+    evento = {"idempotency_key": "k1", "cliente_id": cliente_id, "fecha_hora": "2025-03-10T08:00:00"}
+    primero = _bulk(app, [evento]).get_json()["resultados"][0]
+    assert primero["estado"] == "creada"
+
+    reintento, repetido = _bulk(app, [evento, evento]).get_json()["resultados"]
+    assert reintento["estado"] == "duplicado"
+    assert reintento["asistencia_id"] == primero["asistencia_id"]
+    assert repetido["estado"] == "duplicado"
+
+
+def test_misma_clave_repetida_en_el_lote_es_duplicado(app, cliente_id):
+    evento = {"idempotency_key": "k1", "cliente_id": cliente_id, "fecha_hora": "2025-03-10T08:00:00"}
+    primero, repetido = _bulk(app, [evento, evento]).get_json()["resultados"]
+    assert primero["estado"] == "creada"
+    assert repetido["estado"] == "duplicado"
+    assert repetido["asistencia_id"] == primero["asistencia_id"]
+
+
+def test_segunda_entrada_del_dia_es_ya_marcado(app, cliente_id):
+    temprano, tarde, otro_dia = _bulk(app, [
+        {"idempotency_key": "tarde", "cliente_id": cliente_id, "fecha_hora": "2025-03-10T18:00:00"},
+        {"idempotency_key": "temprano", "cliente_id": cliente_id, "fecha_hora": "2025-03-10T08:00:00"},
+        {"idempotency_key": "otro-dia", "cliente_id": cliente_id, "fecha_hora": "2025-03-11T08:00:00"},
+    ]).get_json()["resultados"]
+    # La más temprana del día es la que queda registrada
+    assert tarde["estado"] == "creada"
+    assert temprano["estado"] == "ya_marcado"
+    assert temprano["asistencia_id"] == tarde["asistencia_id"]
+    assert otro_dia["estado"] == "creada"
+
+    # Contra una entrada de un lote anterior
+    (siguiente,) = _bulk(app, [
+        {"idempotency_key": "mas-tarde", "cliente_id": cliente_id, "fecha_hora": "2025-03-10T20:00:00"},
+    ]).get_json()["resultados"]
+    assert siguiente["estado"] == "ya_marcado"
+    assert siguiente["asistencia_id"] == tarde["asistencia_id"]
+
+    with app.app_context():
+        assert Asistencia.query.filter_by(cliente_id=cliente_id).count() == 2
+
+
+def test_errores_por_evento(app, cliente_id):
+    resultados = _bulk(app, [
+        {"idempotency_key": "sin-cliente"},
+        {"idempotency_key": "no-existe", "cliente_id": 999},
+        {"idempotency_key": "qr-malo", "token": "no-es-un-token"},
+        {"idempotency_key": "fecha", "cliente_id": cliente_id, "fecha_hora": "ayer"},
+        {"idempotency_key": "futuro", "cliente_id": cliente_id, "fecha_hora": "2999-01-01T00:00:00"},
+        {"cliente_id": cliente_id},
+        "no-es-un-objeto",
+        {"idempotency_key": "ok", "cliente_id": cliente_id, "tipo": "salida"},
+    ]).get_json()["resultados"]
+
+    assert [r["estado"] for r in resultados] == ["error"] * 7 + ["creada"]
+    errores = [r["error"] for r in resultados[:7]]
+    assert errores == [
+        "token o cliente_id es obligatorio",
+        "Cliente no encontrado",
+        "QR no válido",
+        "fecha_hora inválida (ISO 8601)",
+        "fecha_hora en el futuro",
+        "idempotency_key es obligatoria (máx. 64 caracteres)",
+        "evento inválido",
+    ]
+
+
+@pytest.mark.parametrize("tipo", ["otro", ["entrada"], {"tipo": "entrada"}, True])
+def test_tipo_mal_formado_es_error(app, cliente_id, tipo):
+    (resultado,) = _bulk(app, [{"idempotency_key": "k", "cliente_id": cliente_id, "tipo": tipo}]).get_json()["resultados"]
+    assert resultado["estado"] == "error"
+    assert resultado["error"] == "tipo debe ser entrada o salida"
+
+
+def test_lote_sin_returning(app, cliente_id, monkeypatch):
+    # Motor sin ON CONFLICT ... RETURNING (MySQL), simulado sobre SQLite
+    inserts = []
+
+    def capturar(conn, cursor, statement, *args):
+        if statement.lstrip().upper().startswith("INSERT INTO ASISTENCIAS "):
+            inserts.append(statement)
+
+    with app.app_context():
+        monkeypatch.setattr(db.engine.dialect, "name", "mysql")
+        event.listen(db.engine, "before_cursor_execute", capturar)
+        try:
+            resultados = _bulk(app, [
+                {"idempotency_key": "a", "cliente_id": cliente_id, "fecha_hora": "2025-03-10T08:00:00"},
+                {"idempotency_key": "b", "cliente_id": cliente_id, "fecha_hora": "2025-03-10T19:00:00", "tipo": "salida"},
+            ]).get_json()["resultados"]
+            (repetida,) = _bulk(app, [
+                {"idempotency_key": "c", "cliente_id": cliente_id, "fecha_hora": "2025-03-10T09:00:00"},
+            ]).get_json()["resultados"]
+        finally:
+            event.remove(db.engine, "before_cursor_execute", capturar)
+
+    assert [r["estado"] for r in resultados] == ["creada", "creada"]
+    assert all(r["asistencia_id"] for r in resultados)
+    assert repetida["estado"] == "ya_marcado"
+    assert repetida["asistencia_id"] == resultados[0]["asistencia_id"]
+    assert inserts and not any("RETURNING" in s.upper() for s in inserts)
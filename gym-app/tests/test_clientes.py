@@ -0,0 +1,69 @@
+import json
+from datetime import timedelta
+
+from app import db
+from app.models import Cliente, hoy_chile
+
+
+def _client(app):
+    client = app.test_client()
+    with client.session_transaction() as s:
+        s["user_id"] = 1
+        s["user_role"] = "admin"
+    return client
+
+
+def _seed(app, n=5):
+    hoy = hoy_chile()
+    with app.app_context():
+        for i in range(n):
+            db.session.add(Cliente(
+                nombre=f"Nombre{i}", apellido="Soto", rut=f"1000000{i}-{i}",
+                membresia_vigente=i % 2 == 0, membresia_nombre="Mensual",
+                membresia_fecha_fin=hoy + timedelta(days=10),
+            ))
+        db.session.commit()
+        return [json.loads(json.dumps(c.to_dict(), default=str)) for c in Cliente.query.order_by(Cliente.nombre).all()]
+
+
+def test_listado_por_defecto_es_lista_como_to_dict(app):
+    esperado = _seed(app)
+    resp = _client(app).get("/api/clientes")
+    assert resp.status_code == 200
+    assert resp.get_json() == esperado
+    assert resp.get_json()[0]["membresia"]["vigente"] is True
+
+
+def test_paginacion_por_cursor_es_opcional(app):
+    esperado = _seed(app)
+    client = _client(app)
+
+    vistos, cursor = [], None
+    while True:
+        url = "/api/clientes?limit=2&fields=cliente_id,membresia"
+        if cursor:
+            url += f"&cursor={cursor}"
+        page = client.get(url).get_json()
+        assert set(page) == {"items", "next_cursor", "has_more"}
+        vistos += page["items"]
+        cursor = page["next_cursor"]
+        if not page["has_more"]:
+            break
+
+    assert vistos == [{"cliente_id": c["cliente_id"], "membresia": c["membresia"]} for c in esperado]
+    assert client.get("/api/clientes?fields=nada").status_code == 400
+
+
+def test_busqueda_q_ignora_tildes_como_cliente_search(app):
+    with app.app_context():
+        db.session.add_all([
+            Cliente(nombre="José", apellido="Pérez", rut="11111111-1"),
+            Cliente(nombre="Ana", apellido="Soto", rut="22222222-2"),
+        ])
+        db.session.commit()
+    client = _client(app)
+
+    for q in ("perez", "Pérez", "PEREZ", "jose per"):
+        page = client.get(f"/api/clientes?q={q}&limit=5").get_json()
+        assert [c["apellido"] for c in page["items"]] == ["Pérez"], q
+    assert [c["nombre"] for c in client.get("/api/clientes?q=jos").get_json()] == ["José"]
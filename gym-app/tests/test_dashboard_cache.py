@@ -0,0 +1,68 @@
+import pytest
+
+from app import dashboard_cache, db
+from app.models import Cliente, registrar_entrada
+
+
+def _client(app):
+    client = app.test_client()
+    with client.session_transaction() as s:
+        s["user_id"] = 1
+        s["user_role"] = "admin"
+    return client
+
+
+@pytest.fixture(params=["memory", "file"])
+def client(app, request, tmp_path):
+    original = dict(app.config)
+    app.config["DASHBOARD_CACHE_TTL"] = 300
+    app.config["DASHBOARD_CACHE_BACKEND"] = request.param
+    app.config["DASHBOARD_CACHE_DIR"] = str(tmp_path / "dashboard-cache")
+    dashboard_cache.configure(app.config)
+    with app.app_context():
+        c = Cliente(nombre="Ana", apellido="Soto", rut="12.345.678-5")
+        db.session.add(c)
+        db.session.commit()
+    yield _client(app)
+    # El backend es global al proceso: se vuelve a la configuración de la app
+    dashboard_cache.configure(original)
+
+
+def _resumen(client):
+    resp = client.get("/api/dashboard/resumen")
+    assert resp.status_code == 200
+    return resp.headers["X-Cache"], resp.get_json()
+
+
+def test_commit_invalida_el_resumen_cacheado(app, client):
+    estado, antes = _resumen(client)
+    assert estado == "MISS"
+    assert _resumen(client) == ("HIT", antes)
+
+    with app.app_context():
+        registrar_entrada(Cliente.query.one().cliente_id)
+        db.session.commit()
+
+    estado, despues = _resumen(client)
+    assert estado == "MISS"
+    assert despues["entradas_hoy"] == antes["entradas_hoy"] + 1
+    assert _resumen(client) == ("HIT", despues)
+
+
+def test_rollback_no_invalida(app, client):
+    _, antes = _resumen(client)
+
+    with app.app_context():
+        registrar_entrada(Cliente.query.one().cliente_id)
+        db.session.rollback()
+
+    assert _resumen(client) == ("HIT", antes)
+
+
+def test_commit_sin_cambios_vigilados_no_invalida(app, client):
+    _, antes = _resumen(client)
+
+    with app.app_context():
+        db.session.commit()
+
+    assert _resumen(client) == ("HIT", antes)
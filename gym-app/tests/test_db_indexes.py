@@ -0,0 +1,45 @@
+import os
+
+import pytest
+from sqlalchemy import create_engine
+
+from app import db
+from app.commands import explain_plans, plan_uses_index
+
+# Consulta caliente -> índice que debe usar
+EXPECTED_INDEXES = {
+    "asistencias_hoy": "ix_asistencias_fecha_hora",
+    "entrada_cliente_hoy": "ix_asistencias_cliente_tipo_fecha",
+    "asistencias_rango": "ix_asistencias_fecha_hora",
+    "pagos_hoy": "ix_pagos_fecha_pago",
+    "membresia_activa_cliente": "ix_cliente_membresias_cliente_estado_fin",
+    "vencimientos_7d": "ix_cliente_membresias_estado_fin",
+    "membresias_a_vencer": "ix_cliente_membresias_estado_fin",
+    "clientes_rut_prefijo": "ix_clientes_rut_normalizado",
+    "membresias_vigentes": "ix_clientes_membresia_vigente_fin",
+}
+
+
+def _check(plans):
+    assert set(plans) == set(EXPECTED_INDEXES)
+    for name, plan in plans.items():
+        assert plan_uses_index(plan), f"{name} no usa índice:\n{plan}"
+        assert EXPECTED_INDEXES[name] in plan, f"{name} no usa {EXPECTED_INDEXES[name]}:\n{plan}"
+
+
+def test_consultas_calientes_usan_indice_sqlite(app):
+    with app.app_context():
+        with db.engine.connect() as conn:
+            _check(explain_plans(conn))
+
+
+@pytest.mark.skipif(not os.getenv("TEST_POSTGRES_URL"), reason="TEST_POSTGRES_URL no definido")
+def test_consultas_calientes_usan_indice_postgres(app):
+    engine = create_engine(os.environ["TEST_POSTGRES_URL"])
+    with app.app_context():
+        db.metadata.create_all(engine)
+    try:
+        with engine.connect() as conn:
+            _check(explain_plans(conn))
+    finally:
+        engine.dispose()
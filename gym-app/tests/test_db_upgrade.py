@@ -0,0 +1,110 @@
+from sqlalchemy import text
+
+from app import db
+from app.commands import UPGRADES, pending_upgrades
+from app.models import Cliente, registrar_entrada
+
+
+def _downgrade(conn):
+    """Deja la BD como antes de las columnas nuevas (SQLite >= 3.35)."""
+    indices = conn.execute(text("SELECT name, sql FROM sqlite_master WHERE type = 'index' AND sql IS NOT NULL")).all()
+    for name, sql in indices:
+        if any(col in sql for col in ("dia", "_normalizado", "membresia_", "embedding_blob")):
+            conn.execute(text(f"DROP INDEX {name}"))
+    columnas = [(t, c) for t, c, _ in UPGRADES if not t.startswith("rollup_")] + [
+        ("clientes", c)
+        for c in (
+            "nombre_normalizado", "membresia_actual_id", "membresia_id", "membresia_nombre",
+            "membresia_fecha_fin", "membresia_vigente",
+        )
+    ]
+    for table, column in columnas:
+        conn.execute(text(f"ALTER TABLE {table} DROP COLUMN {column}"))
+    # Rollups sin shard (era parte de la PK: no se puede quitar con DROP COLUMN)
+    conn.execute(text("DROP TABLE rollup_asistencias_dia"))
+    conn.execute(text("DROP TABLE rollup_asistencias_hora"))
+    conn.execute(text(
+        "CREATE TABLE rollup_asistencias_dia (dia DATE PRIMARY KEY, entradas INTEGER NOT NULL, salidas INTEGER NOT NULL)"
+    ))
+    conn.execute(text(
+        "CREATE TABLE rollup_asistencias_hora "
+        "(dia DATE, hora INTEGER, entradas INTEGER NOT NULL, PRIMARY KEY (dia, hora))"
+    ))
+
+
+def test_db_upgrade_agrega_columnas_y_es_idempotente(app):
+    with app.app_context():
+        c = Cliente(nombre="Ana", apellido="Soto", rut="12.345.678-5")
+        db.session.add(c)
+        db.session.flush()
+        registrar_entrada(c.cliente_id)
+        db.session.commit()
+        db.session.remove()
+
+        with db.engine.begin() as conn:
+            _downgrade(conn)
+        assert pending_upgrades(db.engine) == [command for _, _, command in UPGRADES]
+
+    runner = app.test_cli_runner()
+    result = runner.invoke(args=["db-upgrade"])
+    assert result.exit_code == 0, result.output
+    # rollups-shard recrea y recalcula los rollups: no quedan vacíos
+    assert "==> flask rollups-shard" in result.output
+    assert "rollups-rebuild" not in result.output
+
+    with app.app_context():
+        assert pending_upgrades(db.engine) == []
+        assert db.session.execute(
+            text("SELECT 1 FROM sqlite_master WHERE name = 'ix_clientes_membresia_vigente_fin'")
+        ).scalar() == 1
+        assert db.session.execute(text("SELECT rut_normalizado FROM clientes")).scalar() == "123456785"
+        assert db.session.execute(text("SELECT COUNT(*) FROM rollup_asistencias_dia")).scalar() == 1
+        assert db.session.execute(text("SELECT SUM(entradas) FROM rollup_asistencias_hora")).scalar() == 1
+
+    result = runner.invoke(args=["db-upgrade"])
+    assert result.exit_code == 0, result.output
+    assert "[OK] Columnas al día" in result.output
+    assert "rollups-rebuild" not in result.output
+
+    # Rollups vacíos con historial: se recalculan
+    with app.app_context():
+        db.session.execute(text("DELETE FROM rollup_asistencias_dia"))
+        db.session.commit()
+    result = runner.invoke(args=["db-upgrade"])
+    assert result.exit_code == 0, result.output
+    assert "==> flask rollups-rebuild" in result.output
+
+
+def test_enrolar_binario_con_embedding_not_null_guarda_json(app):
+    import numpy as np
+
+    from app.face_storage import reset_embedding_schema, template_columns
+    from app.models import FaceTemplate
+
+    with app.app_context():
+        c = Cliente(nombre="Ana", apellido="Soto", rut="12.345.678-5")
+        db.session.add(c)
+        db.session.commit()
+
+        # Esquema antiguo: embedding NOT NULL (SQLite no lo puede relajar)
+        with db.engine.begin() as conn:
+            conn.execute(text("DROP TABLE face_templates"))
+        FaceTemplate.__table__.c.embedding.nullable = False
+        try:
+            FaceTemplate.__table__.create(db.engine)
+        finally:
+            FaceTemplate.__table__.c.embedding.nullable = True
+        reset_embedding_schema()
+
+        try:
+            cols = template_columns(np.ones(8), storage="float16")
+            assert cols["embedding"] is not None and cols["embedding_blob"]
+            db.session.add(FaceTemplate(cliente_id=c.cliente_id, **cols))
+            db.session.commit()
+
+            app.config["FACE_EMBEDDING_STORAGE"] = "float16"
+            result = app.test_cli_runner().invoke(args=["db-upgrade"])
+        finally:
+            reset_embedding_schema()
+    assert result.exit_code == 0, result.output
+    assert "[WARN] FACE_EMBEDDING_STORAGE=float16" in result.output
@@ -0,0 +1,97 @@
+import time
+from datetime import date, datetime
+
+import pytest
+
+from app import db
+from app.export_jobs import _version_asistencias
+from app.models import Asistencia, Cliente
+
+DIA = date(2025, 3, 10)
+
+
+@pytest.fixture
+def clientes(app):
+    with app.app_context():
+        a = Cliente(nombre="Ana", apellido="Soto", rut="12.345.678-5")
+        b = Cliente(nombre="Luis", apellido="Rojas", rut="11.111.111-1")
+        db.session.add_all([a, b])
+        db.session.commit()
+        return a.cliente_id, b.cliente_id
+
+
+def _client(app):
+    client = app.test_client()
+    with client.session_transaction() as s:
+        s["user_id"] = 1
+        s["user_role"] = "admin"
+    return client
+
+
+def _esperar_listo(client, job_id, timeout=10.0):
+    limite = time.monotonic() + timeout
+    while time.monotonic() < limite:
+        meta = client.get(f"/api/exports/{job_id}").get_json()
+        if meta["estado"] != "en_proceso":
+            return meta
+        time.sleep(0.05)
+    raise AssertionError(f"El export {job_id} no terminó en {timeout}s")
+
+
+def _asistencia(cliente_id, hora, tipo="entrada"):
+    a = Asistencia(cliente_id=cliente_id, fecha_hora=datetime(2025, 3, 10, hora), tipo=tipo)
+    db.session.add(a)
+    db.session.commit()
+    return a
+
+
+def test_version_asistencias_cambia_con_updates(app, clientes):
+    ana, luis = clientes
+    with app.app_context():
+        entrada = _asistencia(ana, 8)
+        otra = _asistencia(luis, 9)
+        v1 = _version_asistencias(DIA, DIA)
+
+        # Mismo count y max(id): sólo cambia el contenido de las filas
+        otra.tipo = "salida"
+        db.session.commit()
+        v2 = _version_asistencias(DIA, DIA)
+        assert v2 != v1
+
+        entrada.cliente_id = luis
+        db.session.commit()
+        assert _version_asistencias(DIA, DIA) != v2
+
+
+def test_export_en_segundo_plano_queda_en_cache(app, clientes):
+    ana, luis = clientes
+    with app.app_context():
+        _asistencia(ana, 8)
+    client = _client(app)
+    pedido = {"kind": "asistencias", "format": "csv", "from": "2025-03-10", "to": "2025-03-10"}
+
+    resp = client.post("/api/exports", json=pedido)
+    assert resp.status_code == 202
+    job = resp.get_json()
+    assert job["en_cache"] is False and job["estado"] == "en_proceso"
+
+    meta = _esperar_listo(client, job["job_id"])
+    assert meta["estado"] == "listo", meta
+    descarga = client.get(meta["download_url"])
+    assert descarga.status_code == 200
+    assert len(descarga.data.decode("utf-8-sig").strip().splitlines()) == 2
+
+    # Mismo rango sin cambios: el archivo ya construido, sin volver a encolar
+    resp = client.post("/api/exports", json=pedido)
+    assert resp.status_code == 200
+    cache = resp.get_json()
+    assert cache["en_cache"] is True
+    assert cache["job_id"] == job["job_id"]
+
+    # Datos nuevos en el rango: otra versión, otro job
+    with app.app_context():
+        _asistencia(luis, 9)
+    resp = client.post("/api/exports", json=pedido)
+    assert resp.status_code == 202
+    assert resp.get_json()["job_id"] != job["job_id"]
+    _esperar_listo(client, resp.get_json()["job_id"])
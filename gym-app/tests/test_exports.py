@@ -0,0 +1,94 @@
+import csv
+import gzip
+from datetime import datetime
+from io import BytesIO, StringIO
+
+import pytest
+from openpyxl import load_workbook
+
+from app import db
+from app.exports import ASISTENCIAS_HEADERS, gzip_chunks, iter_csv
+from app.models import Asistencia, Cliente
+
+
+def _client(app):
+    client = app.test_client()
+    with client.session_transaction() as s:
+        s["user_id"] = 1
+        s["user_role"] = "admin"
+    return client
+
+
+@pytest.fixture
+def asistencias(app):
+    """5 asistencias el 10 y 11 de marzo y una fuera del rango (12)."""
+    with app.app_context():
+        clientes = [Cliente(nombre="Ana", apellido=str(i), rut=f"{i}-{i}") for i in range(3)]
+        db.session.add_all(clientes)
+        db.session.flush()
+        for dia in (10, 11):
+            for c in clientes[: dia - 8]:
+                db.session.add(Asistencia(cliente_id=c.cliente_id, fecha_hora=datetime(2025, 3, dia, 8)))
+        db.session.add(Asistencia(cliente_id=clientes[0].cliente_id, fecha_hora=datetime(2025, 3, 10, 19), tipo="salida"))
+        db.session.add(Asistencia(cliente_id=clientes[0].cliente_id, fecha_hora=datetime(2025, 3, 12, 8)))
+        db.session.commit()
+    return 6
+
+
+def test_export_xlsx_de_asistencias(app, asistencias):
+    resp = _client(app).get("/api/asistencias/rango/excel?from=2025-03-10&to=2025-03-11")
+    assert resp.status_code == 200
+    assert "asistencias_20250310_20250311.xlsx" in resp.headers["Content-Disposition"]
+
+    ws = load_workbook(BytesIO(resp.data), read_only=True).active
+    rows = list(ws.iter_rows(values_only=True))
+    assert list(rows[0]) == ASISTENCIAS_HEADERS
+    assert len(rows) - 1 == asistencias
+    tipos = [r[ASISTENCIAS_HEADERS.index("Tipo")] for r in rows[1:]]
+    assert sorted(tipos) == ["entrada"] * 5 + ["salida"]
+
+
+def test_export_xlsx_sin_filas_solo_trae_encabezados(app, asistencias):
+    resp = _client(app).get("/api/asistencias/rango/excel?from=2025-01-01&to=2025-01-31")
+    assert resp.status_code == 200
+    ws = load_workbook(BytesIO(resp.data), read_only=True).active
+    assert [list(r) for r in ws.iter_rows(values_only=True)] == [ASISTENCIAS_HEADERS]
+
+
+def _csv_rows(data: bytes):
+    text = data.decode("utf-8")
+    assert text.startswith("\ufeff")
+    return list(csv.reader(StringIO(text[1:])))
+
+
+def test_export_csv_de_asistencias(app, asistencias):
+    resp = _client(app).get("/api/asistencias/rango/csv?from=2025-03-10&to=2025-03-11")
+    assert resp.status_code == 200
+    assert resp.mimetype == "text/csv"
+    assert "Content-Encoding" not in resp.headers
+
+    rows = _csv_rows(resp.data)
+    assert rows[0] == ASISTENCIAS_HEADERS
+    assert len(rows) - 1 == asistencias
+
+
+def test_export_csv_gzip_se_descomprime_igual(app, asistencias):
+    client = _client(app)
+    url = "/api/asistencias/rango/csv?from=2025-03-10&to=2025-03-11"
+    plano = client.get(url).data
+
+    resp = client.get(url, headers={"Accept-Encoding": "gzip, deflate"})
+    assert resp.status_code == 200
+    assert resp.headers["Content-Encoding"] == "gzip"
+    assert "Accept-Encoding" in resp.headers["Vary"]
+    assert gzip.decompress(resp.data) == plano
+
+
+def test_iter_csv_en_varios_trozos_es_un_solo_csv():
+    filas = [[i, f"Pérez {i}"] for i in range(7)]
+    trozos = list(iter_csv(["id", "nombre"], filas, chunk_rows=3))
+    assert len(trozos) > 1
+
+    datos = b"".join(trozos)
+    assert _csv_rows(datos) == [["id", "nombre"]] + [[str(i), n] for i, n in filas]
+    assert gzip.decompress(b"".join(gzip_chunks(iter(trozos)))) == datos
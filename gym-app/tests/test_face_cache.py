@@ -0,0 +1,76 @@
+import numpy as np
+import pytest
+
+from app.face_cache import ProbeCache
+from app.face_index import EMBEDDING_DIM
+
+
+def _par(rng, similitud):
+    """Dos vectores unitarios con coseno = similitud."""
+    a = rng.standard_normal(EMBEDDING_DIM)
+    a /= np.linalg.norm(a)
+    ruido = rng.standard_normal(EMBEDDING_DIM)
+    ruido -= (ruido @ a) * a
+    ruido /= np.linalg.norm(ruido)
+    return a, similitud * a + np.sqrt(1 - similitud ** 2) * ruido
+
+
+def _hit_rate(similitud, n=300, **kwargs):
+    rng = np.random.default_rng(1)
+    hits = 0
+    for i in range(n):
+        cache = ProbeCache(ttl=60, seed=i, **kwargs)
+        a, b = _par(rng, similitud)
+        cache.put(a, 1, 0.8)
+        hits += cache.get(b) is not None
+    return hits / n
+
+
+@pytest.mark.parametrize("similitud, minimo", [(0.92, 0.95), (0.95, 0.98), (0.98, 0.99)])
+def test_hit_rate_misma_cara(similitud, minimo):
+    assert _hit_rate(similitud) >= minimo
+
+
+@pytest.mark.parametrize("similitud", [0.3, 0.8])
+def test_no_confunde_personas_distintas(similitud):
+    assert _hit_rate(similitud) == 0.0
+
+
+def test_devuelve_el_candidato_mas_parecido():
+    rng = np.random.default_rng(2)
+    a, b = _par(rng, 0.97)
+    cache = ProbeCache(ttl=60)
+    cache.put(b, 2, 0.7)
+    cache.put(a, 1, 0.9)
+    assert cache.get(a) == (1, 0.9)
+
+
+def test_invalidate_cliente_y_max_entries():
+    rng = np.random.default_rng(3)
+    cache = ProbeCache(ttl=60, max_entries=2)
+    a, _ = _par(rng, 0.9)
+    b, _ = _par(rng, 0.9)
+    c, _ = _par(rng, 0.9)
+    cache.put(a, 1, 0.9)
+    cache.put(b, 2, 0.9)
+    cache.put(c, 3, 0.9)
+    assert cache.get(a) is None
+    cache.invalidate_cliente(2)
+    assert cache.get(b) is None
+    assert cache.get(c) == (3, 0.9)
+    assert cache.snapshot()["entradas"] == 1
+
+
+def test_expira(monkeypatch):
+    import app.face_cache as face_cache
+
+    reloj = [100.0]
+    monkeypatch.setattr(face_cache.time, "monotonic", lambda: reloj[0])
+    rng = np.random.default_rng(4)
+    a, _ = _par(rng, 0.9)
+    cache = ProbeCache(ttl=5)
+    cache.put(a, 1, 0.9)
+    assert cache.get(a) == (1, 0.9)
+    reloj[0] += 6
+    assert cache.get(a) is None
+    assert cache.snapshot()["expirados"] == 1
@@ -0,0 +1,117 @@
+import re
+
+import numpy as np
+import pytest
+
+from app.face_index import FaceIndex, IVFFaceIndex, recall_at_k
+
+
+def _dataset(n_clientes, por_cliente=2, ruido=0.7, seed=0, dim=128):
+    """Plantillas con ruido alrededor de un vector por cliente."""
+    rng = np.random.default_rng(seed)
+    base = rng.standard_normal((n_clientes, dim))
+    rows, tid = [], 1
+    for cid in range(n_clientes):
+        for _ in range(por_cliente):
+            rows.append((tid, cid + 1, base[cid] + ruido * rng.standard_normal(dim)))
+            tid += 1
+    probes = base + ruido * rng.standard_normal(base.shape)
+    return rows, probes
+
+
+def _consistente(index):
+    """Offsets crecientes que cubren todas las filas."""
+    offsets = index._offsets
+    assert offsets[0] == 0 and offsets[-1] == len(index)
+    assert np.all(np.diff(offsets) >= 0)
+
+
+def test_recall_con_nprobe_automatico():
+    rows, probes = _dataset(4000, dim=128)
+    exact, ivf = FaceIndex(dim=128), IVFFaceIndex(dim=128)
+    exact.load(rows)
+    ivf.load(rows)
+    nlist = ivf._centroids.shape[0]
+    assert ivf.effective_nprobe() >= nlist / 16
+    assert recall_at_k(ivf, exact, probes[:300]) >= 0.95
+
+
+def test_altas_y_bajas_incrementales_no_reasignan_todo(monkeypatch):
+    import app.face_index as face_index
+
+    rows, probes = _dataset(600, dim=64)
+    exact, ivf = FaceIndex(dim=64), IVFFaceIndex(dim=64)
+    exact.load(rows[:800])
+    ivf.load(rows[:800])
+
+    asignadas = []
+    original = face_index._nearest_centroid
+    monkeypatch.setattr(face_index, "_nearest_centroid", lambda m, c: asignadas.append(len(m)) or original(m, c))
+
+    ivf.add_many(rows[800:1000])
+    exact.add_many(rows[800:1000])
+    for cid in (1, 50, 400):
+        ivf.remove_cliente(cid)
+        exact.remove_cliente(cid)
+    assert asignadas == [200]
+
+    _consistente(ivf)
+    assert len(ivf) == len(exact)
+    # Con todas las listas revisadas el IVF devuelve lo mismo que el exacto
+    ivf.nprobe = ivf._centroids.shape[0]
+    for probe in probes[:100]:
+        got, expected = ivf.search(probe, k=3), exact.search(probe, k=3)
+        assert [(c, t) for c, _, t in got] == [(c, t) for c, _, t in expected]
+        assert [s for _, s, _ in got] == pytest.approx([s for _, s, _ in expected], abs=1e-5)
+
+
+def test_duplicar_tamano_reentrena():
+    rows, _ = _dataset(300, dim=32)
+    ivf = IVFFaceIndex(dim=32)
+    ivf.load(rows[:100])
+    assert ivf.trained_on == 100
+    ivf.add_many(rows[100:250])
+    assert ivf.trained_on == 250
+    _consistente(ivf)
+
+
+def test_carga_lee_json_solo_sin_blob(app):
+    from sqlalchemy import event
+
+    from app import db
+    from app.face_index import _active_template_rows
+    from app.face_storage import encode_embedding
+    from app.models import Cliente, FaceTemplate
+
+    rng = np.random.default_rng(1)
+    vectores = rng.standard_normal((3, 8)).astype(np.float32)
+
+    with app.app_context():
+        c = Cliente(nombre="Ana", apellido="Soto", rut="12.345.678-5")
+        db.session.add(c)
+        db.session.flush()
+        db.session.add_all([
+            # Compactada conservando el JSON (como en SQLite)
+            FaceTemplate(cliente_id=c.cliente_id, embedding=vectores[0].tolist(),
+                         embedding_blob=encode_embedding(vectores[0])),
+            FaceTemplate(cliente_id=c.cliente_id, embedding=vectores[1].tolist()),
+            FaceTemplate(cliente_id=c.cliente_id, embedding=[0.0] * 8,
+                         embedding_blob=encode_embedding(vectores[2])),
+        ])
+        db.session.commit()
+
+        sqls = []
+        listener = lambda conn, cursor, statement, *args: sqls.append(statement)
+        event.listen(db.engine, "before_cursor_execute", listener)
+        try:
+            rows = {tid: vec for tid, _, vec in _active_template_rows()}
+        finally:
+            event.remove(db.engine, "before_cursor_execute", listener)
+
+        assert np.allclose(rows[1], vectores[0])
+        assert np.allclose(rows[2], vectores[1])
+        assert np.allclose(rows[3], vectores[2])
+
+        blob_sql, json_sql = [s for s in sqls if "FROM face_templates" in s]
+        assert not re.search(r"face_templates\.embedding\b", blob_sql)
+        assert "embedding_blob IS NULL" in json_sql
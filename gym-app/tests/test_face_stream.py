@@ -0,0 +1,58 @@
+from sqlalchemy import text
+
+from app import db
+from app.models import Cliente
+from app.face_stream import FaceStream
+
+
+def test_error_de_bd_no_envenena_los_frames_siguientes(app):
+    stream = FaceStream()
+    resultados = []
+
+    def process(raw):
+        if raw == b"malo":
+            # Llega otro frame mientras éste falla: lo procesa el mismo hilo
+            stream._pending = b"bueno"
+            # Falla en el flush (p.ej. la entrada facial): la sesión queda pendiente de rollback
+            db.session.add(Cliente(nombre=None, apellido="X", rut="1-9"))
+            db.session.flush()
+        resultados.append(db.session.execute(text("SELECT 1")).scalar())
+
+    stream._process = process
+    stream._pending = b"malo"
+    stream._running = True
+    stream._drain(app)
+
+    assert resultados == [1]
+    assert [ev["type"] for _, ev in stream.events_since(0, timeout=0)] == ["error"]
+
+
+def test_stats_snapshot_es_copia():
+    stream = FaceStream()
+    stream._count("procesados")
+    snap = stream.stats_snapshot()
+    stream._count("procesados")
+    assert snap["procesados"] == 1
+    assert stream.stats_snapshot()["procesados"] == 2
+
+
+def test_stream_usa_el_umbral_de_auto_confirmacion_por_defecto(app):
+    from app.face_stream import close_stream, get_stream
+
+    app.config["FACE_AUTO_CONFIRM_THRESHOLD"] = 0.7
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess["user_id"] = 1
+        sess["user_role"] = "admin"
+
+    r = client.post("/api/face/stream", json={"checkin": True})
+    assert r.status_code == 201
+    stream_id = r.get_json()["stream_id"]
+    assert get_stream(stream_id).auto_confirm == 0.7
+
+    r = client.post("/api/face/stream", json={"checkin": True, "auto_confirm": 0.5})
+    assert get_stream(r.get_json()["stream_id"]).auto_confirm == 0.5
+
+    assert client.delete(f"/api/face/stream/{stream_id}").status_code == 200
+    assert get_stream(stream_id) is None
+    close_stream(r.get_json()["stream_id"])
@@ -0,0 +1,46 @@
+import json
+
+from app import db, live_events
+from app.live_events import LiveFeed, backlog
+from app.models import EventoLive
+
+
+def _insertar(evento_id, n):
+    db.session.add(EventoLive(evento_id=evento_id, tipo="asistencia", payload=json.dumps({"asistencia_id": n})))
+    db.session.commit()
+
+
+def _entregados(feed, pos=0):
+    return [(ev["asistencia_id"], sse_id) for _, ev, sse_id, _ in feed.events_since(pos, timeout=0) if ev["type"] == "asistencia"]
+
+
+def test_evento_commiteado_fuera_de_orden_no_se_pierde(app):
+    with app.app_context():
+        feed = LiveFeed()
+        # La transacción con id 2 commitea antes que la que tomó el id 1
+        _insertar(2, 20)
+        feed._poll()
+        assert _entregados(feed) == [(20, 0)]
+        assert feed.watermark() == 0
+
+        pos = feed.pos()
+        _insertar(1, 10)
+        _insertar(3, 30)
+        feed._poll()
+        assert _entregados(feed, pos) == [(10, 1), (30, 3)]
+        assert feed.watermark() == 3
+
+        # Reanudar desde la marca de agua del primer evento recupera el tardío
+        assert [ev["asistencia_id"] for _, ev in backlog(0, 100)] == [10, 20, 30]
+
+
+def test_hueco_sin_commit_se_descarta_tras_gap_seconds(app, monkeypatch):
+    with app.app_context():
+        feed = LiveFeed()
+        _insertar(3, 30)
+        feed._poll()
+        assert feed.watermark() == 0
+
+        monkeypatch.setattr(live_events, "GAP_SECONDS", -1)
+        feed._poll()
+        assert feed.watermark() == 3
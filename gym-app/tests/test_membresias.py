@@ -0,0 +1,99 @@
+from datetime import timedelta
+
+from app import db, membresias
+from app.models import Cliente, ClienteMembresia, Membresia, hoy_chile, membresia_snapshot
+
+
+def _client(app):
+    client = app.test_client()
+    with client.session_transaction() as s:
+        s["user_id"] = 1
+        s["user_role"] = "admin"
+    return client
+
+
+def _cliente_con(app, *rangos, rut="12.345.678-5"):
+    """Cliente con una cliente_membresia activa por cada (inicio, fin) en días desde hoy."""
+    hoy = hoy_chile()
+    with app.app_context():
+        plan = Membresia(nombre="Mensual", duracion_dias=30, precio=20000)
+        c = Cliente(nombre="Ana", apellido="Soto", rut=rut)
+        db.session.add_all([plan, c])
+        db.session.flush()
+        for inicio, fin in rangos:
+            db.session.add(ClienteMembresia(
+                cliente_id=c.cliente_id, membresia_id=plan.membresia_id, estado="activa",
+                fecha_inicio=hoy + timedelta(days=inicio), fecha_fin=hoy + timedelta(days=fin),
+            ))
+        db.session.flush()
+        membresias.refrescar([c.cliente_id], hoy)
+        db.session.commit()
+        return c.cliente_id
+
+
+def test_membresia_que_empieza_despues_no_esta_vigente(app):
+    cliente_id = _cliente_con(app, (3, 33))
+    hoy = hoy_chile()
+
+    with app.app_context():
+        c = db.session.get(Cliente, cliente_id)
+        assert membresia_snapshot(c, hoy)["vigente"] is False
+        assert membresia_snapshot(c, hoy + timedelta(days=3))["vigente"] is True
+
+    client = _client(app)
+    assert client.get(f"/api/clientes/{cliente_id}/membresia-activa").get_json()["activa"] is False
+    assert client.get("/api/dashboard/resumen").get_json()["membresias_vigentes"] == 0
+
+
+def test_renovacion_anticipada_no_tapa_la_vigente(app):
+    cliente_id = _cliente_con(app, (-10, 5), (6, 36))
+
+    with app.app_context():
+        c = db.session.get(Cliente, cliente_id)
+        assert membresia_snapshot(c)["vigente"] is True
+        assert c.membresia_fecha_fin == hoy_chile() + timedelta(days=5)
+
+    resp = _client(app).get(f"/api/clientes/{cliente_id}/membresia-activa").get_json()
+    assert resp["activa"] is True
+    assert resp["membresia"]["fecha_fin"] == (hoy_chile() + timedelta(days=5)).isoformat()
+
+
+def _estados(app, cliente_id):
+    with app.app_context():
+        return [
+            m.estado
+            for m in ClienteMembresia.query.filter_by(cliente_id=cliente_id).order_by(ClienteMembresia.fecha_inicio)
+        ]
+
+
+def test_vencer_por_lotes_respeta_fechas_y_es_idempotente(app):
+    # Vencida ayer + vigente hasta hoy inclusive + una que todavía no empieza
+    mixto = _cliente_con(app, (-31, -1), (-1, 0), (3, 33))
+    # Sólo vencidas: pierde la membresía vigente del snapshot
+    vencidos = [_cliente_con(app, (-40, -10), (-9, -2), rut=f"{i}-{i}") for i in range(2)]
+
+    # Antes del job el snapshot todavía la marca vigente (fin ya pasado)
+    with app.app_context():
+        for cid in vencidos:
+            db.session.get(Cliente, cid).membresia_vigente = True
+        db.session.commit()
+
+    lotes = []
+    with app.app_context():
+        counts = membresias.vencer(batch_size=2, on_batch=lambda lote, filas, seg: lotes.append(filas))
+    assert counts["membresias"] == 5
+    assert counts["lotes"] == 3 and lotes == [2, 2, 1]
+    assert counts["clientes"] == 2
+
+    assert _estados(app, mixto) == ["vencida", "activa", "activa"]
+    for cid in vencidos:
+        assert _estados(app, cid) == ["vencida", "vencida"]
+
+    with app.app_context():
+        assert db.session.get(Cliente, mixto).membresia_vigente is True
+        assert not any(db.session.get(Cliente, cid).membresia_vigente for cid in vencidos)
+
+        # Segunda pasada el mismo día: no cambia nada
+        again = membresias.vencer(batch_size=2)
+    assert (again["membresias"], again["lotes"], again["clientes"]) == (0, 0, 0)
+    assert _estados(app, mixto) == ["vencida", "activa", "activa"]
@@ -0,0 +1,79 @@
+import pytest
+
+from app import db, qr_cache
+from app.models import Cliente
+
+
+def _client(app):
+    client = app.test_client()
+    with client.session_transaction() as s:
+        s["user_id"] = 1
+        s["user_role"] = "admin"
+    return client
+
+
+@pytest.fixture
+def cliente(app):
+    app.config["QR_CACHE_CHECK_SECONDS"] = 0
+    qr_cache.configure(app.config)
+    with app.app_context():
+        c = Cliente(nombre="Ana", apellido="Soto", rut="12.345.678-5", qr_token="token-viejo")
+        db.session.add(c)
+        db.session.commit()
+        return c.cliente_id
+
+
+def _checkin(client, token):
+    return client.post("/api/asistencias/qr", json={"token": token})
+
+
+def test_regenerar_qr_invalida_el_token_anterior(app, cliente):
+    client = _client(app)
+    with app.app_context():
+        assert qr_cache.lookup("token-viejo").cliente_id == cliente
+
+    nuevo = client.post(f"/api/clientes/{cliente}/qr/regenerar").get_json()["qr_token"]
+    assert _checkin(client, "token-viejo").status_code == 404
+    assert _checkin(client, nuevo).status_code in (200, 201)
+
+
+def test_cambio_en_otro_worker_vacia_el_cache(app, cliente):
+    with app.app_context():
+        assert qr_cache.lookup("token-viejo").cliente_id == cliente
+        # Otro worker regenera el token: este no recibe cliente_changed/discard
+        db.session.get(Cliente, cliente).qr_token = "token-nuevo"
+        db.session.commit()
+        db.session.remove()
+
+        assert qr_cache.lookup("token-viejo") is None
+        assert qr_cache.lookup("token-nuevo").cliente_id == cliente
+
+
+@pytest.fixture
+def sin_relectura(app, cliente):
+    # Sin relectura de la generación: sólo cuenta cliente_changed
+    app.config["QR_CACHE_CHECK_SECONDS"] = 3600
+    qr_cache.configure(app.config)
+    yield
+    app.config["QR_CACHE_CHECK_SECONDS"] = 0
+    qr_cache.configure(app.config)
+
+
+def test_cliente_changed_reemplaza_solo_al_cliente_cambiado(app, cliente, sin_relectura):
+    with app.app_context():
+        otro = Cliente(nombre="Luis", apellido="Rojas", rut="11.111.111-1", qr_token="token-otro")
+        db.session.add(otro)
+        db.session.commit()
+        assert qr_cache.lookup("token-viejo").nombre == "Ana"
+        assert qr_cache.lookup("token-otro").cliente_id == otro.cliente_id
+
+        c = db.session.get(Cliente, cliente)
+        c.qr_token = "token-nuevo"
+        c.nombre = "Anita"
+        db.session.commit()
+        qr_cache.cliente_changed(c)
+
+        cache = qr_cache._CACHE
+        assert cache.get("token-viejo") is None
+        assert cache.get("token-nuevo").nombre == "Anita"
+        assert cache.get("token-otro").cliente_id == otro.cliente_id
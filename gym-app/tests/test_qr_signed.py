@@ -0,0 +1,42 @@
+import pytest
+from sqlalchemy import insert
+
+from app import db, qr_signed
+from app.models import Cliente, QrRevocado, incrementar_generacion
+
+
+@pytest.fixture
+def cliente(app, monkeypatch):
+    # El filtro es global al proceso: cada test parte sin filtro cargado
+    monkeypatch.setattr(qr_signed, "_BLOOM", None)
+    monkeypatch.setattr(qr_signed, "_BLOOM_GENERACION", None)
+    app.config["QR_SIGNED_TOKENS"] = True
+    app.config["QR_CACHE_CHECK_SECONDS"] = 0
+    with app.app_context():
+        c = Cliente(nombre="Ana", apellido="Soto", rut="12.345.678-5")
+        db.session.add(c)
+        db.session.commit()
+        return c.cliente_id
+
+
+def test_revocacion_en_otro_worker_vale_antes_de_recargar_el_filtro(app, cliente):
+    with app.app_context():
+        emitido = qr_signed.verificar(qr_signed.emitir(cliente))[1]
+        assert not qr_signed.revocado(cliente, emitido)
+
+        # Otro worker revoca: el filtro local no se entera por revocar()
+        db.session.execute(insert(QrRevocado).values(cliente_id=cliente, emitido=emitido))
+        incrementar_generacion(db.session.connection(), qr_signed.GENERACION)
+        db.session.commit()
+
+        assert qr_signed.revocado(cliente, emitido)
+
+
+def test_sin_cambio_de_generacion_no_recarga_el_filtro(app, cliente):
+    with app.app_context():
+        bloom = qr_signed.get_bloom()
+        assert qr_signed.get_bloom() is bloom
+
+        qr_signed.revocar(qr_signed.emitir(cliente))
+        db.session.commit()
+        assert qr_signed.get_bloom() is not bloom
@@ -0,0 +1,49 @@
+import pytest
+from sqlalchemy import event
+
+from app import db
+from app.models import Asistencia, Cliente, ahora_chile, registrar_entrada
+
+
+@pytest.fixture
+def cliente_id(app):
+    with app.app_context():
+        c = Cliente(nombre="Ana", apellido="Soto", rut="12.345.678-5")
+        db.session.add(c)
+        db.session.commit()
+        return c.cliente_id
+
+
+@pytest.fixture
+def sin_returning(app, monkeypatch):
+    # Simula un motor sin ON CONFLICT ... RETURNING (MySQL) sobre SQLite y
+    # junta los INSERT emitidos
+    inserts = []
+
+    def capturar(conn, cursor, statement, *args):
+        if statement.lstrip().upper().startswith("INSERT"):
+            inserts.append(statement)
+
+    with app.app_context():
+        monkeypatch.setattr(db.engine.dialect, "name", "mysql")
+        event.listen(db.engine, "before_cursor_execute", capturar)
+        yield inserts
+        event.remove(db.engine, "before_cursor_execute", capturar)
+
+
+def test_entrada_sin_returning_inserta_y_luego_devuelve_la_existente(app, cliente_id, sin_returning):
+    with app.app_context():
+        primera, creada = registrar_entrada(cliente_id, fecha_hora=ahora_chile())
+        db.session.commit()
+        assert creada
+        assert primera.cliente_id == cliente_id and primera.tipo == "entrada"
+
+        segunda, creada = registrar_entrada(cliente_id)
+        db.session.commit()
+        assert not creada
+        assert segunda.asistencia_id == primera.asistencia_id
+        assert Asistencia.query.filter_by(cliente_id=cliente_id).count() == 1
+
+    entradas = [s for s in sin_returning if "INTO asistencias " in s]
+    assert len(entradas) == 2
+    assert not any("RETURNING" in s.upper() for s in entradas)
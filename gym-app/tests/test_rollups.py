@@ -0,0 +1,35 @@
+from sqlalchemy import func, select
+
+from app import db, rollups
+from app.models import AsistenciaDia, AsistenciaHora, Cliente, hoy_chile, registrar_entrada
+
+
+def _client(app):
+    client = app.test_client()
+    with client.session_transaction() as s:
+        s["user_id"] = 1
+        s["user_role"] = "admin"
+    return client
+
+
+def test_entradas_se_reparten_en_shards_y_se_suman_al_leer(app):
+    with app.app_context():
+        clientes = [Cliente(nombre="C", apellido=str(i), rut=f"{i}-{i}") for i in range(3)]
+        db.session.add_all(clientes)
+        db.session.flush()
+        for c in clientes:
+            registrar_entrada(c.cliente_id)
+        db.session.commit()
+
+        shards = {rollups.shard_de(c.cliente_id) for c in clientes}
+        assert db.session.execute(select(func.count()).select_from(AsistenciaDia)).scalar() == len(shards)
+        assert rollups.resumen_hoy(hoy_chile())["entradas_hoy"] == 3
+
+        # rollups-rebuild deja las mismas filas
+        antes = db.session.execute(select(AsistenciaHora.hora, AsistenciaHora.shard, AsistenciaHora.entradas)).all()
+        rollups.rebuild()
+        despues = db.session.execute(select(AsistenciaHora.hora, AsistenciaHora.shard, AsistenciaHora.entradas)).all()
+        assert sorted(antes) == sorted(despues)
+
+    dias = _client(app).get("/api/dashboard/asistencia/dias").get_json()
+    assert dias == [{"fecha": hoy_chile().isoformat(), "total": 3}]
@@ -9,6 +9,7 @@ import MembershipAssignRenew from "./components/memberships/MembershipAssignRene
 import TodayEntries from "./components/attendance/TodayEntries";
 import QrCheckin from "./components/attendance/QrCheckin"; 
 import QrCameraCheckin from "./components/attendance/QrCameraCheckin"; 
+import PendingCheckins from "./components/attendance/PendingCheckins";
 import Cashbox from "./components/cash/Cashbox";
 import UpcomingExpirations from "./components/expirations/UpcomingExpirations";
 import PaymentsExport from "./components/reports/PaymentsExport";
@@ -301,6 +302,7 @@ export default function CashierPanel() {
           ) : (
             <QrCameraCheckin onSuccess={fetchAsistencias} />
           )}
+          <PendingCheckins onSynced={fetchAsistencias} />
         </Section>
       </div>
 
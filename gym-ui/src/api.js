@@ -107,10 +107,21 @@ export async function apiMe() {
 
 // -------------------- clientes --------------------
 
+// Lista completa (sin paginar)
 export async function apiGetClientes() {
   return fetchJson(`/api/clientes`);
 }
 
+// Búsqueda paginada: { items, next_cursor, has_more }
+export async function apiBuscarClientes({ q = "", cursor = null, limit = 50, fields = null } = {}) {
+  const params = new URLSearchParams();
+  if (q) params.set("q", q);
+  if (cursor) params.set("cursor", cursor);
+  if (limit) params.set("limit", String(limit));
+  if (fields) params.set("fields", Array.isArray(fields) ? fields.join(",") : fields);
+  return fetchJson(`/api/clientes?${params.toString()}`);
+}
+
 export async function apiCrearCliente(payload) {
   return doJson(`/api/clientes`, {
     method: "POST",
@@ -122,6 +133,13 @@ export async function apiGetCliente(cliente_id) {
   return fetchJson(`/api/clientes/${cliente_id}`);
 }
 
+export async function apiRegenerarQrCliente(cliente_id) {
+  return doJson(`/api/clientes/${cliente_id}/qr/regenerar`, {
+    method: "POST",
+    body: JSON.stringify({}),
+  });
+}
+
 export async function apiUpdateCliente(cliente_id, payload) {
   return doJson(`/api/clientes/${cliente_id}`, {
     method: "PUT",
@@ -189,6 +207,103 @@ export async function apiMarcarAsistenciaQR(token) {
   });
 }
 
+// -------------------- kiosko sin conexión --------------------
+// Si el backend no responde, el check-in QR queda en localStorage con una
+// idempotency_key y la hora local, y se envía por /api/asistencias/bulk al
+// volver la conexión (reintentar es seguro: las claves no se duplican).
+// Cada cambio de la cola emite PENDIENTES_EVENT en window (ver
+// hooks/useAsistenciasPendientes.js, que también dispara la sincronización).
+
+const PENDIENTES_KEY = "asistencias_pendientes";
+export const PENDIENTES_EVENT = "asistencias-pendientes";
+
+function leerPendientes() {
+  try {
+    return JSON.parse(localStorage.getItem(PENDIENTES_KEY) || "[]");
+  } catch {
+    return [];
+  }
+}
+
+function guardarPendientes(list) {
+  localStorage.setItem(PENDIENTES_KEY, JSON.stringify(list));
+  window.dispatchEvent(new Event(PENDIENTES_EVENT));
+}
+
+// crypto.randomUUID sólo existe en contextos seguros (HTTPS o localhost);
+// un kiosko por http://ip-de-la-lan cae a un UUID v4 con getRandomValues.
+function nuevaIdempotencyKey() {
+  if (globalThis.crypto?.randomUUID) return crypto.randomUUID();
+
+  const b = new Uint8Array(16);
+  if (globalThis.crypto?.getRandomValues) {
+    crypto.getRandomValues(b);
+  } else {
+    for (let i = 0; i < b.length; i++) b[i] = Math.floor(Math.random() * 256);
+  }
+  b[6] = (b[6] & 0x0f) | 0x40;
+  b[8] = (b[8] & 0x3f) | 0x80;
+  const hex = Array.from(b, (x) => x.toString(16).padStart(2, "0")).join("");
+  return `${hex.slice(0, 8)}-${hex.slice(8, 12)}-${hex.slice(12, 16)}-${hex.slice(16, 20)}-${hex.slice(20)}`;
+}
+
+export function asistenciasPendientes() {
+  return leerPendientes().length;
+}
+
+export async function apiMarcarAsistenciaQROffline(token) {
+  try {
+    // Sin red conocida no se espera el timeout del fetch
+    if (navigator.onLine === false) throw new TypeError("offline");
+    return await apiMarcarAsistenciaQR(token);
+  } catch (err) {
+    // fetch lanza TypeError sólo si no hubo respuesta (red caída)
+    if (!(err instanceof TypeError)) throw err;
+
+    const evento = {
+      idempotency_key: nuevaIdempotencyKey(),
+      token,
+      fecha_hora: new Date().toISOString(),
+      tipo: "entrada",
+    };
+    guardarPendientes([...leerPendientes(), evento]);
+    return { ok: true, offline: true, pendiente: evento };
+  }
+}
+
+let syncEnCurso = null;
+
+async function syncPendientes(batchSize) {
+  const resultados = [];
+
+  for (;;) {
+    const lote = leerPendientes().slice(0, batchSize);
+    if (!lote.length) break;
+
+    const data = await doJson(`/api/asistencias/bulk`, {
+      method: "POST",
+      body: JSON.stringify({ eventos: lote }),
+    });
+    resultados.push(...(data?.resultados || []));
+
+    // Se relee la cola: pudieron encolarse check-ins mientras se enviaba
+    const enviados = new Set(lote.map((e) => e.idempotency_key));
+    guardarPendientes(leerPendientes().filter((e) => !enviados.has(e.idempotency_key)));
+  }
+
+  return resultados;
+}
+
+/** Envía la cola en lotes; llamadas concurrentes comparten el mismo envío. */
+export function apiSyncAsistenciasPendientes(batchSize = 500) {
+  if (!syncEnCurso) {
+    syncEnCurso = syncPendientes(batchSize).finally(() => {
+      syncEnCurso = null;
+    });
+  }
+  return syncEnCurso;
+}
+
 export async function apiAsistenciasRango(from, to) {
   const f = normalizeDateInput(from);
   const t = normalizeDateInput(to);
@@ -223,6 +338,33 @@ export async function apiFaceIdentify(file) {
   return data;
 }
 
+// Identify + confirm en un solo request. Con autoConfirm, las coincidencias
+// bajo ese score vuelven con requires_confirmation (sin registrar); sin él
+// manda FACE_AUTO_CONFIRM_THRESHOLD del servidor.
+export async function apiFaceCheckin(file, autoConfirm = null) {
+  const fd = new FormData();
+  fd.append("image", file);
+  if (autoConfirm != null) fd.append("auto_confirm", String(autoConfirm));
+
+  const res = await fetch(`${API_BASE}/api/asistencias/face/checkin`, {
+    method: "POST",
+    credentials: "include",
+    body: fd,
+    headers: {
+      ...authHeaders(),
+    },
+  });
+
+  const data = await readJsonSafe(res);
+
+  if (!res.ok) {
+    const msg = data?.detail || data?.error || "Error en check-in facial";
+    throw new Error(msg);
+  }
+
+  return data;
+}
+
 export async function apiFaceConfirm(cliente_id, score) {
   return doJson(`/api/asistencias/face/confirm`, {
     method: "POST",
@@ -230,6 +372,48 @@ export async function apiFaceConfirm(cliente_id, score) {
   });
 }
 
+// Check-in continuo: se abre un stream, los frames se mandan sin esperar el
+// resultado (202) y las coincidencias llegan por SSE. El stream vive en el
+// worker que lo abrió; hay que cerrarlo al salir de la vista.
+// Devuelve { stream_id, frame_url, events_url, ... }
+export async function apiFaceStreamOpen({ checkin = true, autoConfirm = null } = {}) {
+  const payload = { checkin };
+  if (autoConfirm != null) payload.auto_confirm = autoConfirm;
+  return doJson(`/api/face/stream`, {
+    method: "POST",
+    body: JSON.stringify(payload),
+  });
+}
+
+export async function apiFaceStreamFrame(stream_id, blob) {
+  return fetchJson(`/api/face/stream/${stream_id}/frame`, {
+    method: "POST",
+    body: blob,
+    headers: { "Content-Type": "image/jpeg" },
+  });
+}
+
+// keepalive: el DELETE sale aunque la página se esté cerrando
+export async function apiFaceStreamClose(stream_id) {
+  return fetchJson(`/api/face/stream/${stream_id}`, {
+    method: "DELETE",
+    keepalive: true,
+  });
+}
+
+// Eventos "match" y "error" del stream. Devuelve una función para cerrar.
+export function apiFaceStreamEvents(stream_id, handlers = {}) {
+  const source = new EventSource(`${API_BASE}/api/face/stream/${stream_id}/events`, {
+    withCredentials: true,
+  });
+  source.addEventListener("match", (ev) => handlers.match?.(JSON.parse(ev.data)));
+  source.addEventListener("error", (ev) => {
+    // "error" lo usa tanto el servidor (con data) como EventSource (sin data)
+    if (ev.data) handlers.error?.(JSON.parse(ev.data));
+  });
+  return () => source.close();
+}
+
 export async function apiFaceEnroll(cliente_id, file) {
   const fd = new FormData();
   fd.append("cliente_id", cliente_id);
@@ -287,6 +471,41 @@ export async function apiGetDashboardResumen() {
   return fetchJson(`/api/dashboard/resumen`);
 }
 
+// Feed en vivo (SSE): asistencia, pago, resumen y reset. Todas las vistas
+// comparten un solo EventSource (el navegador permite pocas conexiones por
+// origen); se abre con el primer suscriptor y se cierra con el último.
+// EventSource reconecta solo y reenvía Last-Event-ID. Devuelve una función
+// para desuscribirse.
+const LIVE_TIPOS = ["asistencia", "pago", "resumen", "reset"];
+const liveSubs = new Set();
+let liveSource = null;
+
+function liveDispatch(tipo, data) {
+  for (const h of liveSubs) {
+    if (h[tipo]) h[tipo](data);
+  }
+}
+
+export function apiLiveStream(handlers = {}) {
+  liveSubs.add(handlers);
+
+  if (!liveSource) {
+    liveSource = new EventSource(`${API_BASE}/api/live/stream`, { withCredentials: true });
+    for (const tipo of LIVE_TIPOS) {
+      liveSource.addEventListener(tipo, (ev) => liveDispatch(tipo, JSON.parse(ev.data)));
+    }
+    liveSource.onerror = (ev) => liveDispatch("error", ev);
+  }
+
+  return () => {
+    liveSubs.delete(handlers);
+    if (!liveSubs.size && liveSource) {
+      liveSource.close();
+      liveSource = null;
+    }
+  };
+}
+
 export async function apiGetVencimientosProximos(days = 7) {
   return fetchJson(`/api/dashboard/vencimientos?days=${days}`);
 }
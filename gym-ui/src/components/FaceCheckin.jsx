@@ -1,5 +1,70 @@
 import React, { useEffect, useRef, useState } from "react";
-import { apiFaceIdentify, apiFaceConfirm } from "../api";
+import {
+  apiFaceCheckin,
+  apiFaceConfirm,
+  apiFaceStreamClose,
+  apiFaceStreamEvents,
+  apiFaceStreamFrame,
+  apiFaceStreamOpen,
+} from "../api";
+
+// Modo continuo: cada cuánto se manda un frame. El servidor descarta los
+// frames que llegan mientras procesa el anterior y los que no tienen
+// movimiento, así que no hace falta esperar el resultado de cada uno.
+const FRAME_INTERVAL_MS = 400;
+
+function captureFrame(v, c, quality = 0.9) {
+  if (!v || !c) return Promise.resolve(null);
+
+  const w = v.videoWidth || 640;
+  const h = v.videoHeight || 480;
+
+  c.width = w;
+  c.height = h;
+
+  const ctx = c.getContext("2d");
+  ctx.drawImage(v, 0, 0, w, h);
+
+  return new Promise((resolve) => c.toBlob(resolve, "image/jpeg", quality));
+}
+
+function formatHora(valor) {
+  if (!valor) return "";
+
+  const raw = String(valor).trim();
+  const normalized =
+    raw.includes(" ") && !raw.includes("T")
+      ? raw.replace(" ", "T")
+      : raw;
+
+  const d = new Date(normalized);
+
+  if (!isNaN(d.getTime())) {
+    return d.toLocaleTimeString("es-CL", {
+      hour: "2-digit",
+      minute: "2-digit",
+    });
+  }
+
+  return raw.slice(11, 16) || "";
+}
+
+// Estado a partir de la respuesta de /face/checkin, /face/confirm o de un
+// evento "match" del stream
+function estadoEntrada(r) {
+  const hora =
+    formatHora(r?.hora) ||
+    formatHora(r?.asistencia?.fecha_hora);
+  const nombre = r?.cliente ? ` - ${r.cliente.nombre} ${r.cliente.apellido}` : "";
+
+  if (r?.already_marked) {
+    return `⚠️ Cliente ya tiene asistencia registrada${nombre}${hora ? ` - ${hora}` : ""}`;
+  }
+  if (r?.ok) {
+    return `✅ Asistencia registrada${nombre}${hora ? ` - ${hora}` : ""}`;
+  }
+  return "⚠️ No fue posible confirmar la asistencia";
+}
 
 export default function FaceCheckin({ onSuccess }) {
   const videoRef = useRef(null);
@@ -9,6 +74,12 @@ export default function FaceCheckin({ onSuccess }) {
   const [status, setStatus] = useState("Listo");
   const [candidate, setCandidate] = useState(null);
   const [busy, setBusy] = useState(false);
+  const [continuo, setContinuo] = useState(false);
+
+  const onSuccessRef = useRef(onSuccess);
+  useEffect(() => {
+    onSuccessRef.current = onSuccess;
+  }, [onSuccess]);
 
   useEffect(() => {
     let mounted = true;
@@ -38,43 +109,70 @@ export default function FaceCheckin({ onSuccess }) {
     };
   }, []);
 
-  const captureBlob = async () => {
-    const v = videoRef.current;
-    const c = canvasRef.current;
-    if (!v || !c) return null;
-
-    const w = v.videoWidth || 640;
-    const h = v.videoHeight || 480;
-
-    c.width = w;
-    c.height = h;
-
-    const ctx = c.getContext("2d");
-    ctx.drawImage(v, 0, 0, w, h);
-
-    return new Promise((resolve) => c.toBlob(resolve, "image/jpeg", 0.9));
-  };
+  // Modo continuo: un stream por activación; al desactivar o desmontar se
+  // cierran el EventSource y el stream del servidor.
+  useEffect(() => {
+    if (!continuo) return;
 
-  const formatHora = (valor) => {
-    if (!valor) return "";
+    let activo = true;
+    let streamId = null;
+    let cerrarEventos = null;
+    let timer = null;
 
-    const raw = String(valor).trim();
-    const normalized =
-      raw.includes(" ") && !raw.includes("T")
-        ? raw.replace(" ", "T")
-        : raw;
+    const enviarFrame = async () => {
+      if (!activo) return;
+      try {
+        const blob = await captureFrame(videoRef.current, canvasRef.current, 0.7);
+        if (blob && activo) await apiFaceStreamFrame(streamId, blob);
+      } catch (e) {
+        if (activo) setStatus(e?.message || "Error enviando frame");
+      }
+      if (activo) timer = setTimeout(enviarFrame, FRAME_INTERVAL_MS);
+    };
 
-    const d = new Date(normalized);
+    (async () => {
+      try {
+        const s = await apiFaceStreamOpen({ checkin: true });
+        if (!activo) {
+          apiFaceStreamClose(s.stream_id).catch(() => {});
+          return;
+        }
+        streamId = s.stream_id;
+
+        cerrarEventos = apiFaceStreamEvents(streamId, {
+          match: (ev) => {
+            if (ev.checked_in || ev.already_marked) {
+              setCandidate(null);
+              setStatus(estadoEntrada(ev));
+              onSuccessRef.current?.();
+            } else {
+              // Bajo el umbral de auto-confirmación: confirma el operador
+              setCandidate({ cliente: ev.cliente, score: ev.score });
+              setStatus("Coincidencia encontrada. Presiona Confirmar.");
+            }
+          },
+          error: (ev) => setStatus(ev?.detail || "Error en el reconocimiento"),
+        });
+
+        setStatus("Modo continuo: acércate a la cámara");
+        enviarFrame();
+      } catch (e) {
+        if (activo) {
+          setStatus(e?.message || "No se pudo iniciar el modo continuo");
+          setContinuo(false);
+        }
+      }
+    })();
 
-    if (!isNaN(d.getTime())) {
-      return d.toLocaleTimeString("es-CL", {
-        hour: "2-digit",
-        minute: "2-digit",
-      });
-    }
+    return () => {
+      activo = false;
+      clearTimeout(timer);
+      if (cerrarEventos) cerrarEventos();
+      if (streamId) apiFaceStreamClose(streamId).catch(() => {});
+    };
+  }, [continuo]);
 
-    return raw.slice(11, 16) || "";
-  };
+  const captureBlob = () => captureFrame(videoRef.current, canvasRef.current);
 
   const onIdentify = async () => {
     setBusy(true);
@@ -86,7 +184,7 @@ export default function FaceCheckin({ onSuccess }) {
       if (!blob) throw new Error("No se pudo capturar imagen (cámara no lista)");
 
       const file = new File([blob], "frame.jpg", { type: "image/jpeg" });
-      const r = await apiFaceIdentify(file);
+      const r = await apiFaceCheckin(file);
 
       if (!r?.match) {
         const scoreTxt = r?.score != null ? ` (score ${Number(r.score).toFixed(3)})` : "";
@@ -94,8 +192,18 @@ export default function FaceCheckin({ onSuccess }) {
         return;
       }
 
-      setCandidate({ cliente: r.cliente, score: r.score });
-      setStatus("Coincidencia encontrada. Presiona Confirmar.");
+      // Score bajo el umbral de auto-confirmación: confirma el operador
+      if (r.requires_confirmation) {
+        setCandidate({ cliente: r.cliente, score: r.score });
+        setStatus("Coincidencia encontrada. Presiona Confirmar.");
+        return;
+      }
+
+      setStatus(estadoEntrada(r));
+
+      if (onSuccess) {
+        await onSuccess();
+      }
     } catch (e) {
       setStatus(e?.message || "Error al detectar");
     } finally {
@@ -112,22 +220,7 @@ export default function FaceCheckin({ onSuccess }) {
     try {
       const r = await apiFaceConfirm(candidate.cliente.cliente_id, candidate.score);
 
-      const hora =
-        formatHora(r?.hora) ||
-        formatHora(r?.asistencia?.fecha_hora);
-
-      if (r?.already_marked) {
-        setStatus(
-          `⚠️ Cliente ya tiene asistencia registrada${hora ? ` - ${hora}` : ""}`
-        );
-      } else if (r?.ok) {
-        setStatus(
-          `✅ Asistencia registrada${hora ? ` - ${hora}` : ""}`
-        );
-      } else {
-        setStatus("⚠️ No fue posible confirmar la asistencia");
-      }
-
+      setStatus(estadoEntrada(r));
       setCandidate(null);
 
       if (onSuccess) {
@@ -155,7 +248,7 @@ export default function FaceCheckin({ onSuccess }) {
         <div className="rounded-xl border p-3">
           {!candidate ? (
             <p className="text-sm text-gym-text-muted">
-              Presiona <b>Detectar</b> para identificar. Si hay coincidencia, podrás confirmar manualmente.
+              Presiona <b>Detectar</b> para identificar y registrar la entrada. Si la coincidencia es dudosa, podrás confirmar manualmente.
             </p>
           ) : (
             <div className="space-y-1">
@@ -181,12 +274,21 @@ export default function FaceCheckin({ onSuccess }) {
 
           <button
             onClick={onIdentify}
-            disabled={busy}
+            disabled={busy || continuo}
             className="mt-3 w-full rounded-xl bg-slate-900 text-white py-2 hover:bg-slate-800 disabled:opacity-60"
           >
             Detectar
           </button>
 
+          <button
+            onClick={() => setContinuo((v) => !v)}
+            className={`mt-2 w-full rounded-xl border py-2 ${
+              continuo ? "border-red-300 text-red-700 hover:bg-red-50" : "hover:bg-slate-50"
+            }`}
+          >
+            {continuo ? "Detener modo continuo" : "Modo continuo"}
+          </button>
+
           <p className="mt-2 text-xs text-gym-text-muted">
             Tip: buena luz y rostro centrado mejora el match.
           </p>
@@ -0,0 +1,33 @@
+// src/components/attendance/PendingCheckins.jsx
+import React from "react";
+import { useAsistenciasPendientes } from "../../hooks/useAsistenciasPendientes";
+
+/** Estado de la cola offline del check-in QR, con envío manual. */
+export default function PendingCheckins({ onSynced }) {
+  const { pendientes, online, syncing, error, sync } = useAsistenciasPendientes(onSynced);
+
+  if (online && !pendientes && !error) return null;
+
+  return (
+    <div className="mt-3 flex flex-wrap items-center gap-2 text-xs border border-amber-200 bg-amber-50 text-amber-800 rounded-md px-3 py-2">
+      {!online && <span className="font-semibold">Sin conexión.</span>}
+      {pendientes > 0 && (
+        <span>
+          {pendientes} entrada{pendientes === 1 ? "" : "s"} pendiente
+          {pendientes === 1 ? "" : "s"} de envío.
+        </span>
+      )}
+      {error && <span>❌ {error}</span>}
+      {online && pendientes > 0 && (
+        <button
+          type="button"
+          onClick={sync}
+          disabled={syncing}
+          className="ml-auto px-2 py-1 border border-amber-300 rounded hover:bg-amber-100 disabled:opacity-50"
+        >
+          {syncing ? "Enviando..." : "Enviar ahora"}
+        </button>
+      )}
+    </div>
+  );
+}
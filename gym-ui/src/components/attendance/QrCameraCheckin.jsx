@@ -1,7 +1,7 @@
 // src/components/attendance/QrCameraCheckin.jsx
 import React, { useEffect, useRef, useState } from "react";
 import { Html5QrcodeScanner } from "html5-qrcode";
-import { apiMarcarAsistenciaQR } from "../../api";
+import { apiMarcarAsistenciaQROffline } from "../../api";
 
 const SCANNER_ID = "qr-camera-reader";
 
@@ -24,9 +24,10 @@ export default function QrCameraCheckin({ onSuccess }) {
       setResult(null);
 
       try {
-        const resp = await apiMarcarAsistenciaQR(token);
+        const resp = await apiMarcarAsistenciaQROffline(token);
         setResult(resp || {});
-        if (onSuccess) {
+        // Offline: la lista se recarga al sincronizar (PendingCheckins)
+        if (onSuccess && !resp?.offline) {
           onSuccess();
         }
       } catch (e) {
@@ -68,6 +69,7 @@ export default function QrCameraCheckin({ onSuccess }) {
 
   const cliente = result?.cliente;
   const duplicado = !!result?.duplicado;
+  const offline = !!result?.offline;
   const hora = result?.hora || "";
 
   return (
@@ -87,13 +89,17 @@ export default function QrCameraCheckin({ onSuccess }) {
         <div
           className={
             "text-xs rounded-md px-3 py-2 border " +
-            (duplicado
+            (duplicado || offline
               ? "border-amber-200 bg-amber-50 text-amber-800"
               : "border-emerald-200 bg-emerald-50 text-emerald-800")
           }
         >
           <div className="font-semibold mb-1">
-            {duplicado ? "Asistencia ya registrada" : "Asistencia registrada"}
+            {offline
+              ? "Entrada guardada sin conexión"
+              : duplicado
+              ? "Asistencia ya registrada"
+              : "Asistencia registrada"}
           </div>
           {cliente && (
             <div className="mb-1">
@@ -111,7 +117,9 @@ export default function QrCameraCheckin({ onSuccess }) {
           )}
           <div className="text-[11px] opacity-80">
             {result.mensaje ||
-              (duplicado
+              (offline
+                ? "Se enviará automáticamente al volver la conexión."
+                : duplicado
                 ? "El cliente ya tenía una entrada registrada para hoy."
                 : "Entrada marcada para la jornada actual.")}
           </div>
@@ -1,6 +1,6 @@
 // src/components/attendance/QrCheckin.jsx
 import React, { useEffect, useRef, useState } from "react";
-import { apiMarcarAsistenciaQR } from "../../api";
+import { apiMarcarAsistenciaQROffline } from "../../api";
 
 export default function QrCheckin({ onSuccess }) {
   const [token, setToken] = useState("");
@@ -25,9 +25,10 @@ export default function QrCheckin({ onSuccess }) {
     setResult(null);
 
     try {
-      const resp = await apiMarcarAsistenciaQR(t);
+      const resp = await apiMarcarAsistenciaQROffline(t);
       setResult(resp || {});
-      if (onSuccess) {
+      // Offline: la lista se recarga al sincronizar (PendingCheckins)
+      if (onSuccess && !resp?.offline) {
         onSuccess();
       }
     } catch (e) {
@@ -43,6 +44,7 @@ export default function QrCheckin({ onSuccess }) {
 
   const cliente = result?.cliente;
   const duplicado = !!result?.duplicado;
+  const offline = !!result?.offline;
   const hora = result?.hora || "";
 
   return (
@@ -84,13 +86,17 @@ export default function QrCheckin({ onSuccess }) {
         <div
           className={
             "text-xs rounded-md px-3 py-2 border " +
-            (duplicado
+            (duplicado || offline
               ? "border-amber-200 bg-amber-50 text-amber-800"
               : "border-emerald-200 bg-emerald-50 text-emerald-800")
           }
         >
           <div className="font-semibold mb-1">
-            {duplicado ? "Asistencia ya registrada" : "Asistencia registrada"}
+            {offline
+              ? "Entrada guardada sin conexión"
+              : duplicado
+              ? "Asistencia ya registrada"
+              : "Asistencia registrada"}
           </div>
           {cliente && (
             <div className="mb-1">
@@ -108,7 +114,9 @@ export default function QrCheckin({ onSuccess }) {
           )}
           <div className="text-[11px] opacity-80">
             {result.mensaje ||
-              (duplicado
+              (offline
+                ? "Se enviará automáticamente al volver la conexión."
+                : duplicado
                 ? "El cliente ya tenía una entrada registrada para hoy."
                 : "Entrada marcada para la jornada actual.")}
           </div>
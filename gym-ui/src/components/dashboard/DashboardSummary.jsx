@@ -1,5 +1,5 @@
 import { useEffect, useState } from "react";
-import { apiGetDashboardResumen } from "../../api";
+import { apiGetDashboardResumen, apiLiveStream } from "../../api";
 
 export default function DashboardSummary() {
   const [data, setData] = useState(null);
@@ -16,6 +16,16 @@ export default function DashboardSummary() {
       });
   }, []);
 
+  // Contadores del día en vivo (evento "resumen" del SSE)
+  useEffect(
+    () =>
+      apiLiveStream({
+        resumen: ({ entradas_hoy, ingresos_hoy }) =>
+          setData((prev) => (prev ? { ...prev, entradas_hoy, ingresos_hoy } : prev)),
+      }),
+    []
+  );
+
   if (error) {
     return (
       <div className="mb-5 text-xs text-amber-800 bg-amber-50 border border-amber-300 px-3 py-2 rounded">
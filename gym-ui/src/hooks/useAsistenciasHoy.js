@@ -1,6 +1,6 @@
 // src/hooks/useAsistenciasHoy.js
 import { useCallback, useEffect, useState } from "react";
-import { apiGetAsistenciasHoy, apiMarcarAsistencia } from "../api";
+import { apiGetAsistenciasHoy, apiLiveStream, apiMarcarAsistencia } from "../api";
 
 export function useAsistenciasHoy() {
   const [items, setItems] = useState([]);
@@ -22,6 +22,21 @@ export function useAsistenciasHoy() {
     fetchAsistencias();
   }, [fetchAsistencias]);
 
+  // Entradas de otras cajas / kioskos en vivo (SSE); "reset" = recargar
+  useEffect(
+    () =>
+      apiLiveStream({
+        asistencia: (a) =>
+          setItems((prev) =>
+            prev.some((x) => x.asistencia_id === a.asistencia_id)
+              ? prev
+              : [a, ...prev]
+          ),
+        reset: fetchAsistencias,
+      }),
+    [fetchAsistencias]
+  );
+
   /** Marca asistencia para un cliente. Por defecto es "entrada". */
   const marcar = useCallback(
     async (clienteId, tipo = "entrada") => {
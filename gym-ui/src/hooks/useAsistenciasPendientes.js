@@ -0,0 +1,56 @@
+// src/hooks/useAsistenciasPendientes.js
+import { useCallback, useEffect, useState } from "react";
+import {
+  PENDIENTES_EVENT,
+  apiSyncAsistenciasPendientes,
+  asistenciasPendientes,
+} from "../api";
+
+/**
+ * Cola de check-ins QR hechos sin conexión (ver api.js). Sincroniza al
+ * montar y cada vez que el navegador vuelve a estar "online".
+ * onSynced se llama después de un envío con resultados (p. ej. para
+ * recargar las asistencias del día).
+ */
+export function useAsistenciasPendientes(onSynced) {
+  const [pendientes, setPendientes] = useState(asistenciasPendientes);
+  const [online, setOnline] = useState(navigator.onLine);
+  const [syncing, setSyncing] = useState(false);
+  const [error, setError] = useState(null);
+
+  const sync = useCallback(async () => {
+    if (!asistenciasPendientes()) return;
+    setSyncing(true);
+    setError(null);
+    try {
+      const resultados = await apiSyncAsistenciasPendientes();
+      if (resultados.length && onSynced) onSynced(resultados);
+    } catch (e) {
+      setError(e?.message || "No se pudieron enviar las entradas pendientes.");
+    } finally {
+      setSyncing(false);
+    }
+  }, [onSynced]);
+
+  useEffect(() => {
+    const onCambio = () => setPendientes(asistenciasPendientes());
+    const onOnline = () => {
+      setOnline(true);
+      sync();
+    };
+    const onOffline = () => setOnline(false);
+
+    window.addEventListener(PENDIENTES_EVENT, onCambio);
+    window.addEventListener("online", onOnline);
+    window.addEventListener("offline", onOffline);
+    if (navigator.onLine) sync();
+
+    return () => {
+      window.removeEventListener(PENDIENTES_EVENT, onCambio);
+      window.removeEventListener("online", onOnline);
+      window.removeEventListener("offline", onOffline);
+    };
+  }, [sync]);
+
+  return { pendientes, online, syncing, error, sync };
+}
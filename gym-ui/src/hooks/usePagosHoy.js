@@ -1,21 +1,45 @@
 // src/hooks/usePagosHoy.js
-import { useEffect, useState } from "react";
-import { apiGetPagosHoy } from "../api";
+import { useEffect, useRef, useState } from "react";
+import { apiGetPagosHoy, apiLiveStream } from "../api";
 
 export function usePagosHoy() {
   const [pagos, setPagos] = useState([]);
   const [resumen, setResumen] = useState({
     total_general: 0, total_efectivo: 0, total_tarjeta: 0, total_transferencia: 0,
   });
+  // ids ya sumados, para no contar dos veces un pago que llega por SSE y por fetch
+  const vistos = useRef(new Set());
 
   const fetchPagos = async () => {
     try {
       const data = await apiGetPagosHoy();
+      vistos.current = new Set((data.pagos || []).map((p) => p.id));
       setPagos(data.pagos || []);
       setResumen(data.resumen || resumen);
     } catch (e) { console.error(e); }
   };
 
   useEffect(() => { fetchPagos(); }, []);
+
+  // Pagos en vivo (SSE): se agregan a la lista y a los totales por método
+  useEffect(
+    () =>
+      apiLiveStream({
+        pago: (p) => {
+          if (vistos.current.has(p.id)) return;
+          vistos.current.add(p.id);
+          setPagos((prev) => [p, ...prev]);
+          const key = `total_${String(p.metodo_pago || "").toLowerCase().trim()}`;
+          setResumen((prev) => ({
+            ...prev,
+            total_general: prev.total_general + p.monto,
+            ...(key in prev ? { [key]: prev[key] + p.monto } : {}),
+          }));
+        },
+        reset: fetchPagos,
+      }),
+    []
+  );
+
   return { pagos, resumen, fetchPagos };
 }
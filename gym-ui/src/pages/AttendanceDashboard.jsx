@@ -2,6 +2,7 @@
 import { useEffect, useMemo, useState } from "react";
 import { useNavigate } from "react-router-dom";
 import { useAuth } from "../auth/AuthProvider";
+import { apiLiveStream } from "../api";
 import {
   PieChart,
   Pie,
@@ -20,6 +21,9 @@ import {
 
 const API_BASE = import.meta.env.VITE_API_BASE || "http://127.0.0.1:5000";
 
+// Tras una entrada en vivo se espera esto antes de recargar (agrupa ráfagas)
+const LIVE_RELOAD_MS = 5000;
+
 const PIE_COLORS = [
   "#3B82F6", // azul
   "#10B981", // verde
@@ -73,9 +77,9 @@ export default function AttendanceDashboard() {
       return;
     }
 
-    const fetchAll = async () => {
+    const fetchAll = async (silent = false) => {
       try {
-        setLoading(true);
+        if (!silent) setLoading(true);
         setError("");
 
         const [r1, r2, r3] = await Promise.all([
@@ -156,6 +160,25 @@ export default function AttendanceDashboard() {
     };
 
     fetchAll();
+
+    // Las entradas nuevas llegan por SSE; se recarga una vez por ráfaga
+    let timer = null;
+    const unsubscribe = apiLiveStream({
+      asistencia: () => {
+        if (!timer) {
+          timer = setTimeout(() => {
+            timer = null;
+            fetchAll(true);
+          }, LIVE_RELOAD_MS);
+        }
+      },
+      reset: () => fetchAll(true),
+    });
+
+    return () => {
+      unsubscribe();
+      clearTimeout(timer);
+    };
   }, [user, isAdmin]);
 
   // ---------- datos derivados ----------
@@ -1,9 +1,14 @@
-import React, { useEffect, useMemo, useState } from "react";
-import { apiGetClientes } from "../api";
+import React, { useCallback, useEffect, useRef, useState } from "react";
+import { apiBuscarClientes } from "../api";
 import FaceEnrollPanel from "../components/clients/FaceEnrollPanel";
 
 const API_BASE = import.meta.env.VITE_API_BASE || "";
 
+// Búsqueda en el servidor (sin tildes, por prefijo), paginada por cursor
+const PAGE_SIZE = 50;
+const LIST_FIELDS = ["cliente_id", "nombre", "apellido", "rut"];
+const SEARCH_DEBOUNCE_MS = 250;
+
 async function apiGetCliente(id) {
   const res = await fetch(`${API_BASE}/api/clientes/${id}`, { credentials: "include" });
   const ct = res.headers.get("content-type") || "";
@@ -27,27 +32,53 @@ async function apiUpdateCliente(id, payload) {
 
 export default function EditClientsAdmin() {
   const [clientes, setClientes] = useState([]);
+  const [nextCursor, setNextCursor] = useState(null);
   const [q, setQ] = useState("");
   const [selectedId, setSelectedId] = useState(null);
   const [form, setForm] = useState(null);
   const [msg, setMsg] = useState(null); // {type, text}
   const [loading, setLoading] = useState(false);
+  const [buscando, setBuscando] = useState(false);
+  const busquedaRef = useRef(0);
 
-  useEffect(() => {
-    (async () => {
-      setMsg(null);
-      const list = await apiGetClientes();
-      setClientes(list || []);
-    })();
+  // Primera página para q; descarta respuestas de búsquedas anteriores
+  const buscar = useCallback(async (texto) => {
+    const n = ++busquedaRef.current;
+    setBuscando(true);
+    try {
+      const page = await apiBuscarClientes({ q: texto.trim(), limit: PAGE_SIZE, fields: LIST_FIELDS });
+      if (n !== busquedaRef.current) return;
+      setClientes(page.items || []);
+      setNextCursor(page.has_more ? page.next_cursor : null);
+    } catch (e) {
+      if (n === busquedaRef.current) setMsg({ type: "error", text: e.message });
+    } finally {
+      if (n === busquedaRef.current) setBuscando(false);
+    }
   }, []);
 
-  const filtered = useMemo(() => {
-    const t = q.trim().toLowerCase();
-    if (!t) return clientes;
-    return clientes.filter((c) =>
-      `${c.nombre} ${c.apellido} ${c.rut}`.toLowerCase().includes(t)
-    );
-  }, [clientes, q]);
+  useEffect(() => {
+    const t = setTimeout(() => buscar(q), q ? SEARCH_DEBOUNCE_MS : 0);
+    return () => clearTimeout(t);
+  }, [q, buscar]);
+
+  const cargarMas = async () => {
+    if (!nextCursor) return;
+    const n = busquedaRef.current;
+    setBuscando(true);
+    try {
+      const page = await apiBuscarClientes({
+        q: q.trim(), cursor: nextCursor, limit: PAGE_SIZE, fields: LIST_FIELDS,
+      });
+      if (n !== busquedaRef.current) return;
+      setClientes((prev) => [...prev, ...(page.items || [])]);
+      setNextCursor(page.has_more ? page.next_cursor : null);
+    } catch (e) {
+      setMsg({ type: "error", text: e.message });
+    } finally {
+      if (n === busquedaRef.current) setBuscando(false);
+    }
+  };
 
   const selectClient = async (id) => {
     setSelectedId(id);
@@ -72,8 +103,7 @@ export default function EditClientsAdmin() {
       setMsg({ type: "success", text: "✅ Cliente actualizado" });
 
       // refrescar lista (para que se vea el cambio en el buscador)
-      const list = await apiGetClientes();
-      setClientes(list || []);
+      await buscar(q);
     } catch (e) {
       setMsg({ type: "error", text: e.message });
     } finally {
@@ -107,7 +137,7 @@ export default function EditClientsAdmin() {
           />
 
           <div className="max-h-[420px] overflow-auto">
-            {filtered.map((c) => (
+            {clientes.map((c) => (
               <button
                 key={c.cliente_id}
                 onClick={() => selectClient(c.cliente_id)}
@@ -119,6 +149,18 @@ export default function EditClientsAdmin() {
                 <div className="text-xs text-gray-600">{c.rut}</div>
               </button>
             ))}
+            {!buscando && clientes.length === 0 && (
+              <div className="text-sm text-gray-600 px-3 py-2">Sin resultados.</div>
+            )}
+            {nextCursor && (
+              <button
+                onClick={cargarMas}
+                disabled={buscando}
+                className="w-full px-3 py-2 rounded border text-sm disabled:opacity-50"
+              >
+                {buscando ? "Cargando..." : "Cargar más"}
+              </button>
+            )}
           </div>
         </div>
 